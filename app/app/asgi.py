@@ -3,6 +3,9 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+In production, it can be served by gunicorn with the uvicorn workers instead of app.wsgi (see gunicorn.conf.py):
+GUNICORN_APP=app.asgi:application GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',   # we're gonna need these soon
     'rest_framework.authtoken',
     'core',
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # before the other middlewares, so it compresses the responses they modified (see core/middleware.py)
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,9 +81,19 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# the connections to the database can be taken from a pool shared by the threads of each process (see core/db/postgresql)
+# DB_POOL_MAX_SIZE is the most connections of a process (0 disables the pool), which must be at least its number of
+# threads using the database: the threads serving the requests plus the RECIPE_IMAGE_WORKERS threads
+# a thread finding them all in use waits DB_POOL_TIMEOUT seconds for one to be given back, then its request fails
+# and DB_POOL_MIN_SIZE is the number of idle connections kept open between the requests
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', min(DB_POOL_MAX_SIZE, 4)))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # the PostgreSQL backend, with health checks and an optional pool
+        'ENGINE': 'core.db.postgresql',
         # this is to get an environment variable, as defined in the docker-compose file
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
@@ -93,9 +106,51 @@ DATABASES = {
         # because we can simply upload the Dockerfile to a service like Amazon ECS, k8s, etc
         # and just set the appropriate environment variables and it should work
 
+        # keep the connection of each thread open between the requests for this many seconds, instead of connecting
+        # to the database for every request, 0 closes it at the end of every request (which gives it back to the pool)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if DB_POOL_MAX_SIZE else 60)),
+        # check that a connection kept from a previous request still works before using it
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'POOL': {
+            'min_size': DB_POOL_MIN_SIZE, 'max_size': DB_POOL_MAX_SIZE, 'timeout': DB_POOL_TIMEOUT,
+        } if DB_POOL_MAX_SIZE else None,
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# the local memory cache is private to each process, so when running several processes
+# a shared cache (e.g. CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache) should be used instead
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+# how long (in seconds) the rendered tag and ingredient lists are kept in the cache
+RECIPE_ATTRIBUTES_CACHE_TIMEOUT = int(os.environ.get('RECIPE_ATTRIBUTES_CACHE_TIMEOUT', 300))
+# the version of the library behind the ETags is only cached when the cache is shared by the processes,
+# otherwise it's read from the database, since a process wouldn't see the versions bumped by the others
+RECIPE_VERSION_CACHED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+)
+# how long (in seconds) the cached versions are kept, in case a change bypassed the signals
+RECIPE_VERSION_CACHE_TIMEOUT = int(os.environ.get('RECIPE_VERSION_CACHE_TIMEOUT', 60))
+
+
+# Token authentication
+# the user of each token is cached (see core/authentication.py), first in a cache private to each process,
+# whose entries expire after TOKEN_CACHE_TIMEOUT seconds, then in the cache named by TOKEN_CACHE_ALIAS, if it's set
+# a deleted token or a deactivated user is forgotten right away by the process that made the change,
+# and by the other processes at the latest after TOKEN_CACHE_TIMEOUT seconds
+
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('TOKEN_CACHE_TIMEOUT', 60))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -138,5 +193,86 @@ MEDIA_URL = '/media/'   # this says that our media files will be accessed under
 
 MEDIA_ROOT = '/vol/web/media'   # tells Django where to store the media files
 STATIC_ROOT = '/vol/web/static'
+# the uploads are written in the same volume as the media files while they are received, so saving them is
+# a simple rename, but outside of MEDIA_ROOT, which is served by the app (see app/urls.py)
+FILE_UPLOAD_TEMP_DIR = '/vol/web/tmp'
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # list endpoints are only paginated when the client asks for it (see core/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.OptionalPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 50)),
+    # the JSON is rendered and parsed with orjson when it's installed, and the standard library otherwise
+    # (see core/renderers.py and core/parsers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# the biggest page size a client can ask for with ?page_size=
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+
+# the most recipes that can be sent in one request to /api/recipe/recipes/bulk/
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 5000))
+
+# after an image is uploaded, smaller copies of it are generated in the background (see recipe/images.py)
+# the sizes are the longest side of each variant, in pixels
+RECIPE_IMAGE_VARIANT_SIZES = [int(size) for size in os.environ.get('RECIPE_IMAGE_VARIANT_SIZES', '128,512,1024').split(',')]
+# the number of threads generating the variants in each process, 0 generates them during the upload request
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+# the files of a replaced or deleted image are kept if they were saved less than this many seconds ago,
+# since the same file may be being uploaded to another recipe (the collect_recipe_images command deletes them later)
+RECIPE_IMAGE_DELETE_GRACE = int(os.environ.get('RECIPE_IMAGE_DELETE_GRACE', 3600))
+
+# the recipe images are rejected while they are uploaded as soon as they are too big (see core/uploads.py)
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+# the longest side of the images, in pixels
+RECIPE_IMAGE_MAX_DIMENSION = int(os.environ.get('RECIPE_IMAGE_MAX_DIMENSION', 8000))
+
+# the most recipes (and tags, ingredients, deletions) returned by every call to /api/recipe/sync/
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', 500))
+# the deletions are kept this many days for the clients to sync them (see the prune_tombstones command), 0 keeps them
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+# the text search configuration of the recipe search (see recipe/search.py), e.g. english or simple
+# after changing it, run: python manage.py update_search_vectors
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# the most ingredients a recipe listed by /api/recipe/recipes/cookable/ can miss, unless the client asks for ?max_missing=
+RECIPE_COOKABLE_MAX_MISSING = int(os.environ.get('RECIPE_COOKABLE_MAX_MISSING', 2))
+
+# the recipe lists are rendered from the database rows, without the serializer (see recipe/fast.py)
+RECIPE_FAST_LIST = os.environ.get('RECIPE_FAST_LIST', '1') == '1'
+
+# the number of recipes read from the database at a time by the export (see recipe/export.py)
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 500))
+
+# the number of recipes created per transaction by the import (see recipe/imports.py)
+RECIPE_IMPORT_BATCH_SIZE = int(os.environ.get('RECIPE_IMPORT_BATCH_SIZE', 500))
+
+# the responses are compressed in the first of these encodings the client accepts (see core/middleware.py)
+# br needs the Brotli package, and is skipped when it isn't installed
+COMPRESSION_ENCODINGS = [encoding for encoding in os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',') if encoding]
+# the responses smaller than this, in bytes, aren't compressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# the higher the smaller, but the slower: 1 to 9 for gzip, 0 to 11 for brotli
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+
+# the static and media files served by the app are cached by the clients for this many seconds (see core/views.py),
+# or forever when they are named after their content
+FILES_CACHE_MAX_AGE = int(os.environ.get('FILES_CACHE_MAX_AGE', 60 * 60))
+# with nginx in front of the app, the internal location serving MEDIA_ROOT (e.g. /internal/media/),
+# so nginx sends the media files itself (with X-Accel-Redirect) instead of the app
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
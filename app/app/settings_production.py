@@ -0,0 +1,49 @@
+"""
+Django settings of the production servers, on top of the ones of settings.py
+
+They are used with DJANGO_SETTINGS_MODULE=app.settings_production (see docker-compose.prod.yml and gunicorn.conf.py).
+"""
+import os
+from django.core.exceptions import ImproperlyConfigured
+from app.settings import *  # noqa: F401,F403
+from app.settings import TEMPLATES
+
+
+# never show the debug pages to the clients, nor keep every query in memory like DEBUG does
+DEBUG = False
+
+# the secret key of settings.py is public, so the production one is always given by the environment
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('DJANGO_SECRET_KEY must be set in production')
+
+# the domain names of the app, separated by commas, e.g. recipes.example.com
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# the templates (of the admin and of the browsable API) are compiled once per process, instead of for every response
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# collectstatic names the static files after the hash of their content,
+# so they can be cached forever by the clients (see core/views.py)
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+
+# without DEBUG, the errors are only mailed to the ADMINS by default, so they are written to the output instead
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('DJANGO_LOG_LEVEL', 'WARNING'),
+    },
+}
@@ -13,15 +13,27 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from django.conf import settings
+from core import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # the static and media files, with cache headers (see core/views.py),
+    # when there's no proxy in front of the app serving them itself
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), views.serve, {
+        'document_root': settings.STATIC_ROOT,
+        'immutable': views.IMMUTABLE_STATIC,
+    }),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views.serve, {
+        'document_root': settings.MEDIA_ROOT,
+        'immutable': views.IMMUTABLE_MEDIA,
+        'accel_redirect': settings.MEDIA_ACCEL_REDIRECT,
+    }),
+]
 # by default, the Django development server will serve static files for any dependencies in the server
-# however it doesn't serve media files by default
+# however it doesn't serve media files by default, and static() only serves them when DEBUG is on
@@ -3,6 +3,8 @@ WSGI config for app project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+In production, it's served by gunicorn (see gunicorn.conf.py) with DJANGO_SETTINGS_MODULE=app.settings_production.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/wsgi/
 """
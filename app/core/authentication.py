@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class LRUCache:
+    """A small thread safe in-process cache, which forgets the least recently used entries and the expired ones"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored under the key, or None if it's missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# the token -> user resolutions of this process
+local_tokens = LRUCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TIMEOUT)
+
+
+def _shared_tokens():
+    """Return the cache shared between the processes, if one is configured"""
+    if settings.TOKEN_CACHE_ALIAS is None:
+        return None
+
+    return caches[settings.TOKEN_CACHE_ALIAS]
+
+
+def _shared_key(key):
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    """Forget the user of a token, e.g. because the token was deleted"""
+    local_tokens.delete(key)
+    shared_tokens = _shared_tokens()
+    if shared_tokens is not None:
+        shared_tokens.delete(_shared_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that remembers which user each token belongs to
+
+    The default token authentication looks up the token and its user in the database on every single request.
+    Here the token is first looked up in a cache of this process, then in the shared cache (if TOKEN_CACHE_ALIAS
+    is set) and only then in the database.
+    The signals in core/signals.py remove the token from the caches when it's deleted or its user changes.
+    """
+
+    def authenticate_credentials(self, key):
+        token = local_tokens.get(key)
+        if token is None:
+            shared_tokens = _shared_tokens()
+            if shared_tokens is not None:
+                token = shared_tokens.get(_shared_key(key))
+            if token is None:
+                # raises AuthenticationFailed if the token doesn't exist or the user is inactive
+                user, token = super().authenticate_credentials(key)
+                if shared_tokens is not None:
+                    shared_tokens.set(_shared_key(key), token, timeout=settings.TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(key, token)
+
+        # every request gets its own copy of the user, so a view modifying it doesn't affect the other requests
+        token = copy.deepcopy(token)
+        return (token.user, token)
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from django.db.backends.postgresql import base
+from psycopg2 import pool as psycopg2_pool
+
+
+# the pools of the process, by connection parameters, shared by the threads, with the process that created them
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(psycopg2_pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that waits for a connection to be given back when they are all in use
+
+    ThreadedConnectionPool raises PoolError right away instead, e.g. when a request comes in while the threads
+    generating the image variants hold connections too. It's still raised after waiting timeout seconds.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=10, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        # shares the lock of ThreadedConnectionPool, so every change of the pool is seen by the waiting threads
+        self._released = threading.Condition(self._lock)
+
+    def getconn(self, key=None):
+        deadline = time.monotonic() + self.timeout
+        with self._released:
+            # like ThreadedConnectionPool, a new connection is only opened when there's no idle one and room for it
+            while not self._pool and len(self._used) >= self.maxconn and key not in self._used and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._released.wait(remaining):
+                    raise psycopg2_pool.PoolError(f'connection pool exhausted for {self.timeout} seconds')
+
+            return self._getconn(key)
+
+    def putconn(self, conn=None, key=None, close=False):
+        with self._released:
+            self._putconn(conn, key, close)
+            self._released.notify()
+
+    def closeall(self):
+        with self._released:
+            self._closeall()
+            self._released.notify_all()
+
+
+def get_pool(conn_params, min_size, max_size, timeout):
+    """Return the pool of connections with the parameters, creating it the first time"""
+    key = repr(sorted(conn_params.items()))
+    with _pools_lock:
+        pid, pool = _pools.get(key, (None, None))
+        # a process forked from another one (e.g. a gunicorn worker) can't share the connections of its parent
+        if pool is None or pid != os.getpid():
+            pool = BlockingConnectionPool(min_size, max_size, timeout=timeout, **conn_params)
+            _pools[key] = (os.getpid(), pool)
+
+    return pool
+
+
+def close_pools():
+    """Close the connections of all the pools of the process"""
+    with _pools_lock:
+        for pid, pool in _pools.values():
+            # closing the connections of the parent process would end its sessions too
+            if pid == os.getpid():
+                pool.closeall()
+        _pools.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """The PostgreSQL backend, with health checks of the persistent connections and an optional pool
+
+    With CONN_HEALTH_CHECKS, a connection kept from a previous request (see CONN_MAX_AGE) or taken from the pool
+    is checked before its first query of the request, and replaced if the database closed it in the meantime
+    (e.g. when it restarted), instead of failing the request.
+
+    With POOL (e.g. {'min_size': 2, 'max_size': 20, 'timeout': 10}), the connections are taken from a pool shared
+    by the threads of the process, and given back to it when Django closes them, instead of connecting to the database
+    every time. The pool keeps at most min_size idle connections, and when max_size are in use at once,
+    waits up to timeout seconds for one to be given back.
+    """
+    # the persistent connection is checked once per request, before its first query
+    health_check_done = False
+
+    @property
+    def pool_settings(self):
+        return self.settings_dict.get('POOL')
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def _is_alive(self, connection):
+        """Return True if the psycopg2 connection still works"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # the new connections of the pool aren't in autocommit mode yet, and Django can't set it in a transaction
+            if not connection.autocommit:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+
+        return True
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_settings:
+            return super().get_new_connection(conn_params)
+
+        self.pool = get_pool(
+            conn_params, self.pool_settings['min_size'], self.pool_settings['max_size'],
+            self.pool_settings.get('timeout', 10),
+        )
+        connection = self.pool.getconn()
+        # after a restart of the database, every idle connection of the pool is closed,
+        # and they are discarded one after the other until the pool opens a new one
+        for _ in range(self.pool_settings['max_size']):
+            if not connection.closed and (not self.health_check_enabled or self._is_alive(connection)):
+                break
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+
+        # like the PostgreSQL backend
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+
+        return connection
+
+    def connect(self):
+        super().connect()
+        # a new connection, or one just checked by the pool
+        self.health_check_done = True
+
+    def _close(self):
+        if self.connection is None or not self.pool_settings:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            # the pool rolls back the transaction in progress, if any, and drops the broken connections
+            # but a connection closed in an atomic block stays in the wrapper until the end of the block,
+            # so it can't be given to another thread
+            self.pool.putconn(self.connection, close=self.in_atomic_block)
+
+    def close_if_unusable_or_obsolete(self):
+        # called at the start and at the end of every request
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """Close the connection kept from a previous request if it doesn't work anymore, so a new one is opened"""
+        if self.connection is None or not self.health_check_enabled or self.health_check_done \
+                or self.in_atomic_block:
+            return
+
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+
+        return super()._cursor(name)
@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+from django.db import models, transaction
+from django.dispatch import Signal
+
+
+# sent before objects are deleted in bulk, with their queryset, so the receivers can read what they need about them
+# in a few queries, e.g. the tags of the recipes, which are deleted with them
+bulk_delete_started = Signal()
+# sent after them, once for all the objects deleted, including by the cascade
+bulk_delete_finished = Signal()
+
+_local = threading.local()
+
+
+class BulkDeletion:
+    """What the receivers of the delete signals recorded about the objects deleted, by app, e.g. records['recipe']"""
+
+    def __init__(self):
+        self.records = {}
+
+
+def current_deletion():
+    """Return the deletion in bulk in progress in the thread, if any"""
+    return getattr(_local, 'deletion', None)
+
+
+@contextmanager
+def bulk_deletion(queryset):
+    """Delete the objects of the queryset (and the ones the cascade deletes with them) in bulk
+
+    The delete signals are still sent for every object deleted, but while a deletion in bulk is in progress,
+    their receivers only record what they have to do, and do it once for all the objects when bulk_delete_finished
+    is sent, instead of running queries for every object.
+    """
+    if current_deletion() is not None:
+        # the objects are deleted as part of a bigger deletion, which finishes it
+        yield
+        return
+
+    deletion = BulkDeletion()
+    with transaction.atomic(using=queryset.db):
+        bulk_delete_started.send(sender=queryset.model, queryset=queryset, deletion=deletion)
+        _local.deletion = deletion
+        try:
+            yield
+        finally:
+            _local.deletion = None
+        bulk_delete_finished.send(sender=queryset.model, deletion=deletion)
+
+
+class BulkDeleteQuerySet(models.QuerySet):
+    """QuerySet whose delete() deletes the objects in bulk"""
+
+    def delete(self):
+        with bulk_deletion(self):
+            return super().delete()
@@ -0,0 +1,61 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.db.postgresql.base import DatabaseWrapper, close_pools
+
+
+# the settings compared, on top of the ones of the default database
+CONFIGURATIONS = (
+    ('new connection per request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': None}),
+    ('persistent connections', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': False, 'POOL': None}),
+    ('persistent connections + health checks', {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'POOL': None}),
+    ('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}),
+    ('pool + health checks', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True}),
+)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the connections to the database (see core/db/postgresql)"""
+    help = 'Compare the time taken by requests running a query, with new, persistent and pooled connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Number of requests of each thread')
+        parser.add_argument('--threads', type=int, default=4, help='Number of threads running the requests')
+
+    def run_requests(self, settings, count, pids):
+        """Run the requests in a thread, with its own connection like Django, saving the database processes used"""
+        db_connection = DatabaseWrapper(dict(connection.settings_dict, **settings), alias=connection.alias)
+        try:
+            for _ in range(count):
+                # like the request_started and request_finished signals
+                db_connection.close_if_unusable_or_obsolete()
+                with db_connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_backend_pid()')
+                    pids.add(cursor.fetchone()[0])
+                db_connection.close_if_unusable_or_obsolete()
+        finally:
+            db_connection.close()
+
+    def handle(self, *args, **options):
+        count, threads_count = options['requests'], options['threads']
+        for label, settings in CONFIGURATIONS:
+            settings.setdefault('POOL', {'min_size': threads_count, 'max_size': threads_count})
+            pids = set()
+            threads = [
+                threading.Thread(target=self.run_requests, args=(settings, count, pids))
+                for _ in range(threads_count)
+            ]
+
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = (time.perf_counter() - start) * 1000
+            close_pools()
+
+            self.stdout.write(
+                f'{label:<40} {elapsed / (count * threads_count):7.3f} ms per request   '
+                f'{len(pids):>5} connections opened'
+            )
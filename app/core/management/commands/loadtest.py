@@ -0,0 +1,158 @@
+import http.client
+import itertools
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from recipe.management.commands.benchmark_recipes import Command as BenchmarkCommand
+
+
+# the endpoints requested, one after the other
+PATHS = ('/api/recipe/recipes/', '/api/recipe/tags/', '/api/recipe/ingredients/')
+
+# the servers the command can start itself, with their settings
+SERVERS = {
+    # the development server, with the development settings, like docker-compose.yml
+    'runserver': {
+        'command': [sys.executable, 'manage.py', 'runserver', '--noreload', '{address}'],
+        'environment': {'DJANGO_SETTINGS_MODULE': 'app.settings'},
+    },
+    # gunicorn, with the production settings, like docker-compose.prod.yml (see gunicorn.conf.py)
+    'gunicorn': {
+        'command': [sys.executable, '-m', 'gunicorn', '--bind', '{address}'],
+        'environment': {
+            'DJANGO_SETTINGS_MODULE': 'app.settings_production',
+            'DJANGO_SECRET_KEY': os.environ.get('DJANGO_SECRET_KEY', settings.SECRET_KEY),
+            'DJANGO_ALLOWED_HOSTS': '127.0.0.1',
+            'GUNICORN_ACCESS_LOG': '',
+        },
+    },
+}
+
+
+class Command(BaseCommand):
+    """Django command to measure the throughput of the app, served by runserver and gunicorn, or by a running server"""
+    help = 'Send many requests at once to the recipe endpoints, and print how many were answered per second. ' \
+           'The servers are started one after the other on --port, unless --url is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='*', help=f"The servers started: {', '.join(SERVERS)} (all by default)")
+        parser.add_argument('--url', help='A running server to measure instead, e.g. http://localhost:8000')
+        parser.add_argument('--token', help='The token of the user requesting the running server')
+        parser.add_argument('--port', type=int, default=8123, help='The port of the servers started')
+        parser.add_argument('--requests', type=int, default=2000, help='Number of requests sent to each server')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of requests sent at once')
+        parser.add_argument('--recipes', type=int, default=200, help='Number of recipes of the user requesting')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            if not options['token']:
+                raise CommandError('--token is required with --url')
+            self.run(options['url'], options['url'], options['token'], options)
+            return
+
+        for name in options['servers']:
+            if name not in SERVERS:
+                raise CommandError(f"Unknown server {name}, choose from: {', '.join(SERVERS)}")
+
+        # the servers run in other processes, so the library of the user is committed, and deleted at the end
+        with transaction.atomic():
+            user = BenchmarkCommand().create_library(options['recipes'], 50, 200)
+            token = Token.objects.create(user=user)
+        try:
+            address = f"127.0.0.1:{options['port']}"
+            for name in options['servers'] or SERVERS:
+                server = self.start_server(name, address)
+                try:
+                    self.run(name, f'http://{address}', token.key, options)
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            user.delete()
+
+    def start_server(self, name, address):
+        """Start the server in another process, and wait until it accepts the connections"""
+        command = [part.format(address=address) for part in SERVERS[name]['command']]
+        server = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=dict(os.environ, **SERVERS[name]['environment']),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        host, port = address.split(':')
+        for _ in range(300):
+            if server.poll() is not None:
+                raise CommandError(f'{name} exited with the code {server.returncode}')
+            try:
+                socket.create_connection((host, int(port)), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.1)
+
+        server.terminate()
+        raise CommandError(f'{name} did not start')
+
+    def send_requests(self, url, token, requests, timings, errors):
+        """Send the requests one after the other on the same connection, like a client keeping it alive"""
+        url = urlsplit(url)
+        headers = {'Authorization': f'Token {token}', 'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        client = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        paths = itertools.cycle(random.sample(PATHS, len(PATHS)))
+
+        for _ in requests:
+            path = url.path.rstrip('/') + next(paths)
+            start = time.perf_counter()
+            # the server can close a connection kept alive (e.g. when gunicorn replaces a process after max_requests)
+            # and like the HTTP clients, the request is then sent again on a new connection
+            for attempt in range(2):
+                try:
+                    client.request('GET', path, headers=headers)
+                    response = client.getresponse()
+                    response.read()
+                    break
+                except (OSError, http.client.HTTPException):
+                    client.close()
+            else:
+                errors.append(None)
+                continue
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status != 200:
+                errors.append(response.status)
+        client.close()
+
+    def run(self, name, url, token, options):
+        """Send the requests to the server, from a thread per concurrent request, and print the results"""
+        # a few requests first, so the server has loaded everything and opened its connections
+        self.send_requests(url, token, range(len(PATHS) * options['concurrency']), [], [])
+
+        # shared by the threads, which take the next request from it until there's none left
+        requests = iter(range(options['requests']))
+        timings, errors = [], []
+        threads = [
+            threading.Thread(target=self.send_requests, args=(url, token, requests, timings, errors))
+            for _ in range(options['concurrency'])
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if len(timings) < 2:
+            raise CommandError(f'{name} answered none of the requests')
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{name:<10} {len(timings) / elapsed:8.1f} requests/s   mean {statistics.mean(timings):7.2f} ms   '
+            f'p50 {percentiles[49]:7.2f} ms   p95 {percentiles[94]:7.2f} ms   p99 {percentiles[98]:7.2f} ms   '
+            f'{len(errors)} errors'
+        )
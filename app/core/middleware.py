@@ -0,0 +1,127 @@
+import gzip
+import io
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    # optional, the responses are only compressed with gzip without it
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# the content types that are already compressed, which would only get bigger
+COMPRESSED_TYPES = ('image/', 'video/', 'audio/', 'application/gzip', 'application/zip')
+
+
+def parse_accept_encoding(header):
+    """Return the encodings the client accepts, from the Accept-Encoding header, with their quality"""
+    encodings = {}
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding:
+            encodings[encoding.lower()] = quality
+
+    return encodings
+
+
+def _gzip_string(content):
+    # mtime=0 so the same content is always compressed into the same bytes
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _gzip_sequence(sequence):
+    buffer = io.BytesIO()
+
+    def drain():
+        """Return what was compressed since the last call"""
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    with gzip.GzipFile(mode='wb', compresslevel=settings.COMPRESSION_GZIP_LEVEL, fileobj=buffer, mtime=0) as file:
+        for item in sequence:
+            file.write(item)
+            # every chunk is sent as soon as it's compressed, e.g. the progress of an import
+            file.flush()
+            yield drain()
+    yield drain()
+
+
+def _brotli_string(content):
+    return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for item in sequence:
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+# the functions compressing a response, and a streaming response, for every encoding
+ENCODERS = {
+    'gzip': (_gzip_string, _gzip_sequence),
+}
+if brotli is not None:
+    ENCODERS['br'] = (_brotli_string, _brotli_sequence)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress the responses in the first of COMPRESSION_ENCODINGS the client accepts
+
+    Like Django's GZipMiddleware, but with brotli when it's installed, which compresses JSON smaller and faster,
+    and without compressing the responses smaller than COMPRESSION_MIN_SIZE, which aren't worth the time.
+    """
+
+    def get_encoding(self, request):
+        """Return the encoding of the response, None if it shouldn't be compressed"""
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding in settings.COMPRESSION_ENCODINGS:
+            if encoding in ENCODERS and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+
+        return None
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if response.has_header('Content-Encoding') \
+                or response.get('Content-Type', '').startswith(COMPRESSED_TYPES):
+            return response
+
+        # the response depends on the Accept-Encoding header, for the caches between the server and the client
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.get_encoding(request)
+        if encoding is None:
+            return response
+
+        compress_string, compress_sequence = ENCODERS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content)
+            # the length isn't known until the whole response is compressed
+            del response['Content-Length']
+        else:
+            content = compress_string(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # the compressed response doesn't have the same bytes, so its ETag is weak, like with GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 3.1 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    # the through tables created by Django for the many to many fields only have a unique (recipe_id, tag_id) index,
+    # which serves the lookups that start from a recipe
+    # the filters start from the tags (or ingredients), so they need the columns the other way around
+    # as both columns are in the index, the database can answer those filters without reading the table at all
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tags_tag_recipe_idx ON core_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_ingredients_ingredient_recipe_idx;',
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1 on 2026-10-18 05:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge the tags (and ingredients) of a user that only differ by case, so the unique index can be created"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        column = f'{model_name.lower()}_id'
+
+        duplicates = model.objects \
+            .annotate(lower_name=Lower('name')) \
+            .values('user_id', 'lower_name') \
+            .annotate(count=Count('id'), kept_id=Min('id')) \
+            .filter(count__gt=1)
+        for duplicate in duplicates:
+            kept_id = duplicate['kept_id']
+            others = model.objects \
+                .annotate(lower_name=Lower('name')) \
+                .filter(user_id=duplicate['user_id'], lower_name=duplicate['lower_name']) \
+                .exclude(id=kept_id)
+            other_links = through.objects.filter(**{f'{column}__in': others.values('id')})
+            # a recipe can be linked to several duplicates, which would become the same link,
+            # so only its first link to one of them is kept
+            first_links = other_links.values('recipe_id').annotate(first_id=Min('id')).values('first_id')
+            other_links.exclude(id__in=first_links).delete()
+            # move the recipes of the duplicates to the one we keep, except the ones that already have it
+            already_linked = through.objects.filter(**{column: kept_id}).values('recipe_id')
+            other_links \
+                .exclude(recipe_id__in=already_linked) \
+                .update(**{column: kept_id})
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_through_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='core_ingredient_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='core_recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='core_tag_user_name_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1 on 2026-10-18 05:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # the duplicates were merged by the previous migration
+    # creating the indexes in the same transaction fails in PostgreSQL, because of the foreign key checks of the merge
+    dependencies = [
+        ('core', '0007_user_scoped_indexes'),
+    ]
+
+    operations = [
+        # Django 3.1 doesn't support unique constraints on expressions, so we create them by hand
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name_uniq ON core_tag (user_id, lower(name));',
+            reverse_sql='DROP INDEX core_tag_user_lower_name_uniq;',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_lower_name_uniq ON core_ingredient (user_id, lower(name));',
+            reverse_sql='DROP INDEX core_ingredient_user_lower_name_uniq;',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryVersion',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.1 on 2026-10-18 07:48
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+# a copy of recipe.search.VECTOR_SQL at the time of the migration, for all the recipes
+FILL_SQL = '''
+UPDATE core_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, core_recipe.title), 'A') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(core_tag.name, ' ') FROM core_tag
+        JOIN core_recipe_tags ON core_recipe_tags.tag_id = core_tag.id
+        WHERE core_recipe_tags.recipe_id = core_recipe.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(core_ingredient.name, ' ') FROM core_ingredient
+        JOIN core_recipe_ingredients ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+        WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+    ), '')), 'C')
+'''
+
+
+def create_search_indexes(apps, schema_editor):
+    """Index the search vectors and the titles, and fill the vectors of the existing recipes (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # pg_trgm ships with PostgreSQL, but not with every build of it, in which case the search has no typo tolerance
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone():
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute('CREATE INDEX core_recipe_title_trgm_idx ON core_recipe USING gin (title gin_trgm_ops)')
+        cursor.execute('CREATE INDEX core_recipe_search_idx ON core_recipe USING gin (search_vector)')
+        cursor.execute(FILL_SQL, {'config': settings.RECIPE_SEARCH_CONFIG})
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP INDEX IF EXISTS core_recipe_title_trgm_idx')
+        cursor.execute('DROP INDEX IF EXISTS core_recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_sync_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
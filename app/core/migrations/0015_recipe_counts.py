@@ -0,0 +1,47 @@
+# Generated by Django 3.1 on 2026-10-18 08:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Count the recipes of the existing tags and ingredients"""
+    for model_name in ('tag', 'ingredient'):
+        model = apps.get_model('core', model_name)
+        through = model._meta.get_field('recipe').through
+        counts = through.objects \
+            .filter(**{model_name: OuterRef('pk')}) \
+            .values(model_name) \
+            .annotate(count=Count('pk')) \
+            .values('count')
+        model.objects.update(recipe_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_time_price_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingr_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
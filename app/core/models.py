@@ -1,6 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
+from core.deletion import BulkDeleteQuerySet, bulk_deletion
+from core.storage import ContentAddressedStorage
 import uuid
 import os
 
@@ -13,7 +19,8 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
-class UserManager(BaseUserManager):
+# deleting users deletes their recipes, tags and ingredients in bulk (see core/deletion.py)
+class UserManager(BaseUserManager.from_queryset(BulkDeleteQuerySet)):
     """A class that provides the helper functions for creating a user, or creating a superuser"""
 
     def create_user(self, email, password=None, **extra_fields):
@@ -50,6 +57,81 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def delete(self, using=None, keep_parents=False):
+        # the recipes, tags and ingredients of the user are deleted with it in bulk (see core/deletion.py)
+        with bulk_deletion(type(self).objects.filter(pk=self.pk)):
+            return super().delete(using, keep_parents)
+
+
+class RecipeAttributeManager(models.Manager.from_queryset(BulkDeleteQuerySet)):
+    """Manager for the tags and ingredients"""
+
+    def _by_lower_name(self, user, lower_names):
+        objects = self.annotate(lower_name=Lower('name')).filter(user=user, lower_name__in=lower_names)
+        return {obj.lower_name: obj for obj in objects}
+
+    def _lower(self, names):
+        """Return the names in lowercase by name, lowered by the database like the unique index
+
+        Python lowers some letters differently (e.g. 'İ' or a final 'Σ'), so its lowercase can't be compared to it.
+        """
+        names = list(names)
+        lowered = {}
+        with connections[self.db].cursor() as cursor:
+            # a few hundred at a time, the database limits the number of columns
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                cursor.execute('SELECT ' + ', '.join(['LOWER(%s)'] * len(chunk)), chunk)
+                lowered.update(zip(chunk, cursor.fetchone()))
+
+        return lowered
+
+    def get_or_create_by_names(self, user, names):
+        """Return the objects of the user with the given names, creating the missing ones
+
+        The names are matched ignoring the case, like the unique index on the table.
+        The objects are returned in the same order as the names.
+        It takes two queries if all the objects exist, and four otherwise, whatever the number of names.
+        """
+        if not names:
+            return []
+        lowered = self._lower(set(names))
+
+        # the first spelling of each name is the one used for creating the object
+        spellings = {}
+        for name in names:
+            spellings.setdefault(lowered[name], name)
+
+        found = self._by_lower_name(user, list(spellings))
+        missing = [name for lower_name, name in spellings.items() if lower_name not in found]
+        if missing:
+            # another request may create some of them in the meantime,
+            # in that case the insert skips them and we fetch the ones it created
+            self.bulk_create([self.model(user=user, name=name) for name in missing], ignore_conflicts=True)
+            found.update(self._by_lower_name(user, [lowered[name] for name in missing]))
+
+        return [found[lowered[name]] for name in names]
+
+    def update_recipe_counts(self, ids):
+        """Count the recipes of the objects again, after they were linked to or unlinked from recipes
+
+        It takes a single query, whatever the number of objects.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+
+        # e.g. the tag column of the table linking the recipes to the tags
+        through = self.model._meta.get_field('recipe').through
+        column = self.model._meta.model_name
+        counts = through.objects \
+            .filter(**{column: OuterRef('pk')}) \
+            .values(column) \
+            .annotate(count=Count('pk')) \
+            .values('count')
+        # the count is rendered with the object, so it's modified too
+        self.filter(pk__in=ids).update(recipe_count=Coalesce(Subquery(counts), 0), updated_at=timezone.now())
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
@@ -58,6 +140,27 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,   # this is the recommended way to link to the authenticated user
         on_delete=models.CASCADE,   # this says that if the user is deleted, the tag is also deleted
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # auto_now is only set by save(), the bulk updates must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+    # the number of recipes with the tag, maintained by the signals (see recipe/signals.py) and the bulk operations
+    # it can be computed again with: python manage.py update_recipe_counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        # the tags are always listed for a single user and sorted by name
+        # with this index, the database finds them already sorted, instead of reading the whole table and sorting
+        # there's also a unique index on (user, lower(name)), created in the migration 0008,
+        # because Django doesn't support constraints on expressions yet
+        indexes = [
+            models.Index(fields=['user', 'name'], name='core_tag_user_name_idx'),
+            # the changes are synchronized in the order they were made (see recipe/sync.py)
+            models.Index(fields=['user', 'updated_at', 'id'], name='core_tag_user_updated_idx'),
+            # the tags are filtered on being used (assigned_only) and ordered by popularity
+            models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -71,6 +174,19 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        # same as for the tags
+        indexes = [
+            models.Index(fields=['user', 'name'], name='core_ingredient_user_name_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='core_ingr_user_updated_idx'),
+            models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingr_user_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -88,7 +204,85 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path, storage=ContentAddressedStorage())
+    # the resized copies of the image, by size and format, e.g. {"128": {"jpeg": "uploads/recipe/variants/..."}}
+    image_variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # also updated when the tags or ingredients of the recipe change (see recipe/signals.py)
+    updated_at = models.DateTimeField(auto_now=True)
+    # the words of the title, tags and ingredients, maintained by the database (see recipe/search.py)
+    # with PostgreSQL, it has a GIN index and the title a trigram index, both created by the migration,
+    # since the other databases can't create them
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # e.g. the bulk endpoint deletes many recipes at once (see core/deletion.py)
+    objects = BulkDeleteQuerySet.as_manager()
+
+    class Meta:
+        # the recipes are always listed for a single user, from the newest to the oldest
+        indexes = [
+            models.Index(fields=['user', 'id'], name='core_recipe_user_id_idx'),
+            # the storage names the images after their content, so the recipes with the same image share the file
+            # and it can only be deleted when no recipe has it anymore
+            models.Index(fields=['image'], name='core_recipe_image_idx'),
+            models.Index(fields=['user', 'created_at'], name='core_recipe_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='core_recipe_user_updated_idx'),
+            # the recipes are filtered and ordered by time and price (see recipe/filters.py)
+            models.Index(fields=['user', 'time_minutes', 'id'], name='core_recipe_user_time_idx'),
+            models.Index(fields=['user', 'price', 'id'], name='core_recipe_user_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient, so the clients synchronizing their library can delete it too"""
+    # like the library version, it's not a foreign key, since the objects of a user are deleted before the user
+    user_id = models.IntegerField()
+    # the name of the model of the deleted object, e.g. recipe
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at', 'id'], name='core_tomb_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class LibraryVersionManager(models.Manager):
+    """Manager for the versions of the libraries"""
+
+    def current(self, user_id):
+        """Return the version of the library of the user"""
+        return self.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+    def bump(self, user_id):
+        """Increment the version of the library of the user"""
+        if self.filter(user_id=user_id).update(version=models.F('version') + 1):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, version=1)
+        except IntegrityError:
+            # another request created it in the meantime
+            self.filter(user_id=user_id).update(version=models.F('version') + 1)
+
+
+class LibraryVersion(models.Model):
+    """Version of the library (recipes, tags and ingredients) of a user, incremented whenever it changes"""
+    # it's not a column of the user, because the user is saved with all its fields from copies that may be old
+    # (e.g. the one cached by the authentication), which would set the version back
+    # and it's not a foreign key, because the recipes of a deleted user bump it after the cascade may have deleted it
+    user_id = models.IntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    objects = LibraryVersionManager()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
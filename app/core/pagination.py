@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
+
+
+class PageSizeMixin:
+    """Let the client choose the page size with ?page_size=N, up to API_MAX_PAGE_SIZE"""
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.API_MAX_PAGE_SIZE
+
+
+class PageNumberPagination(PageSizeMixin, pagination.PageNumberPagination):
+    """Paginate with ?page=N"""
+
+
+class CursorPagination(PageSizeMixin, pagination.CursorPagination):
+    """Paginate with an opaque ?cursor= pointing at the last item of the previous page"""
+
+    # the page number pagination translates to LIMIT/OFFSET, so the database has to read and discard
+    # every row before the requested page, which gets slower and slower as the client goes deeper
+    # the cursor pagination instead filters on the ordering column (WHERE id < last seen id),
+    # so every page costs the same as long as that column is indexed
+    def get_ordering(self, request, queryset, view):
+        """Use the ordering declared by the view, which must be backed by an index"""
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+
+        return super().get_ordering(request, queryset, view)
+
+
+class OptionalPagination(pagination.BasePagination):
+    """Paginate list endpoints only when the client asks for it
+
+    Clients that don't send any pagination parameter keep receiving the full list, like before.
+    ?pagination=page (or ?page=N / ?page_size=N) selects the page number pagination,
+    ?pagination=cursor (or ?cursor=...) selects the cursor pagination.
+    """
+    mode_query_param = 'pagination'
+    styles = {
+        'page': PageNumberPagination,
+        'cursor': CursorPagination,
+    }
+
+    def __init__(self):
+        self.paginator = None
+
+    def get_mode(self, request):
+        """Return the pagination style requested by the client, or None if it didn't ask for one"""
+        mode = request.query_params.get(self.mode_query_param)
+        if mode is None:
+            if CursorPagination.cursor_query_param in request.query_params:
+                return 'cursor'
+            if PageNumberPagination.page_query_param in request.query_params or \
+                    PageNumberPagination.page_size_query_param in request.query_params:
+                return 'page'
+            return None
+
+        if mode not in self.styles:
+            message = _('Invalid pagination, expected one of: %s') % ', '.join(sorted(self.styles))
+            raise ValidationError({self.mode_query_param: [message]})
+
+        return mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = self.get_mode(request)
+        if mode is None:
+            # returning None tells the view not to paginate
+            return None
+
+        self.paginator = self.styles[mode]()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    @property
+    def display_page_controls(self):
+        return self.paginator is not None and self.paginator.display_page_controls
+
+    def to_html(self):
+        return self.paginator.to_html()
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from core.authentication import invalidate_token
+from core.models import LibraryVersion, Tombstone
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token right away"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, **kwargs):
+    """Forget the cached copies of a user that changed (e.g. was deactivated)"""
+    if created:
+        return
+
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    """Forget the version and the tombstones of the library of a deleted user"""
+    # the user is deleted after its recipes, tags and ingredients, which have bumped the version and left tombstones
+    LibraryVersion.objects.filter(user_id=instance.pk).delete()
+    Tombstone.objects.filter(user_id=instance.pk).delete()
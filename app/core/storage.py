@@ -0,0 +1,50 @@
+import hashlib
+import os
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_sha256(file):
+    """Return the SHA-256 of a file, unless the upload handler already computed it while receiving the file"""
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        for chunk in file.chunks():
+            sha256.update(chunk)
+        file.seek(0)
+        digest = sha256.hexdigest()
+
+    return digest
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names the files after the SHA-256 of their content
+
+    The files are saved in the directory of the name they are given, but their own name is replaced by their hash,
+    e.g. uploads/recipe/<uuid>.jpg is saved as uploads/recipe/ab/ab12...ef.jpg
+    So the same file saved many times is only stored once, and a file never changes once saved.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = file_sha256(content)
+        # two levels of directories, so a single directory doesn't end up with millions of files
+        name = os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+        if self.exists(name):
+            # the file is used again, so the garbage collection must not consider it as an old orphan
+            os.utime(self.path(name))
+            return name
+
+        # write the file under a temporary name and rename it,
+        # so another request saving the same file at the same time never sees a partial copy
+        temp_name = super().save(f'{name}.part', content)
+        os.replace(self.path(temp_name), self.path(name))
+
+        return name
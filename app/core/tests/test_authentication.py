@@ -0,0 +1,95 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from core.authentication import CachedTokenAuthentication, LRUCache, local_tokens
+
+
+class LRUCacheTests(TestCase):
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used entry is forgotten when the cache is full"""
+        lru = LRUCache(max_size=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        # assertions
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    @patch('time.monotonic')
+    def test_expired_entry(self, monotonic):
+        """Test that the entries expire after the timeout"""
+        lru = LRUCache(max_size=2, timeout=60)
+        monotonic.return_value = 100
+        lru.set('a', 1)
+
+        monotonic.return_value = 159
+        value_before = lru.get('a')
+        monotonic.return_value = 161
+        value_after = lru.get('a')
+
+        # assertions
+        self.assertEqual(value_before, 1)
+        self.assertIsNone(value_after)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self) -> None:
+        local_tokens.clear()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'test-123')
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_token_cached(self):
+        """Test that the user of a token is only looked up in the database once"""
+        user1, _ = self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user2, token = self.authentication.authenticate_credentials(self.token.key)
+
+        # assertions
+        self.assertEqual(user1, self.user)
+        self.assertEqual(user2, self.user)
+        self.assertEqual(token.key, self.token.key)
+        # each request gets its own copy of the user
+        self.assertIsNot(user1, user2)
+
+    def test_deleted_token_invalidated(self):
+        """Test that a deleted token is rejected right away"""
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.token.delete()
+
+        # assertions
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_invalidated(self):
+        """Test that the token of a deactivated user is rejected right away"""
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        # assertions
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_shared_cache(self):
+        """Test that the tokens are also shared with the other processes through the shared cache"""
+        self.authentication.authenticate_credentials(self.token.key)
+        # simulate another process, which doesn't have the token in its own cache
+        local_tokens.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        # assertions
+        self.assertEqual(user, self.user)
+        self.assertIsNone(cache.get(f'auth-token:{self.token.key}'))
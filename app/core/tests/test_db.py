@@ -0,0 +1,137 @@
+import threading
+import time
+from django.db import connection
+from django.db.utils import Error, OperationalError, InterfaceError
+from django.test import TestCase
+from core.db.postgresql.base import DatabaseWrapper, close_pools
+
+
+def make_connection(**settings):
+    """Return a new connection to the test database, with the settings"""
+    settings_dict = dict(connection.settings_dict, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, POOL=None)
+    settings_dict.update(settings)
+
+    # the alias of the test database, which django.contrib.postgres looks up when the connection is opened
+    return DatabaseWrapper(settings_dict, alias=connection.alias)
+
+
+def backend_pid(db_connection):
+    """Return the id of the database process of the connection"""
+    with db_connection.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+def request(db_connection):
+    """Simulate the end of a request and the start of the next one, which close the obsolete connections"""
+    db_connection.close_if_unusable_or_obsolete()
+    db_connection.close_if_unusable_or_obsolete()
+
+
+class DatabaseBackendTests(TestCase):
+    """Test the health checks and the pool of the PostgreSQL backend"""
+
+    def setUp(self):
+        # the connections are closed by the database, like when it restarts, from another connection
+        self.admin = make_connection()
+        self.addCleanup(self.admin.close)
+        self.addCleanup(close_pools)
+
+    def terminate(self, pid):
+        """Close the connection of the database process, and wait until it's gone"""
+        with self.admin.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+            for _ in range(50):
+                cursor.execute('SELECT 1 FROM pg_stat_activity WHERE pid = %s', [pid])
+                if cursor.fetchone() is None:
+                    return
+                time.sleep(0.1)
+
+    def test_persistent_connection(self):
+        """Test that the connection is kept between the requests with CONN_MAX_AGE"""
+        db_connection = make_connection(CONN_MAX_AGE=60)
+        self.addCleanup(db_connection.close)
+
+        pid = backend_pid(db_connection)
+        request(db_connection)
+
+        # assertions
+        self.assertEqual(backend_pid(db_connection), pid)
+
+    def test_health_check(self):
+        """Test that a persistent connection closed by the database is replaced before being used"""
+        db_connection = make_connection(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        unchecked_connection = make_connection(CONN_MAX_AGE=60)
+        self.addCleanup(db_connection.close)
+        self.addCleanup(unchecked_connection.close)
+        pid, unchecked_pid = backend_pid(db_connection), backend_pid(unchecked_connection)
+        request(db_connection)
+        request(unchecked_connection)
+
+        self.terminate(pid)
+        self.terminate(unchecked_pid)
+
+        # assertions
+        self.assertNotEqual(backend_pid(db_connection), pid)
+        with self.assertRaises((OperationalError, InterfaceError)):
+            backend_pid(unchecked_connection)
+
+    def test_pool(self):
+        """Test that the connections are given back to the pool, and reused instead of connecting again"""
+        pool = {'min_size': 1, 'max_size': 2}
+        db_connection, other_connection = make_connection(POOL=pool), make_connection(POOL=pool)
+        self.addCleanup(db_connection.close)
+        self.addCleanup(other_connection.close)
+
+        pid = backend_pid(db_connection)
+        db_connection.close()
+        pid_again = backend_pid(db_connection)
+        # used at the same time, e.g. by two threads
+        other_pid = backend_pid(other_connection)
+
+        # assertions
+        self.assertEqual(pid_again, pid)
+        self.assertNotEqual(other_pid, pid)
+
+    def test_pool_health_check(self):
+        """Test that a connection of the pool closed by the database is replaced before being used"""
+        db_connection = make_connection(POOL={'min_size': 1, 'max_size': 2}, CONN_HEALTH_CHECKS=True)
+        self.addCleanup(db_connection.close)
+        pid = backend_pid(db_connection)
+        db_connection.close()
+
+        self.terminate(pid)
+
+        # assertions
+        self.assertNotEqual(backend_pid(db_connection), pid)
+
+    def test_pool_exhausted(self):
+        """Test that the pool fails when more than max_size connections are in use for timeout seconds"""
+        pool = {'min_size': 0, 'max_size': 1, 'timeout': 0.2}
+        db_connection, other_connection = make_connection(POOL=pool), make_connection(POOL=pool)
+        self.addCleanup(db_connection.close)
+        self.addCleanup(other_connection.close)
+        backend_pid(db_connection)
+
+        start = time.monotonic()
+        # assertions
+        with self.assertRaises(Error):
+            backend_pid(other_connection)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_pool_wait(self):
+        """Test that a thread waits for a connection to be given back when they are all in use"""
+        pool = {'min_size': 1, 'max_size': 1, 'timeout': 10}
+        db_connection, other_connection = make_connection(POOL=pool), make_connection(POOL=pool)
+        self.addCleanup(db_connection.close)
+        self.addCleanup(other_connection.close)
+        pid = backend_pid(db_connection)
+        # e.g. a thread generating image variants, done with its connection a moment later
+        db_connection.inc_thread_sharing()
+        self.addCleanup(db_connection.dec_thread_sharing)
+        release = threading.Timer(0.2, db_connection.close)
+        release.start()
+        self.addCleanup(release.cancel)
+
+        # assertions
+        self.assertEqual(backend_pid(other_connection), pid)
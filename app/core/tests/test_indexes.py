@@ -0,0 +1,70 @@
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.db import connection, IntegrityError
+from django.test import TestCase
+from core import models
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The query plans are specific to PostgreSQL')
+class IndexTests(TestCase):
+    """Test that the user scoped queries of the API are backed by an index"""
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user('test@fake.com', 'test-123')
+        for i in range(10):
+            models.Tag.objects.create(user=self.user, name=f'Tag {i}')
+            models.Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+            models.Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=5, price=5.00)
+
+        # the test tables are so small that the planner would rather read them sequentially
+        # so we tell it not to, which shows which index it would use on a big table
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_tags_listing_uses_index(self):
+        """Test that listing the tags of a user reads them sorted from the (user, name) index"""
+        plan = models.Tag.objects.filter(user=self.user).order_by('-name').explain()
+
+        # assertions
+        self.assertIn('Index Scan Backward using core_tag_user_name_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_ingredients_listing_uses_index(self):
+        """Test that listing the ingredients of a user reads them sorted from the (user, name) index"""
+        plan = models.Ingredient.objects.filter(user=self.user).order_by('-name').explain()
+
+        # assertions
+        self.assertIn('Index Scan Backward using core_ingredient_user_name_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_recipes_listing_uses_index(self):
+        """Test that listing the recipes of a user reads them sorted from the (user, id) index"""
+        plan = models.Recipe.objects.filter(user=self.user).order_by('-id').explain()
+
+        # assertions
+        self.assertIn('Index Scan Backward using core_recipe_user_id_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class UniqueNameTests(TestCase):
+    """Test the unique index on the lowercase names of the tags and ingredients"""
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user('test@fake.com', 'test-123')
+
+    def test_tag_name_unique_ignoring_case(self):
+        """Test that a user can't have two tags that only differ by case"""
+        models.Tag.objects.create(user=self.user, name='Vegan')
+
+        # assertions
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=self.user, name='vegan')
+
+    def test_same_name_for_other_users(self):
+        """Test that different users can have a tag with the same name"""
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        models.Tag.objects.create(user=self.user, name='Vegan')
+        models.Tag.objects.create(user=user2, name='Vegan')
+
+        # assertions
+        self.assertEqual(models.Tag.objects.filter(name='Vegan').count(), 2)
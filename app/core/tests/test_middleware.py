@@ -0,0 +1,82 @@
+import gzip
+import unittest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from core import middleware
+from core.middleware import CompressionMiddleware
+
+
+CONTENT = b'{"title":"Recipe"}' * 200
+
+
+@override_settings(COMPRESSION_ENCODINGS=['br', 'gzip'], COMPRESSION_MIN_SIZE=1024)
+class CompressionMiddlewareTests(TestCase):
+    """Test the compression of the responses"""
+
+    def respond(self, response, accept_encoding='gzip, deflate'):
+        """Return the response after the middleware, for a request accepting the encodings"""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compress_gzip(self):
+        """Test that the responses are compressed with gzip, with a weak ETag"""
+        response = HttpResponse(CONTENT, content_type='application/json')
+        response['ETag'] = '"abc"'
+
+        response = self.respond(response)
+
+        # assertions
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_not_compressed(self):
+        """Test that the small responses, the compressed types, and the refused encodings aren't compressed"""
+        small = self.respond(HttpResponse(b'{}', content_type='application/json'))
+        image = self.respond(HttpResponse(CONTENT, content_type='image/jpeg'))
+        refused = self.respond(HttpResponse(CONTENT, content_type='application/json'), 'gzip;q=0, identity')
+        no_header = self.respond(HttpResponse(CONTENT, content_type='application/json'), '')
+
+        # assertions
+        for response in (small, image, refused, no_header):
+            self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(refused.content, CONTENT)
+        self.assertIn('Accept-Encoding', refused['Vary'])
+
+    @override_settings(COMPRESSION_ENCODINGS=[])
+    def test_disabled(self):
+        """Test that nothing is compressed without encodings"""
+        response = self.respond(HttpResponse(CONTENT, content_type='application/json'))
+
+        # assertions
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compress_streaming(self):
+        """Test that the streaming responses are compressed a chunk at a time"""
+        response = self.respond(StreamingHttpResponse(iter([b'{"line":1}\n', b'{"line":2}\n'])))
+
+        chunks = list(response.streaming_content)
+
+        # assertions
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertGreaterEqual(len(chunks), 3)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), b'{"line":1}\n{"line":2}\n')
+
+    @unittest.skipIf(middleware.brotli is None, 'Brotli is not installed')
+    def test_compress_brotli(self):
+        """Test that brotli is preferred when the client accepts it"""
+        response = self.respond(HttpResponse(CONTENT, content_type='application/json'), 'gzip, deflate, br')
+
+        # assertions
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), CONTENT)
+
+    def test_parse_accept_encoding(self):
+        """Test that the encodings are parsed with their quality"""
+        encodings = middleware.parse_accept_encoding('gzip;q=0.5, BR, identity;q=0, *;q=bad')
+
+        # assertions
+        self.assertEqual(encodings, {'gzip': 0.5, 'br': 1.0, 'identity': 0.0, '*': 0.0})
@@ -96,3 +96,60 @@ class ModelTests(TestCase):
 
         # assertions
         self.assertEqual(file_path, expected_path)
+
+    def test_get_or_create_by_names(self):
+        """Test that the tags are matched ignoring the case, and that only the missing ones are created"""
+        user = sample_user()
+        vegan = models.Tag.objects.create(user=user, name='Vegan')
+        # the tags of other users are never returned
+        models.Tag.objects.create(user=sample_user('other@fake.com'), name='Dessert')
+
+        with self.assertNumQueries(4):
+            tags = models.Tag.objects.get_or_create_by_names(user, ['vegan', 'Dessert', 'Quick', 'dessert'])
+        with self.assertNumQueries(2):
+            tags_again = models.Tag.objects.get_or_create_by_names(user, ['Dessert', 'QUICK'])
+
+        # assertions
+        self.assertEqual(tags[0], vegan)
+        self.assertEqual([tag.name for tag in tags[1:]], ['Dessert', 'Quick', 'Dessert'])
+        self.assertEqual(tags[1], tags[3])
+        self.assertEqual(tags_again, tags[1:3])
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 3)
+
+    def test_get_or_create_by_names_not_ascii(self):
+        """Test that the names Python lowers differently from the database are matched too"""
+        user = sample_user()
+
+        tags = models.Tag.objects.get_or_create_by_names(user, ['İskender', 'ΟΔΟΣ'])
+        tags_again = models.Tag.objects.get_or_create_by_names(user, ['İSKENDER', 'ΟΔΟΣ'])
+
+        # assertions
+        self.assertEqual([tag.name for tag in tags], ['İskender', 'ΟΔΟΣ'])
+        self.assertEqual(tags_again, tags)
+
+    def test_update_recipe_counts(self):
+        """Test that the recipes of the tags are counted again in a single query"""
+        user = sample_user()
+        tags = [models.Tag.objects.create(user=user, name=name) for name in ('Vegan', 'Quick', 'Unused')]
+        recipe = models.Recipe.objects.create(user=user, title='Salad', time_minutes=5, price=3.00)
+        # linked without the signals, so the counts are stale
+        models.Recipe.tags.through.objects.bulk_create(
+            models.Recipe.tags.through(recipe=recipe, tag=tag) for tag in tags[:2]
+        )
+        models.Tag.objects.filter(pk=tags[2].pk).update(recipe_count=5)
+
+        with self.assertNumQueries(1):
+            models.Tag.objects.update_recipe_counts(tag.pk for tag in tags)
+
+        # assertions
+        self.assertEqual([tag.recipe_count for tag in models.Tag.objects.order_by('id')], [1, 1, 0])
+
+    def test_library_version_bump(self):
+        """Test that the version of a library starts at 0 and is incremented"""
+        versions = [models.LibraryVersion.objects.current(1234)]
+        for _ in range(2):
+            models.LibraryVersion.objects.bump(1234)
+            versions.append(models.LibraryVersion.objects.current(1234))
+
+        # assertions
+        self.assertEqual(versions, [0, 1, 2])
@@ -0,0 +1,62 @@
+import datetime
+import io
+import unittest
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from core import renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+@unittest.skipIf(renderers.orjson is None, 'orjson is not installed')
+class FastJSONTests(TestCase):
+    """Test that orjson renders and parses JSON exactly like the standard library"""
+
+    def test_render_same_as_json_renderer(self):
+        """Test that the data is rendered with the same bytes as JSONRenderer"""
+        data = {
+            'id': 1,
+            'title': 'Crème brûlée\u2028',
+            'price': Decimal('3.50'),
+            'created_at': datetime.datetime(2020, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc),
+            'detail': _('Not found.'),
+            'counts': {1: 2},
+            'ids': {3},
+            'nested': [{'a': None, 'b': True, 'c': 1.5}],
+        }
+        # orjson can't encode the integers bigger than 64 bits
+        big = {'id': 2 ** 70}
+
+        content = FastJSONRenderer().render(data)
+        content_big = FastJSONRenderer().render(big)
+
+        # assertions
+        self.assertEqual(content, JSONRenderer().render(data))
+        self.assertEqual(content_big, JSONRenderer().render(big))
+
+    def test_render_indented(self):
+        """Test that indented JSON, which orjson can't render the same way, is rendered by JSONRenderer"""
+        data = {'id': 1, 'tags': [1, 2]}
+        context = {'indent': 4}
+
+        content = FastJSONRenderer().render(data, 'application/json', context)
+
+        # assertions
+        self.assertEqual(content, JSONRenderer().render(data, 'application/json', context))
+        self.assertIn(b'\n    ', content)
+
+    def test_parse(self):
+        """Test that the JSON is parsed like JSONParser, and the invalid JSON rejected"""
+        content = '{"title": "Crème brûlée", "price": "3.50", "tags": [1, 2]}'.encode()
+
+        data = FastJSONParser().parse(io.BytesIO(content))
+
+        # assertions
+        self.assertEqual(data, JSONParser().parse(io.BytesIO(content)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"title": '))
@@ -0,0 +1,38 @@
+import hashlib
+import os
+import tempfile
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.storage = ContentAddressedStorage(location=self.temp_dir.name)
+
+    def test_file_named_after_content(self):
+        """Test that the files are saved under the SHA-256 of their content, in the directory of the given name"""
+        digest = hashlib.sha256(b'pancakes').hexdigest()
+
+        name = self.storage.save('uploads/recipe/Pancakes.JPG', ContentFile(b'pancakes'))
+
+        # assertions
+        self.assertEqual(name, f'uploads/recipe/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'pancakes')
+
+    def test_same_content_stored_once(self):
+        """Test that saving the same content twice returns the same file, and that no temporary file is left"""
+        name1 = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'pancakes'))
+        name2 = self.storage.save('uploads/recipe/b.jpg', ContentFile(b'pancakes'))
+        name3 = self.storage.save('uploads/recipe/c.jpg', ContentFile(b'waffles'))
+
+        directory = os.path.dirname(self.storage.path(name1))
+
+        # assertions
+        self.assertEqual(name1, name2)
+        self.assertNotEqual(name1, name3)
+        self.assertEqual(os.listdir(directory), [os.path.basename(name1)])
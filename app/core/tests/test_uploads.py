@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+import tempfile
+import tracemalloc
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, RequestFactory, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from core.uploads import BoundedImageMultiPartParser
+
+
+def image_file(size, image_format='PNG', mode='L', padding=0):
+    """Return an uploaded image of the given size, followed by padding random bytes to make the file bigger"""
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+
+    return SimpleUploadedFile(f'image.{image_format.lower()}', buffer.getvalue() + os.urandom(padding))
+
+
+# the tests build the whole request body in memory first, then measure the memory used to parse it,
+# which stays far below the size of the file (or of the decoded image) because it's streamed to disk
+class BoundedImageUploadTests(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.settings_override = override_settings(
+            FILE_UPLOAD_TEMP_DIR=self.temp_dir.name,
+            RECIPE_IMAGE_MAX_SIZE=8 * 1024 * 1024,
+            RECIPE_IMAGE_MAX_DIMENSION=2000,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def parse(self, upload):
+        """Parse a request uploading the file, returning the uploaded files (or the error) and the peak memory used"""
+        request = Request(RequestFactory().post('/', {'image': upload}), parsers=[BoundedImageMultiPartParser()])
+        tracemalloc.start()
+        try:
+            result = request.FILES
+        except ParseError as exc:
+            result = exc
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return result, peak
+
+    def test_upload_streamed_to_disk(self):
+        """Test that a big upload is written to the temporary directory without being held in memory"""
+        files, peak = self.parse(image_file((100, 100), 'JPEG', 'RGB', padding=6 * 1024 * 1024))
+        self.addCleanup(files['image'].close)
+
+        # assertions
+        self.assertEqual(os.path.dirname(files['image'].temporary_file_path()), self.temp_dir.name)
+        self.assertGreater(files['image'].size, 6 * 1024 * 1024)
+        with open(files['image'].temporary_file_path(), 'rb') as file:
+            self.assertEqual(files['image'].sha256, hashlib.sha256(file.read()).hexdigest())
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_too_big_file_rejected(self):
+        """Test that a file bigger than RECIPE_IMAGE_MAX_SIZE is rejected, and its temporary file removed"""
+        error, peak = self.parse(image_file((100, 100), 'JPEG', 'RGB', padding=12 * 1024 * 1024))
+
+        # assertions
+        self.assertIsInstance(error, ParseError)
+        self.assertIn('bytes', str(error.detail))
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_too_many_pixels_rejected(self):
+        """Test that an image with too many pixels is rejected from its header, without decoding it"""
+        # a few kilobytes once compressed, but 36MB once decoded
+        upload = image_file((6000, 6000))
+        error, peak = self.parse(upload)
+
+        # assertions
+        self.assertLess(upload.size, 100 * 1024)
+        self.assertIsInstance(error, ParseError)
+        self.assertIn('pixels', str(error.detail))
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_not_an_image_left_to_validation(self):
+        """Test that a file that isn't an image is received, so the image field can report it"""
+        files, _ = self.parse(SimpleUploadedFile('image.jpg', os.urandom(2 * 1024 * 1024)))
+        self.addCleanup(files['image'].close)
+
+        # assertions
+        self.assertEqual(files['image'].size, 2 * 1024 * 1024)
@@ -0,0 +1,95 @@
+import os
+import tempfile
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import resolve
+from django.utils.http import http_date
+from core import views
+
+
+HASH = 'ab' * 32
+
+
+@override_settings(FILES_CACHE_MAX_AGE=3600)
+class ServeFileTests(TestCase):
+    """Test the static and media files served by the app"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name in (f'{HASH}.jpg', 'photo.jpg', 'base.0123456789ab.css'):
+            with open(os.path.join(self.directory.name, name), 'wb') as file:
+                file.write(b'content')
+
+    def serve(self, path, headers=None, **kwargs):
+        request = RequestFactory().get(f'/media/{path}', **(headers or {}))
+
+        return views.serve(request, path, self.directory.name, **kwargs)
+
+    def test_serve_immutable(self):
+        """Test that the files named after their content can be cached forever"""
+        media = self.serve(f'{HASH}.jpg', immutable=views.IMMUTABLE_MEDIA)
+        static = self.serve('base.0123456789ab.css', immutable=views.IMMUTABLE_STATIC)
+
+        # assertions
+        self.assertEqual(b''.join(media.streaming_content), b'content')
+        self.assertEqual(media['Content-Type'], 'image/jpeg')
+        for response in (media, static):
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_serve_mutable(self):
+        """Test that the other files are cached FILES_CACHE_MAX_AGE seconds, and answered 304 when not modified"""
+        response = self.serve('photo.jpg', immutable=views.IMMUTABLE_MEDIA)
+        not_modified = self.serve('photo.jpg', {'HTTP_IF_MODIFIED_SINCE': http_date()})
+
+        # assertions
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_serve_missing(self):
+        """Test that the missing files aren't found, and the ones outside of the directory are refused"""
+        # assertions
+        with self.assertRaises(Http404):
+            self.serve('missing.jpg')
+        for path in ('../photo.jpg', 'uploads/../../etc/passwd'):
+            with self.assertRaises(SuspiciousFileOperation):
+                self.serve(path)
+            with self.assertRaises(SuspiciousFileOperation):
+                self.serve(path, accel_redirect='/internal/media/')
+
+    def test_accel_redirect(self):
+        """Test that nginx is asked to send the file with X-Accel-Redirect"""
+        response = self.serve(f'uploads/recipe/ab/{HASH}.jpg', immutable=views.IMMUTABLE_MEDIA,
+                              accel_redirect='/internal/media/')
+
+        # assertions
+        self.assertEqual(response['X-Accel-Redirect'], f'/internal/media/uploads/recipe/ab/{HASH}.jpg')
+        self.assertFalse(response.has_header('Content-Type'))
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class FilesUrlTests(TestCase):
+    """Test that the static and media files are served by the app"""
+
+    def test_files_urls(self):
+        """Test that the static and media files are served with DEBUG off too, unlike with static()"""
+        media = resolve(f'/media/uploads/recipe/ab/{HASH}.jpg')
+        static = resolve('/static/admin/css/base.css')
+
+        # assertions
+        self.assertEqual(media.func, views.serve)
+        self.assertEqual(media.kwargs['path'], f'uploads/recipe/ab/{HASH}.jpg')
+        self.assertEqual(media.kwargs['immutable'], views.IMMUTABLE_MEDIA)
+        self.assertEqual(static.func, views.serve)
+        self.assertEqual(static.kwargs['immutable'], views.IMMUTABLE_STATIC)
+
+    def test_upload_temp_dir_not_served(self):
+        """Test that the uploads being received aren't written with the media files, which are served"""
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        temp_dir = os.path.realpath(settings.FILE_UPLOAD_TEMP_DIR)
+
+        # assertions
+        self.assertNotEqual(os.path.commonpath([media_root, temp_dir]), media_root)
@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.utils.translation import gettext as _
+from PIL import Image
+from rest_framework.parsers import MultiPartParser
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Write the uploaded images to disk chunk by chunk, rejecting them as soon as they are too big
+
+    By default, Django keeps the small uploads in memory, and Pillow decodes the whole image to validate it.
+    Here every upload is written to a temporary file in the volume of the media files, so saving it is a simple rename,
+    and the dimensions are read from the header of the image, which is only its first few kilobytes.
+    The SHA-256 of the file is computed along the way, and set as its sha256 attribute.
+    An image with too many pixels is rejected before the rest of it is even received, and it's never decoded.
+    """
+    # the most bytes read to find the dimensions, after that the image field validates the file once received
+    header_max_size = 1024 * 1024
+
+    def new_file(self, *args, **kwargs):
+        # the temporary files are created in FILE_UPLOAD_TEMP_DIR, which lives in the volume of the media files
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+        self.size = 0
+        self.header = bytearray()
+        # the name of the stored image is its hash, which is cheaper to compute now than to read the file again
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.reject(_('The image must not be bigger than %d bytes.') % settings.RECIPE_IMAGE_MAX_SIZE)
+        if self.header is not None:
+            self.check_header(raw_data)
+        self.sha256.update(raw_data)
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+
+        return file
+
+    def check_header(self, raw_data):
+        """Reject the image if its header says it is too big"""
+        self.header += raw_data
+        try:
+            # opening an image only reads its header, the pixels are decoded when they are accessed
+            image = Image.open(io.BytesIO(self.header))
+        except Image.DecompressionBombError:
+            image = None
+        except Exception:
+            # the header isn't complete yet, or this isn't an image, which the image field reports once received
+            if len(self.header) >= self.header_max_size:
+                self.header = None
+            return
+
+        self.header = None
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        if image is None or max(image.size) > max_dimension:
+            self.reject(_('The image must not be bigger than %(max)dx%(max)d pixels.') % {'max': max_dimension})
+
+    def reject(self, message):
+        # closing the temporary file removes it
+        self.file.close()
+        raise MultiPartParserError(message)
+
+
+class BoundedImageMultiPartParser(MultiPartParser):
+    """Multipart parser that receives the files with BoundedImageUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,44 @@
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.views import static
+
+
+# the names of the files that never change once saved, which the clients can cache forever:
+# the media named after the SHA-256 of their content (see core/storage.py)
+IMMUTABLE_MEDIA = re.compile(r'^[0-9a-f]{64}\.\w+$')
+# and the static files named after the hash of their content by collectstatic (see settings_production.py)
+IMMUTABLE_STATIC = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+# how long the clients can cache them, in seconds
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve(request, path, document_root, immutable=None, accel_redirect=None):
+    """Serve a static or media file, with the headers telling the clients how long they can cache it
+
+    The file is sent by the server with sendfile when it can (see FileResponse and the wsgi.file_wrapper of gunicorn),
+    or by the proxy in front of it with accel_redirect (e.g. '/internal/media/'), the internal location of nginx
+    serving the same directory: the response then only has the X-Accel-Redirect header, and nginx sends the file.
+    """
+    if accel_redirect:
+        # like static.serve, the files outside of the directory are never served
+        path = os.path.relpath(safe_join(document_root, path), document_root).replace(os.sep, '/')
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = accel_redirect + path
+        # nginx sets the type from the extension of the file
+        del response['Content-Type']
+    else:
+        # which also answers 304 Not Modified when the file wasn't modified since the client got it
+        response = static.serve(request, path, document_root)
+
+    if immutable is not None and immutable.search(posixpath.basename(path)):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.FILES_CACHE_MAX_AGE)
+
+    return response
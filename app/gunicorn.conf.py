@@ -0,0 +1,46 @@
+"""
+Configuration of gunicorn, the server of the app in production (see docker-compose.prod.yml)
+
+gunicorn reads it from the current directory, so the app is started with: gunicorn
+Every setting can be changed with an environment variable. See https://docs.gunicorn.org/en/stable/settings.html
+"""
+import multiprocessing
+import os
+
+
+# the app served: app.wsgi:application, or app.asgi:application with GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+# (which needs the uvicorn package)
+wsgi_app = os.environ.get('GUNICORN_APP', 'app.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# the processes serving the requests, each one with its own connections to the database (see DB_POOL_MAX_SIZE)
+# WEB_CONCURRENCY is also read by gunicorn itself, and by most hosting platforms
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# and the threads of each process, so a request waiting for the database doesn't block the process
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# the clients (or the proxy in front of the app) reuse their connection for the next requests
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# a request taking longer is killed with its process
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# the processes are replaced after this many requests (spread, so they aren't all replaced at once),
+# which frees the memory they may have leaked, 0 never replaces them
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# Django is loaded once before forking the processes, which share its memory and start faster
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+# the heartbeat files of the processes are in memory, since Docker mounts /tmp on the disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    """Close the connections opened while the app was loaded, before forking a process that can't share them"""
+    from django.db import connections
+    from core.db.postgresql.base import close_pools
+    connections.close_all()
+    close_pools()
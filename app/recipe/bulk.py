@@ -0,0 +1,112 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import Recipe
+from recipe import search
+from recipe.signals import library_changed
+
+
+# the many to many fields of the recipe, with the name of their column in the through table
+RELATIONS = (('tags', 'tag_id'), ('ingredients', 'ingredient_id'))
+
+
+def _insert_links(through, column, links):
+    """Insert the (recipe id, related id) pairs into the through table"""
+    if not links:
+        return
+
+    if connection.vendor == 'postgresql':
+        # a single INSERT of two arrays is several times faster than the multi-row INSERT of bulk_create,
+        # which builds a model instance and a couple of query parameters for every single link
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {table} ({recipe_column}, {column}) SELECT * FROM unnest(%s::integer[], %s::integer[])'
+        recipe_ids, related_ids = zip(*links)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.format(
+                    table=quote(through._meta.db_table),
+                    recipe_column=quote(through._meta.get_field('recipe').column),
+                    column=quote(column),
+                ),
+                [list(recipe_ids), list(related_ids)],
+            )
+    else:
+        through.objects.bulk_create(through(recipe_id=recipe_id, **{column: pk}) for recipe_id, pk in links)
+
+
+def _set_relations(recipes, items, replace):
+    """Link the recipes to the tags and ingredients of the items, with one insert per through table
+
+    When replace is True, the existing links of the fields present in the items are removed first.
+    """
+    for field_name, column in RELATIONS:
+        through = getattr(Recipe, field_name).through
+        with_field = [(recipe, item[field_name]) for recipe, item in zip(recipes, items) if field_name in item]
+        # the tags (or ingredients) linked or unlinked, whose recipes are counted again at the end
+        changed = {pk for _, pks in with_field for pk in pks}
+        if replace and with_field:
+            links = through.objects.filter(recipe_id__in=[recipe.pk for recipe, _ in with_field])
+            changed.update(links.values_list(column, flat=True))
+            links.delete()
+        _insert_links(through, column, [
+            (recipe.pk, pk)
+            for recipe, pks in with_field
+            # the same id can be sent twice, but the through table only accepts one link
+            for pk in dict.fromkeys(pks)
+        ])
+        getattr(Recipe, field_name).field.related_model.objects.update_recipe_counts(changed)
+
+
+def create_recipes(items, batch_size=500):
+    """Create many recipes at once
+
+    Every item has the fields of a recipe (including the user), and the lists of the ids of its tags and ingredients.
+    The model signals aren't sent.
+    """
+    relation_names = [field_name for field_name, _ in RELATIONS]
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            [
+                Recipe(**{key: value for key, value in item.items() if key not in relation_names})
+                for item in items
+            ],
+            batch_size=batch_size,
+        )
+        _set_relations(recipes, items, replace=False)
+        search.update_vectors(recipe.pk for recipe in recipes)
+
+    for user_id in {recipe.user_id for recipe in recipes}:
+        library_changed(user_id)
+
+    return recipes
+
+
+def update_recipes(recipes, items, batch_size=500):
+    """Update many recipes at once
+
+    recipes maps the ids to the recipes to update, and every item has the id of the recipe and the fields to update.
+    The tags and ingredients present in an item replace the ones of the recipe.
+    The model signals aren't sent.
+    """
+    relation_names = [field_name for field_name, _ in RELATIONS]
+    updated = []
+    # bulk_update doesn't set the auto_now fields
+    fields = {'updated_at'}
+    now = timezone.now()
+    for item in items:
+        recipe = recipes[item['id']]
+        recipe.updated_at = now
+        for key, value in item.items():
+            if key != 'id' and key not in relation_names:
+                setattr(recipe, key, value)
+                fields.add(key)
+        updated.append(recipe)
+
+    with transaction.atomic():
+        Recipe.objects.bulk_update(updated, sorted(fields), batch_size=batch_size)
+        _set_relations(updated, items, replace=True)
+        search.update_vectors(recipe.pk for recipe in updated)
+
+    for user_id in {recipe.user_id for recipe in updated}:
+        library_changed(user_id)
+
+    return updated
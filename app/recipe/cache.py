@@ -0,0 +1,113 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core.models import LibraryVersion
+
+
+# the rendered lists are stored under keys containing a "generation" of the user's library
+# whenever the library changes, the generation is replaced, so all the lists cached before are ignored
+# this way we don't need to know every key (assigned_only, pagination, ...) that was cached for the user
+KEY_PREFIX = 'recipe-attributes'
+
+
+def _generation_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}:generation'
+
+
+def _generation(user_id):
+    """Return the current generation of the user's library"""
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # add() doesn't overwrite a generation set meanwhile by another request
+        # it expires like the lists, so a process whose cache isn't shared with the others
+        # doesn't keep the generation of a library they changed
+        cache.add(key, uuid.uuid4().hex, timeout=settings.RECIPE_ATTRIBUTES_CACHE_TIMEOUT)
+        generation = cache.get(key)
+
+    return generation
+
+
+def list_key(model, user_id, variant):
+    """Return the cache key of a list of tags or ingredients
+
+    variant identifies everything else the rendered list depends on (query parameters, media type, ...)
+    """
+    digest = hashlib.md5(repr(variant).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{user_id}:{_generation(user_id)}:{model._meta.model_name}:{digest}'
+
+
+def get(key):
+    """Return the rendered list stored under the key, or None"""
+    content = cache.get(key)
+    _count('hits' if content is not None else 'misses')
+
+    return content
+
+
+def set(key, content):
+    """Store a rendered list"""
+    cache.set(key, content, timeout=settings.RECIPE_ATTRIBUTES_CACHE_TIMEOUT)
+
+
+def invalidate(user_id):
+    """Forget all the lists cached for the user"""
+    cache.set(_generation_key(user_id), uuid.uuid4().hex, timeout=settings.RECIPE_ATTRIBUTES_CACHE_TIMEOUT)
+
+
+def _version_key(user_id):
+    return f'library-version:{user_id}'
+
+
+def library_version(user_id):
+    """Return the version of the user's library, from the cache when it's shared by the processes
+
+    Otherwise a process would keep answering with the version it cached, after another one changed the library.
+    """
+    if not settings.RECIPE_VERSION_CACHED:
+        return LibraryVersion.objects.current(user_id)
+
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = LibraryVersion.objects.current(user_id)
+        # add() doesn't overwrite the version set when a change was committed meanwhile
+        cache.add(key, version, timeout=settings.RECIPE_VERSION_CACHE_TIMEOUT)
+
+    return version
+
+
+def _cache_version(user_id):
+    version = LibraryVersion.objects.current(user_id)
+    cache.set(_version_key(user_id), version, timeout=settings.RECIPE_VERSION_CACHE_TIMEOUT)
+
+
+def invalidate_version(user_id):
+    """Cache the new version of the user's library, once it's committed"""
+    if not settings.RECIPE_VERSION_CACHED:
+        return
+
+    # until then the other requests still see the previous version in the database
+    cache.delete(_version_key(user_id))
+    transaction.on_commit(lambda: _cache_version(user_id))
+
+
+def _count(counter):
+    key = f'{KEY_PREFIX}:stats:{counter}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter was evicted in the meantime
+        cache.set(key, 1, timeout=None)
+
+
+def stats():
+    """Return how many times the cached lists were found (hits) or not (misses)"""
+    counters = cache.get_many([f'{KEY_PREFIX}:stats:hits', f'{KEY_PREFIX}:stats:misses'])
+    return {
+        'hits': counters.get(f'{KEY_PREFIX}:stats:hits', 0),
+        'misses': counters.get(f'{KEY_PREFIX}:stats:misses', 0),
+    }
@@ -0,0 +1,70 @@
+import hashlib
+from django.utils.http import parse_etags
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from recipe import cache
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('The resource was modified since you fetched it.')
+    default_code = 'precondition_failed'
+
+
+class NotModified(Exception):
+    """Raised to answer 304 Not Modified"""
+
+
+class ConditionalRequestMixin:
+    """Answer the conditional requests from the version of the library of the user
+
+    The responses of the conditional actions have an ETag derived from the version of the library,
+    which is bumped whenever one of the recipes, tags or ingredients of the user changes.
+    A GET with a matching If-None-Match is answered 304 without running the queries nor the serializer,
+    and a PUT or PATCH with an If-Match that doesn't match anymore is rejected, so changes made meanwhile aren't lost.
+    Since the version is shared by the whole library, any change of the user makes all the ETags change.
+    """
+    # the actions answering 304 Not Modified, and the ones checking If-Match
+    not_modified_actions = ('list', 'retrieve')
+    precondition_actions = ('update', 'partial_update')
+
+    def get_etag(self, request):
+        """Return the ETag of the response, which changes when anything it depends on changes"""
+        version = cache.library_version(request.user.pk)
+        variant = (request.user.pk, version, request.path, sorted(request.query_params.lists()),
+                   request.accepted_media_type)
+
+        return '"%s"' % hashlib.md5(repr(variant).encode()).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        self.etag = None
+        if self.action in self.not_modified_actions and request.method in ('GET', 'HEAD'):
+            # the version is read before the data, so a change made meanwhile is only seen by the next request
+            self.etag = self.get_etag(request)
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            # If-None-Match uses the weak comparison, which ignores the W/ prefix
+            if if_none_match and self.etag in [etag.replace('W/', '', 1) for etag in parse_etags(if_none_match)]:
+                raise NotModified()
+        elif self.action in self.precondition_actions:
+            if_match = request.META.get('HTTP_IF_MATCH')
+            # the compressed responses have weak ETags (see core/middleware.py), but they come from the same version
+            etags = [etag.replace('W/', '', 1) for etag in parse_etags(if_match or '')]
+            if if_match and if_match.strip() != '*' and self.get_etag(request) not in etags:
+                raise PreconditionFailed()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': self.etag})
+
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = self.etag
+
+        return response
@@ -0,0 +1,91 @@
+import json
+import zlib
+from itertools import islice
+from django.conf import settings
+from core.models import Recipe
+from recipe import fast, images
+
+
+# the columns of the recipes in the export
+COLUMNS = ('id', 'title', 'time_minutes', 'price', 'link', 'image')
+# the many to many fields of the recipe, with the field of the related object in the through table
+RELATIONS = (('tags', 'tag'), ('ingredients', 'ingredient'))
+# the export is a file with a recipe per line (http://ndjson.org/)
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def chunks(iterable, size):
+    """Return the items of the iterable in lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _add_names(rows):
+    """Add the names of the tags and ingredients of the recipes to their rows, with a query per relation"""
+    by_id = {row['id']: row for row in rows}
+    for field_name, related_name in RELATIONS:
+        for row in rows:
+            row[field_name] = []
+        links = getattr(Recipe, field_name).through.objects \
+            .filter(recipe_id__in=list(by_id)) \
+            .order_by(f'{related_name}__name') \
+            .values_list('recipe_id', f'{related_name}__name')
+        for recipe_id, name in links:
+            by_id[recipe_id][field_name].append(name)
+
+
+def records(user, chunk_size=None, request=None):
+    """Return the recipes of the user, one dictionary at a time, with the names of their tags and ingredients
+
+    The recipes are read with a server-side cursor (with PostgreSQL), chunk_size at a time,
+    and the tags and ingredients of every chunk are fetched together,
+    so the memory used doesn't depend on the number of recipes.
+    The names make the export readable without the tags and ingredients of the user.
+    """
+    chunk_size = chunk_size or settings.RECIPE_EXPORT_CHUNK_SIZE
+    rows = Recipe.objects \
+        .filter(user=user) \
+        .order_by('id') \
+        .values(*COLUMNS) \
+        .iterator(chunk_size=chunk_size)
+
+    for chunk in chunks(rows, chunk_size):
+        _add_names(chunk)
+        for row in chunk:
+            image = None
+            if row['image']:
+                image = images.storage.url(row['image'])
+                image = request.build_absolute_uri(image) if request is not None else image
+            yield {
+                'id': row['id'],
+                'title': row['title'],
+                'time_minutes': row['time_minutes'],
+                'price': fast.render_price(row['price']),
+                'link': row['link'],
+                'image': image,
+                'tags': row['tags'],
+                'ingredients': row['ingredients'],
+            }
+
+
+def lines(user, chunk_size=None, request=None):
+    """Return the export of the recipes of the user, as bytes, a chunk of lines at a time"""
+    chunk_size = chunk_size or settings.RECIPE_EXPORT_CHUNK_SIZE
+    for chunk in chunks(records(user, chunk_size, request), chunk_size):
+        # a single write per chunk instead of per recipe
+        yield ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in chunk).encode()
+
+
+def gzipped(chunks):
+    """Compress the chunks of bytes into a gzip file, a chunk at a time"""
+    # wbits=31 writes the gzip header and trailer around the compressed data
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,92 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from core.models import Recipe
+from recipe import images, serializers
+
+
+# the columns of the recipes rendered by RecipeSerializer
+COLUMNS = ('id', 'title', 'time_minutes', 'price', 'link', 'image_variants')
+# the many to many fields of the recipe, with the name of the column of their ids in the through table
+RELATIONS = (('ingredients', 'ingredient_id'), ('tags', 'tag_id'))
+
+# the price is rendered by the same field as RecipeSerializer, so it's formatted the same way
+_price_field = None
+
+
+def _related_ids(field_name, column):
+    """Return the subquery of the ids of the related objects of each recipe, as an array"""
+    through = getattr(Recipe, field_name).through
+    return Subquery(
+        through.objects
+        .filter(recipe_id=OuterRef('pk'))
+        .order_by()
+        .values('recipe_id')
+        .annotate(ids=ArrayAgg(column, ordering=column))
+        .values('ids')
+    )
+
+
+def render_price(value):
+    """Render a price exactly like RecipeSerializer"""
+    global _price_field
+    if _price_field is None:
+        _price_field = serializers.RecipeSerializer().fields['price']
+
+    return _price_field.to_representation(value)
+
+
+def values(queryset):
+    """Return the rows of the recipes of the queryset, with the columns rendered by RecipeSerializer
+
+    With PostgreSQL, the ids of the tags and ingredients of every recipe are aggregated into arrays in the same query.
+    """
+    # the cursor pagination reads the ordering columns of the last row of the page (e.g. updated_at),
+    # which render() leaves out
+    ordering = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)]
+    columns = COLUMNS + tuple(name for name in ordering if name not in COLUMNS)
+    # the rows are dictionaries, which can't have prefetched objects
+    queryset = queryset.prefetch_related(None).values(*columns)
+    if connection.vendor == 'postgresql':
+        queryset = queryset.annotate(**{
+            f'{field_name}_ids': _related_ids(field_name, column)
+            for field_name, column in RELATIONS
+        })
+
+    return queryset
+
+
+def render(rows, request=None):
+    """Render the rows returned by values() exactly like RecipeSerializer renders the recipes
+
+    This skips building a model instance and going through every serializer field for each recipe,
+    which is most of the time spent rendering long lists of recipes.
+    """
+    rows = list(rows)
+    if rows and connection.vendor != 'postgresql':
+        # the other databases can't aggregate arrays, so the ids are grouped here, with a query per relation
+        by_id = {row['id']: row for row in rows}
+        for field_name, column in RELATIONS:
+            for row in rows:
+                row[f'{field_name}_ids'] = []
+            links = getattr(Recipe, field_name).through.objects \
+                .filter(recipe_id__in=list(by_id)) \
+                .order_by(column) \
+                .values_list('recipe_id', column)
+            for recipe_id, pk in links:
+                by_id[recipe_id][f'{field_name}_ids'].append(pk)
+
+    # the keys are in the same order as the fields of RecipeSerializer
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'ingredients': row['ingredients_ids'] or [],
+            'tags': row['tags_ids'] or [],
+            'time_minutes': row['time_minutes'],
+            'price': render_price(row['price']),
+            'link': row['link'],
+            'image_variants': images.variant_urls(row['image_variants'], request),
+        }
+        for row in rows
+    ]
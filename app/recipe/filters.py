@@ -0,0 +1,99 @@
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils.translation import gettext as _
+from rest_framework import fields
+from rest_framework.exceptions import ValidationError
+from core.models import Recipe
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCHES = (MATCH_ANY, MATCH_ALL)
+
+# the range filters, by query parameter, with the lookup they filter on and the field validating their value
+# e.g. ?max_time=30&max_price=10 for the recipes ready in half an hour for at most 10
+RANGES = {
+    'min_time': ('time_minutes__gte', fields.IntegerField(min_value=0)),
+    'max_time': ('time_minutes__lte', fields.IntegerField(min_value=0)),
+    'min_price': ('price__gte', fields.DecimalField(max_digits=None, decimal_places=2, min_value=0)),
+    'max_price': ('price__lte', fields.DecimalField(max_digits=None, decimal_places=2, min_value=0)),
+}
+
+# the fields the recipes can be ordered by with ?ordering=<field> (or -<field> for the descending order)
+# every one of them is indexed together with the user (see the indexes of the Recipe model)
+ORDERING_FIELDS = ('id', 'time_minutes', 'price', 'created_at', 'updated_at')
+
+
+def filter_by_related(queryset, field_name, ids, match=MATCH_ANY):
+    """Filter recipes linked to any (or all) of the given tags or ingredients
+
+    field_name is the name of the many to many field on the recipe ('tags' or 'ingredients').
+    """
+    # filtering with tags__id__in joins the recipes with the through table,
+    # which returns a recipe once for every matching tag
+    # instead, we query the through table in a subquery, so each recipe is returned only once
+    field = Recipe._meta.get_field(field_name)
+    recipe_column = field.m2m_field_name()              # e.g. recipe_id
+    related_column = field.m2m_reverse_field_name()     # e.g. tag_id
+    links = field.remote_field.through.objects.filter(**{f'{related_column}__in': ids})
+
+    if match == MATCH_ALL:
+        # group the links of the requested tags by recipe and keep the recipes that have all of them
+        # the through table has a unique (recipe_id, tag_id) constraint, so counting the rows is enough
+        matching_recipes = links.values(recipe_column) \
+            .annotate(matches=Count(related_column)) \
+            .filter(matches=len(set(ids))) \
+            .values(recipe_column)
+        return queryset.filter(pk__in=matching_recipes)
+
+    # EXISTS stops at the first matching link of each recipe
+    return queryset.filter(Exists(links.filter(**{recipe_column: OuterRef('pk')})))
+
+
+def filter_by_ranges(queryset, params):
+    """Filter the recipes with the range filters present in the query parameters, raising ValidationError if invalid"""
+    lookups = {}
+    errors = {}
+    for param, (lookup, field) in RANGES.items():
+        if param not in params:
+            continue
+        try:
+            lookups[lookup] = field.run_validation(params[param])
+        except ValidationError as exc:
+            errors[param] = exc.detail
+    if errors:
+        raise ValidationError(errors)
+
+    return queryset.filter(**lookups)
+
+
+def get_ordering(value, ordering_fields=ORDERING_FIELDS):
+    """Return the order_by() of an ?ordering= value, raising ValidationError if it's not one of the fields"""
+    field_name = value[1:] if value.startswith('-') else value
+    if field_name not in ordering_fields:
+        message = _('Expected one of: %s') % ', '.join(ordering_fields)
+        raise ValidationError({'ordering': [message]})
+
+    if field_name == 'id':
+        return (value,)
+    # many recipes have the same price (or time), so they're ordered by id too, in the same direction,
+    # which keeps the order stable between pages and matches the (user, field, id) indexes
+    # (the tags and ingredients are ordered the same way by name or by number of recipes)
+    return (value, '-id' if value.startswith('-') else 'id')
+
+
+def filter_cookable(queryset, ingredient_ids, max_missing):
+    """Filter the recipes missing at most max_missing of their ingredients from the given ones
+
+    The recipes are annotated with the number of missing ingredients, and ordered by it (the complete ones first).
+    """
+    # comparing the ingredients of every recipe with the given ones one by one would take a query per recipe
+    # instead, the links of the recipes are grouped by recipe in a single query,
+    # counting all of them and the ones with the given ingredients
+    return queryset \
+        .annotate(
+            ingredients_count=Count('ingredients'),
+            available_count=Count('ingredients', filter=Q(ingredients__in=ingredient_ids)),
+        ) \
+        .annotate(missing=F('ingredients_count') - F('available_count')) \
+        .filter(ingredients_count__gt=0, missing__lte=max_missing) \
+        .order_by('missing', '-id')
@@ -0,0 +1,214 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from core.models import Recipe
+# imported as a module, because the signals import this module
+from recipe import signals
+
+
+logger = logging.getLogger(__name__)
+
+# the variants are stored next to the original images, in the same storage,
+# which names the files after their content, so the variants of an image uploaded many times are stored once
+storage = Recipe._meta.get_field('image').storage
+VARIANTS_PATH = 'uploads/recipe/variants/'
+
+# the formats of the variants, with their file extension and the options of the encoder
+# every variant is saved as JPEG, which every client can decode,
+# and as WebP when Pillow was built with it, which is usually a third smaller for the same quality
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+if features.check('webp'):
+    FORMATS['webp'] = ('webp', {'quality': 80, 'method': 4})
+
+# the worker threads are only started when the first image is uploaded
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    """Return the pool of threads generating the variants"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+
+    return _executor
+
+
+def _to_rgb(image):
+    """Convert the image to RGB, with the transparent parts in white since JPEG has no transparency"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+
+    return image.convert('RGB')
+
+
+def _save(image, image_format):
+    """Encode the image and save it in the media storage, returning the name of the file"""
+    extension, options = FORMATS[image_format]
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format.upper(), **options)
+
+    # the storage replaces the name of the file with its hash
+    return storage.save(f'{VARIANTS_PATH}variant.{extension}', ContentFile(buffer.getvalue()))
+
+
+def make_variants(file):
+    """Save the resized copies of an image file, returning their names by size and format
+
+    The sizes are the longest side of the variants, and the image is never enlarged:
+    the sizes bigger than the image all share a copy at the original size.
+    """
+    sizes = sorted(set(settings.RECIPE_IMAGE_VARIANT_SIZES), reverse=True)
+
+    image = Image.open(file)
+    # JPEG images can be decoded directly at a fraction of their size, which is much faster than resizing them after
+    image.draft('RGB', (sizes[0], sizes[0]))
+    # the phones save the photos sideways with the rotation in the EXIF data, which isn't copied to the variants
+    image = _to_rgb(ImageOps.exif_transpose(image))
+
+    variants = {}
+    previous = None
+    # from the biggest to the smallest, so each variant is resized from the previous one instead of the original
+    for size in sizes:
+        if previous is None or size < max(image.size):
+            image.thumbnail((size, size), Image.LANCZOS)
+            previous = {
+                image_format: _save(image, image_format)
+                for image_format in FORMATS
+            }
+        variants[str(size)] = previous
+
+    return variants
+
+
+def generate_variants(recipe_id, image_name, reuse=True):
+    """Generate the variants of the image of a recipe and save their names in the recipe
+
+    When another recipe has the same image, its variants are reused, unless reuse is False.
+    The recipe isn't updated if its image was replaced in the meantime.
+    """
+    variants = None
+    if reuse:
+        variants = Recipe.objects \
+            .filter(image=image_name) \
+            .exclude(image_variants={}) \
+            .values_list('image_variants', flat=True) \
+            .first()
+    if not variants:
+        with storage.open(image_name) as file:
+            variants = make_variants(file)
+    updated = Recipe.objects \
+        .filter(pk=recipe_id, image=image_name) \
+        .update(image_variants=variants, updated_at=timezone.now())
+    if updated:
+        # the variants are rendered with the recipe
+        signals.library_changed(Recipe.objects.values_list('user_id', flat=True).get(pk=recipe_id))
+
+    return variants
+
+
+def _generate_in_worker(recipe_id, image_name):
+    # the worker threads open their own database connections, which aren't closed at the end of a request
+    close_old_connections()
+    try:
+        generate_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Could not generate the variants of %s', image_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """Generate the variants of the new image of the recipe in the background
+
+    With RECIPE_IMAGE_WORKERS = 0 they are generated right away instead.
+    """
+    if not recipe.image:
+        return
+
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if settings.RECIPE_IMAGE_WORKERS == 0:
+        generate_variants(recipe_id, image_name)
+        return
+
+    # the worker updates the recipe in its own connection, so it must wait for the upload to be committed
+    transaction.on_commit(lambda: _get_executor().submit(_generate_in_worker, recipe_id, image_name))
+
+
+def _delete_unused(images):
+    # another recipe may have the same image, in which case we keep the files
+    used = set(Recipe.objects.filter(image__in=list(images)).values_list('image', flat=True))
+    # and the same file may be being uploaded to another recipe, whose transaction isn't committed yet:
+    # the storage touches the files it saves again, so like collect_recipe_images, the recent files are kept
+    modified_before = timezone.now() - timedelta(seconds=settings.RECIPE_IMAGE_DELETE_GRACE)
+    for image_name, variants in images.items():
+        if image_name in used:
+            continue
+        for name in {name for formats in variants.values() for name in formats.values()} | {image_name}:
+            try:
+                if storage.get_modified_time(name) <= modified_before:
+                    storage.delete(name)
+            except FileNotFoundError:
+                pass
+
+
+def release(image_name, variants):
+    """Delete an image that was replaced or whose recipe was deleted, with its variants, if no recipe uses it anymore
+
+    The files are deleted once the transaction is committed, so they are kept if it's rolled back,
+    unless they were saved in the last RECIPE_IMAGE_DELETE_GRACE seconds.
+    The files kept or missed (e.g. when the process is killed) are deleted by the collect_recipe_images command.
+    """
+    release_many({image_name: variants})
+
+
+def release_many(images):
+    """Like release, for many images (by name, with their variants) at once, e.g. of the recipes deleted in bulk"""
+    images = {image_name: variants for image_name, variants in images.items() if image_name}
+    if images:
+        transaction.on_commit(lambda: _delete_unused(images))
+
+
+def variant_urls(variants, request=None):
+    """Return the urls of the variants of an image, by size and format"""
+    urls = {}
+    for size, formats in variants.items():
+        urls[size] = {}
+        for image_format, name in formats.items():
+            url = storage.url(name)
+            # like the image field, use absolute urls when we know the host
+            urls[size][image_format] = request.build_absolute_uri(url) if request is not None else url
+
+    return urls
+
+
+def pick_variant(variants, size, accept=''):
+    """Return the name of the smallest variant at least size pixels long, in the best format the client accepts
+
+    Returns None when there is no such variant, in which case the original image should be used.
+    """
+    suitable = [variant_size for variant_size in variants if int(variant_size) >= size]
+    if not suitable:
+        return None
+
+    formats = variants[min(suitable, key=int)]
+    if 'webp' in formats and 'image/webp' in accept:
+        return formats['webp']
+
+    return formats['jpeg']
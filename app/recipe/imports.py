@@ -0,0 +1,143 @@
+import csv
+import gzip
+import json
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from core.models import Recipe
+from recipe import bulk, serializers
+from recipe.export import chunks
+
+
+# the files are either newline delimited JSON, like the export, or CSV with a header row
+FORMATS = ('ndjson', 'csv')
+# in the CSV files, the names of the tags and ingredients of a recipe are in a single column
+CSV_SEPARATOR = ';'
+# the many to many fields of the recipe, given by name in the files
+RELATIONS = ('tags', 'ingredients')
+
+
+def detect_format(name):
+    """Return the format of a file from its name, e.g. recipes.csv.gz is a gzipped CSV file"""
+    name = name.lower()
+    if name.endswith('.gz'):
+        name = name[:-len('.gz')]
+
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+def _lines(file):
+    """Return the numbered lines of a binary file as text, decompressing it if its name ends with .gz
+
+    The file is read a line at a time, so it's never loaded in memory.
+    """
+    if getattr(file, 'name', '').lower().endswith('.gz'):
+        file = gzip.GzipFile(fileobj=file, mode='rb')
+    for number, line in enumerate(file, start=1):
+        text = line.decode('utf-8', errors='replace')
+        if number == 1:
+            # the spreadsheets save their CSV files with a byte order mark
+            text = text.lstrip('\ufeff')
+        yield number, text
+
+
+def _error(message):
+    return {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+
+def parse_ndjson(file):
+    """Return the (line number, recipe data, errors) of the lines of a NDJSON file
+
+    The data is None, and the errors aren't, when the line isn't a JSON object.
+    """
+    for number, line in _lines(file):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, None, _error(_('Invalid JSON.'))
+            continue
+        if not isinstance(data, dict):
+            yield number, None, _error(_('Expected a JSON object.'))
+            continue
+        yield number, data, None
+
+
+def parse_csv(file):
+    """Return the (line number, recipe data, errors) of the rows of a CSV file
+
+    The first row names the columns, and the tags and ingredients are separated by CSV_SEPARATOR.
+    """
+    lines = _lines(file)
+    number = 0
+
+    def text_lines():
+        nonlocal number
+        for number, line in lines:
+            yield line
+
+    for row in csv.DictReader(text_lines()):
+        # the missing columns are None, and reported as required by the serializer
+        data = {key: value for key, value in row.items() if key is not None and value is not None}
+        for field_name in RELATIONS:
+            if field_name in data:
+                data[field_name] = [name.strip() for name in data[field_name].split(CSV_SEPARATOR) if name.strip()]
+        yield number, data, None
+
+
+def parse(file, file_format):
+    """Return the (line number, recipe data, errors) of the recipes of a file in one of the FORMATS"""
+    return parse_csv(file) if file_format == 'csv' else parse_ndjson(file)
+
+
+def _create(user, recipes):
+    """Create the validated recipes, creating the tags and ingredients they name, in a single transaction"""
+    with transaction.atomic():
+        for field_name in RELATIONS:
+            model = Recipe._meta.get_field(field_name).related_model
+            names = [name for recipe in recipes for name in recipe.get(field_name, [])]
+            # the objects are returned in the order of the names, so each recipe takes as many as it gave
+            objects = iter(model.objects.get_or_create_by_names(user, names))
+            for recipe in recipes:
+                recipe[field_name] = [next(objects).pk for name in recipe.get(field_name, [])]
+
+        bulk.create_recipes([dict(recipe, user=user) for recipe in recipes])
+
+
+def import_recipes(user, rows, batch_size=None):
+    """Create the recipes of the rows returned by parse() for the user, batch_size at a time
+
+    Return the events of the import, as they happen:
+    - {'line': 3, 'errors': {...}} for every invalid recipe, which is skipped;
+    - {'line': 500, 'imported': 498, 'failed': 2} after every batch, with the totals so far;
+    - {'imported': 998, 'failed': 2, 'done': True} at the end.
+    Every batch is created in its own transaction, with the names of all its tags and ingredients resolved together,
+    so the recipes imported before an error stay imported.
+    """
+    batch_size = batch_size or settings.RECIPE_IMPORT_BATCH_SIZE
+    imported = failed = 0
+    # like the child of a list serializer, a single serializer validates every row,
+    # since building the fields of a model serializer takes longer than validating a recipe
+    serializer = serializers.RecipeImportSerializer()
+
+    for batch in chunks(rows, batch_size):
+        recipes = []
+        for number, data, errors in batch:
+            if errors is None:
+                try:
+                    recipes.append(dict(serializer.run_validation(data)))
+                    continue
+                except ValidationError as exc:
+                    errors = exc.detail
+            failed += 1
+            yield {'line': number, 'errors': errors}
+
+        if recipes:
+            _create(user, recipes)
+        imported += len(recipes)
+        yield {'line': batch[-1][0], 'imported': imported, 'failed': failed}
+
+    yield {'imported': imported, 'failed': failed, 'done': True}
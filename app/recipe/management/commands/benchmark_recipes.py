@@ -0,0 +1,241 @@
+import io
+import random
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core import middleware, renderers
+from core.models import Tag, Ingredient, Recipe
+from core.parsers import FastJSONParser
+from recipe import export, fast, filters, imports, search, serializers
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe queries against a throwaway recipe library"""
+    help = 'Benchmark the recipe queries. Everything created by the benchmark is rolled back at the end.'
+
+    @classmethod
+    def scenarios(cls):
+        """Every benchmark_<name> method is a scenario that can be run with: manage.py benchmark_recipes <name>"""
+        return sorted(name[len('benchmark_'):] for name in dir(cls) if name.startswith('benchmark_'))
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=self.scenarios())
+        parser.add_argument('--recipes', type=int, default=10000, help='Number of recipes in the library')
+        parser.add_argument('--tags', type=int, default=50, help='Number of tags in the library')
+        parser.add_argument('--ingredients', type=int, default=200, help='Number of ingredients in the library')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times each measure is repeated')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random library')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        random.seed(options['seed'])
+
+        with transaction.atomic():
+            self.stdout.write(f"Creating a library of {options['recipes']} recipes...")
+            self.user = self.create_library(options['recipes'], options['tags'], options['ingredients'])
+            getattr(self, f"benchmark_{options['scenario']}")(**options)
+
+            # the library is only needed for the benchmark, so we don't keep it
+            transaction.set_rollback(True)
+
+    def create_library(self, recipes_count, tags_count, ingredients_count):
+        """Create a user with a random library of recipes, tags and ingredients"""
+        user = get_user_model().objects.create_user(f'benchmark-{time.time()}@fake.com', 'benchmark-123')
+        tags = Tag.objects.bulk_create(Tag(user=user, name=f'Tag {i}') for i in range(tags_count))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}') for i in range(ingredients_count)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=random.randint(5, 180),
+                price=random.randint(100, 5000) / 100,
+            )
+            for i in range(recipes_count)
+        )
+
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in random.sample(tags, min(3, len(tags)))
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(recipe=recipe, ingredient=ingredient)
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, min(8, len(ingredients)))
+        )
+
+        if connection.vendor == 'postgresql':
+            # refresh the statistics of the planner, otherwise it doesn't know the tables just got filled
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        return user
+
+    def measure(self, label, func):
+        """Run the function a few times and print how long it took"""
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        self.stdout.write(f'{label:<50} median {statistics.median(timings):9.2f} ms   min {min(timings):9.2f} ms')
+
+    def benchmark_filters(self, **options):
+        """Compare the filters of the recipes by tags and ingredients"""
+        recipes = Recipe.objects.filter(user=self.user)
+        tag_ids = list(Tag.objects.filter(user=self.user).values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(user=self.user).values_list('id', flat=True))
+
+        for field_name, ids in (('tags', tag_ids), ('ingredients', ingredient_ids)):
+            for count in (1, 5, 20):
+                sample = random.sample(ids, min(count, len(ids)))
+
+                joined = recipes.filter(**{f'{field_name}__id__in': sample}).distinct()
+                self.measure(f'{field_name} x{count} join + distinct', lambda: list(joined.values_list('id')))
+                for match in filters.MATCHES:
+                    filtered = filters.filter_by_related(recipes, field_name, sample, match)
+                    self.measure(f'{field_name} x{count} match={match}', lambda: list(filtered.values_list('id')))
+
+    def benchmark_bulk(self, **options):
+        """Create 1000 recipes through the bulk endpoint"""
+        tag_ids = list(Tag.objects.filter(user=self.user).values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(user=self.user).values_list('id', flat=True))
+        payload = [
+            {
+                'title': f'Bulk recipe {i}',
+                'time_minutes': random.randint(5, 180),
+                'price': f'{random.randint(100, 5000) / 100:.2f}',
+                'tags': random.sample(tag_ids, min(3, len(tag_ids))),
+                'ingredients': random.sample(ingredient_ids, min(8, len(ingredient_ids))),
+            }
+            for i in range(1000)
+        ]
+        view = RecipeViewSet.as_view({'post': 'bulk'})
+
+        def create():
+            request = APIRequestFactory().post('/api/recipe/recipes/bulk/', payload, format='json')
+            force_authenticate(request, user=self.user)
+            response = view(request)
+            response.render()
+            assert response.status_code == 201, response.data
+
+        self.measure('bulk create 1000 recipes', create)
+
+    def benchmark_search(self, **options):
+        """Compare the full-text search with looking for the text in the columns (e.g. --recipes 100000)"""
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('The full-text search needs PostgreSQL'))
+            return
+
+        # the library is created in bulk, which doesn't compute the search vectors
+        ids = list(Recipe.objects.filter(user=self.user).values_list('id', flat=True))
+        start = time.perf_counter()
+        search.update_vectors(ids)
+        self.stdout.write(f'Indexed {len(ids)} recipes in {(time.perf_counter() - start) * 1000:.2f} ms')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        recipes = Recipe.objects.filter(user=self.user)
+        for text in ('Recipe 4242', 'Tag 7', 'Ingredient 42', 'Recipe 4242 Tag 7'):
+            found = search.search(recipes, text)
+            self.measure(f'search "{text}"', lambda: list(found.values_list('id')[:20]))
+            scanned = search.search_columns(recipes, text)
+            self.measure(f'icontains "{text}"', lambda: list(scanned.values_list('id')[:20]))
+
+    def benchmark_cookable(self, **options):
+        """Compare matching the recipes with the ingredients of the user in Python and in a single query"""
+        recipes = Recipe.objects.filter(user=self.user)
+        ingredient_ids = list(Ingredient.objects.filter(user=self.user).values_list('id', flat=True))
+
+        for count in (10, 50, 150):
+            have = set(random.sample(ingredient_ids, min(count, len(ingredient_ids))))
+
+            def in_python():
+                # every recipe with all its ingredients, compared one by one
+                matches = []
+                for recipe in recipes.prefetch_related('ingredients'):
+                    missing = sum(1 for ingredient in recipe.ingredients.all() if ingredient.pk not in have)
+                    if missing <= 2:
+                        matches.append((missing, -recipe.pk, recipe.pk))
+                return [pk for _, _, pk in sorted(matches)]
+
+            def in_sql():
+                return list(filters.filter_cookable(recipes, list(have), 2).values_list('id', flat=True))
+
+            assert in_python() == in_sql()
+            self.measure(f'cookable with {count} ingredients in python', in_python)
+            self.measure(f'cookable with {count} ingredients in sql', in_sql)
+
+    def benchmark_list(self, **options):
+        """Compare rendering the list of recipes with the serializer and from the rows (see recipe/fast.py)"""
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        def with_serializer():
+            queryset = recipes.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+                Prefetch('ingredients', queryset=Ingredient.objects.only('id').order_by('id')),
+            )
+            return JSONRenderer().render(serializers.RecipeSerializer(queryset, many=True).data)
+
+        def from_rows():
+            return JSONRenderer().render(fast.render(fast.values(recipes)))
+
+        assert with_serializer() == from_rows()
+        self.measure(f"list {options['recipes']} recipes with the serializer", with_serializer)
+        self.measure(f"list {options['recipes']} recipes from the rows", from_rows)
+
+    def benchmark_import(self, **options):
+        """Export the library, and import it for new users (see recipe/export.py and recipe/imports.py)"""
+        content = None
+
+        def export_library():
+            nonlocal content
+            content = b''.join(export.lines(self.user))
+
+        def import_library():
+            user = get_user_model().objects.create_user(f'benchmark-{time.time()}@fake.com', 'benchmark-123')
+            events = list(imports.import_recipes(user, imports.parse(io.BytesIO(content), 'ndjson')))
+            assert events[-1] == {'imported': options['recipes'], 'failed': 0, 'done': True}, events[-1]
+
+        self.measure(f"export {options['recipes']} recipes", export_library)
+        self.measure(f"import {options['recipes']} recipes", import_library)
+
+    def benchmark_json(self, **options):
+        """Compare the JSON renderers and parsers, and the compressions, of the recipe list (see core/renderers.py)"""
+        data = fast.render(fast.values(Recipe.objects.filter(user=self.user).order_by('-id')))
+        content = JSONRenderer().render(data)
+        assert renderers.FastJSONRenderer().render(data) == content
+
+        count = options['recipes']
+        label = 'orjson' if renderers.orjson is not None else 'json (orjson is not installed)'
+        self.measure(f'render {count} recipes with json', lambda: JSONRenderer().render(data))
+        self.measure(f'render {count} recipes with {label}', lambda: renderers.FastJSONRenderer().render(data))
+        self.measure(f'parse {count} recipes with json', lambda: JSONParser().parse(io.BytesIO(content)))
+        self.measure(f'parse {count} recipes with {label}', lambda: FastJSONParser().parse(io.BytesIO(content)))
+
+        # the whole list endpoint, through the compression middleware
+        view = RecipeViewSet.as_view({'get': 'list'})
+
+        def get_response(request):
+            return view(request).render()
+
+        for encoding in ['identity'] + list(middleware.ENCODERS):
+            def get():
+                request = APIRequestFactory().get('/api/recipe/recipes/', HTTP_ACCEPT_ENCODING=encoding)
+                force_authenticate(request, user=self.user)
+                response = middleware.CompressionMiddleware(get_response)(request)
+                assert response.status_code == 200, response.status_code
+                return response
+
+            self.measure(f'list endpoint with {encoding}', get)
+            self.stdout.write(f'{"":<50} {len(get().content):>10} bytes')
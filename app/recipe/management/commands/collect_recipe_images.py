@@ -0,0 +1,50 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to delete the recipe images and variants that no recipe uses anymore"""
+    help = 'Delete the orphaned recipe images and variants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.RECIPE_IMAGE_DELETE_GRACE,
+            help='Keep the files modified less than this many seconds ago, which may be uploads in progress'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='List the orphaned files without deleting them')
+
+    def walk(self, path):
+        """Return the names of all the files under a directory of the storage"""
+        directories, files = images.storage.listdir(path)
+        for name in files:
+            yield f'{path}{name}'
+        for directory in directories:
+            yield from self.walk(f'{path}{directory}/')
+
+    def handle(self, *args, **options):
+        used = set()
+        for image_name, variants in Recipe.objects.exclude(image='').values_list('image', 'image_variants').iterator():
+            used.add(image_name)
+            used.update(name for formats in variants.values() for name in formats.values())
+
+        if not images.storage.exists('uploads/recipe/'):
+            self.stdout.write(self.style.SUCCESS('Deleted 0 orphaned files'))
+            return
+
+        modified_before = timezone.now() - timedelta(seconds=options['grace'])
+        count = 0
+        for name in self.walk('uploads/recipe/'):
+            if name in used or images.storage.get_modified_time(name) > modified_before:
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                images.storage.delete(name)
+            count += 1
+
+        verb = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} orphaned files'))
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from recipe import export
+
+
+class Command(BaseCommand):
+    """Django command to export all the recipes of a user, like GET /api/recipe/export/"""
+    help = 'Write the recipes of a user as newline delimited JSON, to the standard output or to a file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user')
+        parser.add_argument('--output', help='File to write, compressed with gzip if its name ends with .gz')
+        parser.add_argument('--chunk-size', type=int, help='Number of recipes read from the database at a time')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'There is no user with the email {options["email"]}')
+
+        content = export.lines(user, options['chunk_size'])
+        output = options['output']
+        if output and output.endswith('.gz'):
+            content = export.gzipped(content)
+
+        # the lines are written as they are read, so the whole export is never in memory
+        file = open(output, 'wb') if output else getattr(self.stdout, 'buffer', None)
+        try:
+            for chunk in content:
+                if file is None:
+                    # e.g. when the output is captured by call_command
+                    self.stdout.write(chunk.decode(), ending='')
+                else:
+                    file.write(chunk)
+        finally:
+            if output:
+                file.close()
+            elif file is not None:
+                file.flush()
+
+        if output:
+            self.stderr.write(self.style.SUCCESS(f'Exported the recipes of {user.email} to {output}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to generate the variants of the images uploaded before they were introduced"""
+    help = 'Generate the resized copies of the recipe images that have none.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also regenerate the images that already have variants')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None).only('id', 'image')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+
+        count = 0
+        for recipe in recipes.iterator():
+            images.generate_variants(recipe.pk, recipe.image.name, reuse=not options['all'])
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Generated the variants of {count} images'))
@@ -0,0 +1,45 @@
+import json
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from recipe import imports
+
+
+class Command(BaseCommand):
+    """Django command to import recipes for a user, like POST /api/recipe/import/"""
+    help = 'Create the recipes of a NDJSON or CSV file (optionally gzipped) for a user, reporting the invalid ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user')
+        parser.add_argument('file', help='File to import, or - for the standard input')
+        parser.add_argument(
+            '--format',
+            choices=imports.FORMATS,
+            help='Format of the file, by default guessed from its name (NDJSON unless it ends with .csv or .csv.gz)'
+        )
+        parser.add_argument('--batch-size', type=int, help='Number of recipes created per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'There is no user with the email {options["email"]}')
+
+        path = options['file']
+        file_format = options['format'] or imports.detect_format(path)
+        # the file is read a line at a time, so it's never loaded in memory
+        file = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            rows = imports.parse(file, file_format)
+            for event in imports.import_recipes(user, rows, options['batch_size']):
+                if 'errors' in event:
+                    self.stderr.write(f'Line {event["line"]}: {json.dumps(event["errors"])}')
+                elif event.get('done'):
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Imported {event["imported"]} recipes, {event["failed"]} failed'
+                    ))
+                else:
+                    self.stderr.write(f'{event["imported"]} recipes imported, up to line {event["line"]}')
+        finally:
+            if file is not sys.stdin.buffer:
+                file.close()
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    """Django command to delete the tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS"""
+    help = 'Delete the tombstones of the deleted recipes, tags and ingredients that are too old to be synced.'
+
+    def handle(self, *args, **options):
+        if not settings.SYNC_TOMBSTONE_RETENTION_DAYS:
+            self.stdout.write(self.style.SUCCESS('Tombstones are kept forever'))
+            return
+
+        # the clients that synced before that are told to download their library again
+        deleted_before = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        count, _ = Tombstone.objects.filter(deleted_at__lt=deleted_before).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} tombstones'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """Django command to count the recipes of all the tags and ingredients again"""
+    help = 'Count the recipes of every tag and ingredient again, e.g. after linking them outside of the app.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of objects updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            ids = list(model.objects.order_by('id').values_list('id', flat=True))
+            for start in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    model.objects.update_recipe_counts(ids[start:start + batch_size])
+
+            name = model._meta.verbose_name_plural
+            self.stdout.write(self.style.SUCCESS(f'Counted the recipes of {len(ids)} {name}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from core.models import Recipe
+from recipe import search
+
+
+class Command(BaseCommand):
+    """Django command to compute the search vectors of all the recipes again"""
+    help = 'Compute the search vectors of all the recipes, e.g. after changing RECIPE_SEARCH_CONFIG.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of recipes updated per transaction')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Only PostgreSQL stores the search vectors'))
+            return
+
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        # short transactions, so the recipes aren't locked for the whole run
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                search.update_vectors(ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated the search vectors of {len(ids)} recipes'))
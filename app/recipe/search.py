@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+from core.models import Tag, Ingredient, Recipe
+
+
+# the search vector of a recipe is stored in the recipe, with the words of its title weighted the most,
+# then the names of its tags and then the names of its ingredients
+# it's computed by the database, for many recipes at once, whenever one of them changes (see recipe/signals.py)
+VECTOR_SQL = '''
+UPDATE {recipe} SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, {recipe}.title), 'A') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg({tag}.name, ' ') FROM {tag}
+        JOIN {recipe_tags} ON {recipe_tags}.tag_id = {tag}.id
+        WHERE {recipe_tags}.recipe_id = {recipe}.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg({ingredient}.name, ' ') FROM {ingredient}
+        JOIN {recipe_ingredients} ON {recipe_ingredients}.ingredient_id = {ingredient}.id
+        WHERE {recipe_ingredients}.recipe_id = {recipe}.id
+    ), '')), 'C')
+WHERE {recipe}.id = ANY(%(ids)s)
+'''
+
+# whether the pg_trgm extension is installed, which is checked once per process
+_has_trigram = None
+
+
+def has_trigram():
+    """Return True if the database can find the titles with typos (the pg_trgm extension is installed)"""
+    global _has_trigram
+    if _has_trigram is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _has_trigram = cursor.fetchone() is not None
+
+    return _has_trigram
+
+
+def update_vectors(recipe_ids):
+    """Compute the search vectors of the recipes again, after their title, tags or ingredients changed"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor != 'postgresql':
+        # the other databases search the columns directly
+        return
+
+    quote = connection.ops.quote_name
+    sql = VECTOR_SQL.format(
+        recipe=quote(Recipe._meta.db_table),
+        tag=quote(Tag._meta.db_table),
+        ingredient=quote(Ingredient._meta.db_table),
+        recipe_tags=quote(Recipe.tags.through._meta.db_table),
+        recipe_ingredients=quote(Recipe.ingredients.through._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'config': settings.RECIPE_SEARCH_CONFIG, 'ids': recipe_ids})
+
+
+def search_columns(queryset, text):
+    """Filter the recipes with the text in their title, tag names or ingredient names, the newest first
+
+    It reads every recipe of the user, but works with any database.
+    """
+    tags = Tag.objects.filter(recipe=OuterRef('pk'), name__icontains=text)
+    ingredients = Ingredient.objects.filter(recipe=OuterRef('pk'), name__icontains=text)
+
+    return queryset \
+        .filter(Q(title__icontains=text) | Q(Exists(tags)) | Q(Exists(ingredients))) \
+        .order_by('-id')
+
+
+def search(queryset, text):
+    """Filter the recipes matching the text, the best matches first
+
+    With PostgreSQL the words are matched against the indexed search vectors (so "tomatoes" finds "tomato"),
+    and the titles similar to the text are found too (so "tomatos" finds "tomato") when pg_trgm is installed.
+    The other databases look for the text in the titles, tag names and ingredient names, the newest recipes first.
+    """
+    if connection.vendor != 'postgresql':
+        return search_columns(queryset, text)
+
+    # websearch accepts what users type in a search box: quoted phrases, "or", and -excluded words
+    query = SearchQuery(text, config=settings.RECIPE_SEARCH_CONFIG, search_type='websearch')
+    matches = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+    if has_trigram():
+        matches |= Q(title__trigram_similar=text)
+        rank = rank + TrigramSimilarity('title', text)
+
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', '-id')
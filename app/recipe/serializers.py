@@ -1,46 +1,219 @@
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
 from core.models import Tag, Ingredient, Recipe
+from recipe import bulk, images
 
 
-class TagSerializer(serializers.ModelSerializer):
+# the many to many fields of the recipe that can be given by name, with the name of their write only field
+NAMED_RELATIONS = (('tags', 'tag_names'), ('ingredients', 'ingredient_names'))
+
+
+class UniqueNameMixin:
+    """Validate that the user doesn't have another object with the same name, ignoring the case"""
+
+    def validate_name(self, value):
+        request = self.context.get('request')
+        if request is None:
+            return value
+
+        # the database has a unique index on (user, lower(name)), so we filter on the same expression
+        # the value is lowered by the database too, since Python lowers some letters differently
+        queryset = self.Meta.model.objects \
+            .annotate(lower_name=Lower('name')) \
+            .filter(user=request.user, lower_name=Lower(Value(value)))
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(_('You already have one with this name.'), code='unique')
+
+        return value
+
+
+class UpdateFieldsMixin:
+    """Save only the fields given to an update, instead of the whole row
+
+    The worker threads save the image variants of a recipe while it may be updated (see recipe/images.py),
+    so saving the whole row would overwrite them with the ones read before.
+    """
+
+    def update(self, instance, validated_data):
+        serializers.raise_errors_on_nested_writes('update', self, validated_data)
+        info = model_meta.get_field_info(instance)
+        # like ModelSerializer.update, the many-to-many fields are set after the instance is saved
+        m2m_fields = []
+        # the fields set by the model on every save, e.g. updated_at
+        update_fields = [field.name for field in instance._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        for attr, value in validated_data.items():
+            if attr in info.relations and info.relations[attr].to_many:
+                m2m_fields.append((attr, value))
+            else:
+                setattr(instance, attr, value)
+                update_fields.append(attr)
+
+        instance.save(update_fields=update_fields)
+
+        for attr, value in m2m_fields:
+            getattr(instance, attr).set(value)
+
+        return instance
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for ingredient objects"""
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+
+
+class DynamicFieldsMixin:
+    """Let the client choose the fields it reads
 
+    ?fields=id,title renders only those fields, and ?expand=tags,ingredients renders the objects of those fields
+    instead of their ids. Only the GET requests are affected.
+    The views use get_query_fields to select only the columns and prefetch only the objects that are rendered.
+    """
+    # the fields that can be expanded, with the serializer of their objects
+    expandable_fields = {}
 
-class RecipeSerializer(serializers.ModelSerializer):
+    @classmethod
+    def _get_names(cls, request, param, allowed):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        names = set(value.split(','))
+        invalid = names - set(allowed)
+        if invalid:
+            message = _('Unknown fields: %(invalid)s. Expected some of: %(allowed)s') % {
+                'invalid': ', '.join(sorted(invalid)),
+                'allowed': ', '.join(allowed),
+            }
+            raise serializers.ValidationError({param: [message]})
+
+        return names
+
+    @classmethod
+    def get_query_fields(cls, request):
+        """Return the names of the fields asked for (None for all of them), and of the fields to expand"""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None, set()
+
+        # the write only fields aren't rendered, so they can't be asked for
+        readable = [
+            name for name in cls.Meta.fields
+            if not getattr(cls._declared_fields.get(name), 'write_only', False)
+        ]
+        fields = cls._get_names(request, 'fields', readable)
+        expand = cls._get_names(request, 'expand', list(cls.expandable_fields)) or set()
+        if fields is not None:
+            # an expanded field is rendered even if it wasn't asked for
+            fields |= expand
+
+        return fields, expand
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = self.get_query_fields(self.context.get('request'))
+
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](many=True, read_only=True)
+        if fields is not None:
+            # the fields that aren't rendered aren't even bound, so they cost nothing
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class RecipeSerializer(DynamicFieldsMixin, UpdateFieldsMixin, serializers.ModelSerializer):
     """Serialize a recipe"""
 
     # because ingredients are references to other models, and not just another field of this model
     # we need to specify this
     ingredients = serializers.PrimaryKeyRelatedField(
         many=True,
-        queryset=Ingredient.objects.all()
+        queryset=Ingredient.objects.all(),
+        required=False
     )
     tags = serializers.PrimaryKeyRelatedField(
         many=True,
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        required=False
+    )
+    # the tags and ingredients can also be given by name, in which case the missing ones are created
+    # this saves the client from creating each of them with its own request before creating the recipe
+    ingredient_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False
     )
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        required=False
+    )
+    # the urls of the resized copies of the image, so the clients don't download the full image for a thumbnail
+    image_variants = serializers.SerializerMethodField()
+
+    expandable_fields = {
+        'ingredients': IngredientSerializer,
+        'tags': TagSerializer,
+    }
 
     class Meta:
         model = Recipe
-        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
+        fields = (
+            'id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link', 'image_variants',
+            'ingredient_names', 'tag_names'
+        )
         # prevent the user from updating the id when they may create or edit requests
         # best practice: you don't want the primary key to change
         read_only_fields = ('id',)
 
+    def get_image_variants(self, recipe):
+        """Return the urls of the variants of the image, by size and format"""
+        return images.variant_urls(recipe.image_variants, self.context.get('request'))
+
+    def validate(self, attrs):
+        # the tags and ingredients must be given either by id or by name, except for partial updates
+        if not self.partial:
+            for field_name, names_field in NAMED_RELATIONS:
+                if field_name not in attrs and names_field not in attrs:
+                    raise serializers.ValidationError({field_name: [_('This field is required.')]}, code='required')
+
+        return attrs
+
+    def _resolve_names(self, validated_data, user):
+        """Replace the names of tags and ingredients with the objects, creating the missing ones"""
+        for field_name, names_field in NAMED_RELATIONS:
+            names = validated_data.pop(names_field, None)
+            if names is None:
+                continue
+            model = Recipe._meta.get_field(field_name).related_model
+            validated_data[field_name] = list(validated_data.get(field_name, [])) + \
+                model.objects.get_or_create_by_names(user, names)
+
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._resolve_names(validated_data, validated_data['user']))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._resolve_names(validated_data, instance.user))
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
@@ -49,10 +222,163 @@ class RecipeDetailSerializer(RecipeSerializer):
     # read_only means you can't create a recipe by providing these values
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeCookableSerializer(RecipeSerializer):
+    """Serialize a recipe with the ingredients missing to cook it"""
+    missing = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing', 'missing_ingredients')
+
+    def get_missing_ingredients(self, recipe):
+        """Return the ids of the ingredients of the recipe the user doesn't have"""
+        # the ingredients are prefetched, so this doesn't query the database
+        return [ingredient.pk for ingredient in recipe.ingredients.all() if ingredient.pk not in self.context['have']]
+
+
+class RecipeImageSerializer(UpdateFieldsMixin, serializers.ModelSerializer):
     """"Serializer for uploading images to recipes"""
 
     class Meta:
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Serializer for creating or updating many recipes at once
+
+    With the regular serializer, every tag and ingredient id is looked up in its own query.
+    Here the ids of the whole batch are checked in one query per model.
+    To update recipes, pass the recipes of the user as instance.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            # raises the usual error
+            return super().to_internal_value(data)
+        if len(data) > settings.RECIPE_BULK_MAX_ITEMS:
+            message = _('Ensure there are no more than %d recipes.') % settings.RECIPE_BULK_MAX_ITEMS
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='max_length')
+
+        # validate the fields of every item, the invalid items are None
+        items = []
+        errors = []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+        valid = [(item, item_errors) for item, item_errors in zip(items, errors) if item is not None]
+
+        user = self.context['request'].user
+        for field_name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            requested = {pk for item, item_errors in valid for pk in item.get(field_name, [])}
+            existing = set(model.objects.filter(user=user, pk__in=requested).values_list('pk', flat=True))
+            for item, item_errors in valid:
+                invalid = [pk for pk in item.get(field_name, []) if pk not in existing]
+                if invalid:
+                    item_errors[field_name] = [_('Invalid pk "%s" - object does not exist.') % pk for pk in invalid]
+
+        if self.instance is not None:
+            ids = [item.get('id') for item, item_errors in valid]
+            existing = set(self.instance.filter(pk__in=[pk for pk in ids if pk]).values_list('pk', flat=True))
+            seen = set()
+            for pk, (item, item_errors) in zip(ids, valid):
+                if pk is None:
+                    item_errors['id'] = [_('This field is required.')]
+                elif pk not in existing:
+                    item_errors['id'] = [_('Invalid pk "%s" - object does not exist.') % pk]
+                elif pk in seen:
+                    item_errors['id'] = [_('This recipe is already updated by another item.')]
+                seen.add(pk)
+        else:
+            for item, item_errors in valid:
+                # the ids of new recipes are chosen by the database
+                item.pop('id', None)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def _resolve_names(self, validated_data):
+        """Add the ids of the tags and ingredients given by name, with one lookup for the whole batch"""
+        user = self.context['request'].user
+        for field_name, names_field in NAMED_RELATIONS:
+            names = [name for item in validated_data for name in item.get(names_field, [])]
+            model = Recipe._meta.get_field(field_name).related_model
+            # the objects are returned in the order of the names, so each item takes as many as it gave
+            objects = iter(model.objects.get_or_create_by_names(user, names))
+            for item in validated_data:
+                if names_field in item:
+                    item[field_name] = list(item.get(field_name, [])) + \
+                        [next(objects).pk for name in item.pop(names_field)]
+
+        return validated_data
+
+    def create(self, validated_data):
+        return bulk.create_recipes(self._resolve_names(validated_data))
+
+    def update(self, instance, validated_data):
+        recipes = instance.in_bulk([item['id'] for item in validated_data])
+        return bulk.update_recipes(recipes, self._resolve_names(validated_data))
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serialize one of the recipes of a bulk request"""
+    id = serializers.IntegerField(required=False)
+    # plain ids, which are checked for the whole batch by RecipeBulkListSerializer
+    ingredients = serializers.ListField(child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    ingredient_names = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    tag_names = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'title', 'ingredients', 'tags', 'time_minutes', 'price', 'link', 'ingredient_names', 'tag_names'
+        )
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Serialize a recipe of an import file, with the names of its tags and ingredients"""
+    # the names of a whole batch are resolved together by recipe.imports
+    ingredients = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    tags = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = ('title', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Serializer for a list of ids of recipes of the user"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        user = self.context['request'].user
+        existing = set(Recipe.objects.filter(user=user, pk__in=value).values_list('pk', flat=True))
+        invalid = [pk for pk in value if pk not in existing]
+        if invalid:
+            raise serializers.ValidationError([_('Invalid pk "%s" - object does not exist.') % pk for pk in invalid])
+
+        return value
+
+
+class ShoppingListIngredientSerializer(serializers.Serializer):
+    """Serializer for an ingredient of a shopping list, with the number of recipes needing it"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """Serializer for the ingredients and the totals of a list of recipes"""
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    ingredients = ShoppingListIngredientSerializer(many=True)
+    price = serializers.DecimalField(max_digits=None, decimal_places=2)
+    time_minutes = serializers.IntegerField()
@@ -0,0 +1,31 @@
+from decimal import Decimal
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from core.models import Ingredient, Recipe
+
+
+def shopping_list(user, recipe_ids):
+    """Return the ingredients of the recipes, with the number of recipes needing each of them, and the totals
+
+    A recipe given twice is only counted once.
+    The ingredients are counted in a single grouped query over the recipe ingredients table,
+    instead of fetching the ingredients of every recipe.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    recipes = Recipe.objects.filter(user=user, pk__in=recipe_ids)
+    # the ingredients are joined with their links to the recipes, and grouped
+    ingredients = Ingredient.objects \
+        .filter(recipe__in=recipes) \
+        .values('id', 'name') \
+        .annotate(count=Count('recipe')) \
+        .order_by('name', 'id')
+    totals = recipes.aggregate(
+        price=Coalesce(Sum('price'), Decimal(0)),
+        time_minutes=Coalesce(Sum('time_minutes'), 0),
+    )
+
+    return {
+        'recipes': recipe_ids,
+        'ingredients': list(ingredients),
+        **totals,
+    }
@@ -0,0 +1,293 @@
+import threading
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from core.deletion import bulk_delete_started, bulk_delete_finished, current_deletion
+from core.models import Tag, Ingredient, Recipe, LibraryVersion, Tombstone
+from recipe import cache, images, search
+
+
+_local = threading.local()
+
+
+class ChangedObjects:
+    """What the receivers below do once for all the changes made in a batched_changes() block"""
+
+    def __init__(self):
+        # the users whose library changed
+        self.user_ids = set()
+        # the recipes saved, which got a new updated_at, and the ones whose tags or ingredients changed
+        self.saved_recipe_ids = set()
+        self.linked_recipe_ids = set()
+        # the recipes whose title, tags or ingredients changed, which are indexed again
+        self.indexed_recipe_ids = set()
+        # the tags and ingredients linked to or unlinked from recipes, which are counted again
+        self.counted_ids = {Tag: set(), Ingredient: set()}
+
+
+def _changed_objects():
+    """Return the record of the batched_changes() block in progress in the thread, if any"""
+    return getattr(_local, 'changes', None)
+
+
+@contextmanager
+def batched_changes():
+    """Update the recipes, the search index, the counts and the versions once for all the changes made in the block
+
+    Otherwise every signal does it right away, e.g. creating a recipe with 3 tags and 3 ingredients
+    would index it 3 times and bump the version of the library 3 times.
+    The block runs in a transaction, and a block inside another one is part of it.
+    """
+    if _changed_objects() is not None:
+        yield
+        return
+
+    changes = ChangedObjects()
+    with transaction.atomic():
+        _local.changes = changes
+        try:
+            yield
+        finally:
+            _local.changes = None
+        _apply_changes(changes)
+
+
+def _apply_changes(changes):
+    # the recipes are rendered with their tags and ingredients, so they are modified too, unless they were just saved
+    touched_ids = changes.linked_recipe_ids - changes.saved_recipe_ids
+    if touched_ids:
+        Recipe.objects.filter(pk__in=touched_ids).update(updated_at=timezone.now())
+    search.update_vectors(changes.indexed_recipe_ids)
+    for model, ids in changes.counted_ids.items():
+        model.objects.update_recipe_counts(ids)
+    for user_id in changes.user_ids:
+        library_changed(user_id)
+
+
+def _index(recipe_ids):
+    """Compute the search vectors of the recipes again, once per batched_changes() block"""
+    changes = _changed_objects()
+    if changes is not None:
+        changes.indexed_recipe_ids.update(recipe_ids)
+        return
+
+    search.update_vectors(recipe_ids)
+
+
+def _count(model, ids):
+    """Count the recipes of the tags or ingredients again, once per batched_changes() block"""
+    changes = _changed_objects()
+    if changes is not None:
+        changes.counted_ids[model].update(ids)
+        return
+
+    model.objects.update_recipe_counts(ids)
+
+
+def library_changed(user_id):
+    """Called whenever the recipes, tags or ingredients of a user change
+
+    The signals below call it for the changes made through the models.
+    Code that bypasses the signals (bulk_create, update, ...) must call it itself.
+    In a batched_changes() block, it's done once at the end of the block.
+    """
+    changes = _changed_objects()
+    if changes is not None:
+        changes.user_ids.add(user_id)
+        return
+
+    cache.invalidate(user_id)
+    # a request reading the library before the change is committed may cache what it read under the new generation
+    transaction.on_commit(lambda: cache.invalidate(user_id))
+    # the ETags of the responses are derived from the version
+    LibraryVersion.objects.bump(user_id)
+    cache.invalidate_version(user_id)
+
+
+class DeletedObjects:
+    """What the receivers below do once for all the objects deleted in bulk (see core/deletion.py)"""
+
+    def __init__(self):
+        # the users whose library changed, and the ones deleted, whose library is gone
+        self.user_ids = set()
+        self.deleted_user_ids = set()
+        self.tombstones = []
+        # the images of the recipes deleted, with their variants
+        self.images = {}
+        # the tags and ingredients which lost recipes, and the recipes which lost tags or ingredients
+        self.unlinked_ids = {Tag: set(), Ingredient: set()}
+        self.unlinked_recipe_ids = set()
+
+
+def _deleted_objects():
+    """Return the record of the deletion in bulk in progress, or None when the objects are deleted one by one"""
+    deletion = current_deletion()
+    if deletion is None:
+        return None
+
+    return deletion.records.setdefault('recipe', DeletedObjects())
+
+
+@receiver(bulk_delete_started)
+def objects_deleting_in_bulk(sender, queryset, deletion, **kwargs):
+    """Read the links of the objects about to be deleted in bulk, which are deleted with them"""
+    deleted = deletion.records.setdefault('recipe', DeletedObjects())
+    ids = queryset.values('pk')
+    if sender is get_user_model():
+        # their tags and ingredients are deleted too, so no count nor index has to be updated
+        deleted.deleted_user_ids.update(queryset.values_list('pk', flat=True))
+    elif sender is Recipe:
+        for model, through in ((Tag, Recipe.tags.through), (Ingredient, Recipe.ingredients.through)):
+            column = model._meta.model_name
+            deleted.unlinked_ids[model].update(
+                through.objects.filter(recipe__in=ids).values_list(f'{column}_id', flat=True)
+            )
+    elif sender in (Tag, Ingredient):
+        through = sender._meta.get_field('recipe').through
+        deleted.unlinked_recipe_ids.update(
+            through.objects.filter(**{f'{sender._meta.model_name}__in': ids}).values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(bulk_delete_finished)
+def objects_deleted_in_bulk(sender, deletion, **kwargs):
+    """Do the work of the receivers below once for all the objects deleted in bulk"""
+    deleted = deletion.records.get('recipe')
+    if deleted is None:
+        return
+
+    user_ids = deleted.user_ids - deleted.deleted_user_ids
+    Tombstone.objects.bulk_create(tombstone for tombstone in deleted.tombstones if tombstone.user_id in user_ids)
+    for user_id in user_ids:
+        library_changed(user_id)
+
+    for model, ids in deleted.unlinked_ids.items():
+        _count(model, ids)
+    _index(deleted.unlinked_recipe_ids)
+    images.release_many(deleted.images)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def object_changed(sender, instance, **kwargs):
+    """Handle the creation, update and deletion of recipes, tags and ingredients"""
+    deleted = _deleted_objects()
+    if deleted is not None:
+        deleted.user_ids.add(instance.user_id)
+        return
+
+    library_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def object_deleted(sender, instance, **kwargs):
+    """Keep a tombstone of the deleted recipes, tags and ingredients, for the clients synchronizing their library"""
+    tombstone = Tombstone(user_id=instance.user_id, kind=sender._meta.model_name, object_id=instance.pk)
+    deleted = _deleted_objects()
+    if deleted is not None:
+        deleted.tombstones.append(tombstone)
+        return
+
+    tombstone.save()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    """Index the title of a saved recipe"""
+    changes = _changed_objects()
+    if changes is not None and (update_fields is None or 'updated_at' in update_fields):
+        changes.saved_recipe_ids.add(instance.pk)
+    if update_fields is None or 'title' in update_fields:
+        _index([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attribute_saved(sender, instance, created, **kwargs):
+    """Index the new name of a tag or ingredient in its recipes"""
+    if not created:
+        _index(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attribute_deleting(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient being deleted, which are only known before"""
+    # in bulk, they were read for all the objects at once
+    if _deleted_objects() is not None:
+        return
+    instance._deleted_recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attribute_deleted(sender, instance, **kwargs):
+    """Remove the name of a deleted tag or ingredient from the index of its recipes"""
+    _index(instance.__dict__.pop('_deleted_recipe_ids', []))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_attributes_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Handle tags and ingredients being added to or removed from recipes"""
+    # the instance is the recipe, or the tag/ingredient when the relation is changed from that side (reverse)
+    # both belong to the same user
+    # the model is the one of the objects added or removed (pk_set)
+    if action == 'pre_clear':
+        # the objects losing the relation are only known before
+        related = instance.recipe_set.all() if reverse else model.objects.filter(recipe=instance)
+        instance._cleared_ids = list(related.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+
+    library_changed(instance.user_id)
+
+    ids = instance.__dict__.pop('_cleared_ids', []) if action == 'post_clear' else pk_set
+    if reverse:
+        recipe_ids, attribute_model, attribute_ids = ids, type(instance), [instance.pk]
+    else:
+        recipe_ids, attribute_model, attribute_ids = [instance.pk], model, ids
+
+    # the recipes are rendered with their tags and ingredients, so they are modified too
+    changes = _changed_objects()
+    if changes is not None:
+        changes.linked_recipe_ids.update(recipe_ids)
+    else:
+        Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    _index(recipe_ids)
+    # the ids removed may not have been linked, so the recipes are counted again rather than decremented
+    _count(attribute_model, attribute_ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Remember the tags and ingredients of a recipe being deleted, which are only known before"""
+    # in bulk, they were read for all the recipes at once
+    if _deleted_objects() is not None:
+        return
+    instance._deleted_attribute_ids = {
+        Tag: list(instance.tags.values_list('pk', flat=True)),
+        Ingredient: list(instance.ingredients.values_list('pk', flat=True)),
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Delete the image of a deleted recipe, unless another recipe uses it, and count the recipes of its tags again"""
+    deleted = _deleted_objects()
+    if deleted is not None:
+        deleted.images[instance.image.name] = instance.image_variants
+        return
+
+    images.release(instance.image.name, instance.image_variants)
+    for model, ids in instance.__dict__.pop('_deleted_attribute_ids', {}).items():
+        _count(model, ids)
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.models import Tag, Ingredient, Recipe, Tombstone
+from recipe import serializers
+
+
+# what the clients synchronize, with the serializer rendering it
+KINDS = {
+    'recipes': (Recipe, serializers.RecipeSerializer),
+    'tags': (Tag, serializers.TagSerializer),
+    'ingredients': (Ingredient, serializers.IngredientSerializer),
+}
+# the key of the position in the tombstones, which are returned as 'deleted'
+DELETED = 'deleted'
+# the tombstones are saved with the name of the model
+KIND_NAMES = {model._meta.model_name: kind for kind, (model, _) in KINDS.items()}
+
+
+class InvalidCursor(ValueError):
+    """The cursor wasn't returned by the sync endpoint"""
+
+
+# the cursor holds, for every kind, the (updated_at, id) of the last object sent to the client,
+# since many objects may have been modified at the same time, and a batch may end in the middle of them
+# the timestamps are set when the rows are written, not when they are committed, so a client syncing while a long
+# transaction is in progress may miss its changes: the writes of this app are short, and a full sync recovers anyway
+def encode_cursor(positions):
+    """Return the opaque cursor of the positions of the client"""
+    data = {kind: [timestamp.isoformat(), pk] for kind, (timestamp, pk) in positions.items()}
+
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the positions of the client from its cursor, raising InvalidCursor if it's not valid"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        positions = {kind: (parse_datetime(timestamp), int(pk)) for kind, (timestamp, pk) in data.items()}
+    except (binascii.Error, UnicodeError, ValueError, TypeError, AttributeError):
+        raise InvalidCursor(cursor)
+    if set(positions) - set(KINDS) - {DELETED} or any(timestamp is None for timestamp, _ in positions.values()):
+        raise InvalidCursor(cursor)
+
+    return positions
+
+
+def _after(queryset, field, position):
+    """Return the objects after the position, ordered by the field (a timestamp) and then by id"""
+    if position is not None:
+        timestamp, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk}))
+
+    return queryset.order_by(field, 'id')
+
+
+def is_expired(positions):
+    """Return True if the tombstones the client hasn't received yet may have been pruned"""
+    if DELETED not in positions or not settings.SYNC_TOMBSTONE_RETENTION_DAYS:
+        return False
+
+    return positions[DELETED][0] < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def changes(user, positions, limit, context=None):
+    """Return the objects of the user modified and deleted after the positions, at most limit of each kind
+
+    The result has the serialized objects by kind, the ids of the deleted objects by kind,
+    and the positions after them, for the next call.
+    """
+    data = {}
+    new_positions = dict(positions)
+    has_more = False
+
+    for kind, (model, serializer_class) in KINDS.items():
+        queryset = _after(model.objects.filter(user=user), 'updated_at', positions.get(kind))
+        if model is Recipe:
+            # the recipes are rendered with the ids of their tags and ingredients
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+                Prefetch('ingredients', queryset=Ingredient.objects.only('id').order_by('id')),
+            )
+        objects = list(queryset[:limit])
+        data[kind] = serializer_class(objects, many=True, context=context).data
+        if objects:
+            new_positions[kind] = (objects[-1].updated_at, objects[-1].pk)
+        has_more = has_more or len(objects) == limit
+
+    # a client without a cursor has nothing to delete yet, so it only needs the deletions from now on
+    if not positions:
+        new_positions[DELETED] = (timezone.now(), 0)
+    tombstones = list(
+        _after(Tombstone.objects.filter(user_id=user.pk), 'deleted_at', new_positions.get(DELETED))[:limit]
+    )
+    data[DELETED] = {kind: [] for kind in KINDS}
+    for tombstone in tombstones:
+        data[DELETED][KIND_NAMES[tombstone.kind]].append(tombstone.object_id)
+    if tombstones:
+        new_positions[DELETED] = (tombstones[-1].deleted_at, tombstones[-1].pk)
+    has_more = has_more or len(tombstones) == limit
+
+    data['has_more'] = has_more
+
+    return data, new_positions
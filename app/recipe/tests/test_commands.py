@@ -0,0 +1,107 @@
+import tempfile
+from io import BytesIO, StringIO
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from core.models import Recipe, Tag, Ingredient
+from recipe import images
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_filters(self):
+        """Test running the filters benchmark on a small library"""
+        out = StringIO()
+
+        call_command('benchmark_recipes', 'filters', recipes=20, repeat=1, stdout=out)
+
+        # assertions
+        self.assertIn('match=all', out.getvalue())
+        # the library created by the benchmark is rolled back
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_bulk(self):
+        """Test running the bulk benchmark"""
+        out = StringIO()
+
+        call_command('benchmark_recipes', 'bulk', recipes=0, repeat=1, stdout=out)
+
+        # assertions
+        self.assertIn('bulk create', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class UpdateRecipeCountsCommandTests(TestCase):
+    def test_update_recipe_counts(self):
+        """Test counting the recipes of the tags and ingredients linked without the signals"""
+        user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Kale')
+        recipe = Recipe.objects.create(user=user, title='Salad', time_minutes=5, price=3.00)
+        Recipe.tags.through.objects.create(recipe=recipe, tag=tag)
+        Recipe.ingredients.through.objects.create(recipe=recipe, ingredient=ingredient)
+
+        call_command('update_recipe_counts', stdout=StringIO())
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+
+        # assertions
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(ingredient.recipe_count, 1)
+
+
+class GenerateImageVariantsCommandTests(TestCase):
+    @override_settings(RECIPE_IMAGE_VARIANT_SIZES=[64])
+    def test_generate_missing_variants(self):
+        """Test generating the variants of the images that have none"""
+        user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        recipe = Recipe.objects.create(user=user, title='Pancakes', time_minutes=10, price=2.00)
+        buffer = BytesIO()
+        Image.new('RGB', (100, 50)).save(buffer, format='JPEG')
+        recipe.image.save('pancakes.jpg', ContentFile(buffer.getvalue()))
+        Recipe.objects.create(user=user, title='No image', time_minutes=10, price=2.00)
+        out = StringIO()
+
+        call_command('generate_image_variants', stdout=out)
+
+        recipe.refresh_from_db()
+        names = list(recipe.image_variants['64'].values())
+        for name in names:
+            default_storage.delete(name)
+        recipe.image.delete()
+
+        # assertions
+        self.assertIn('Generated the variants of 1 images', out.getvalue())
+        self.assertTrue(names)
+
+
+class CollectRecipeImagesCommandTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_collect_orphaned_images(self):
+        """Test that only the files no recipe uses are deleted"""
+        user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        recipe = Recipe.objects.create(user=user, title='Pancakes', time_minutes=10, price=2.00)
+        recipe.image.save('pancakes.jpg', ContentFile(b'pancakes'))
+        orphan = images.storage.save('uploads/recipe/waffles.jpg', ContentFile(b'waffles'))
+        out = StringIO()
+
+        call_command('collect_recipe_images', grace=0, dry_run=True, stdout=out)
+        found = out.getvalue()
+        call_command('collect_recipe_images', grace=0, stdout=out)
+        image_kept = images.storage.exists(recipe.image.name)
+        orphan_kept = images.storage.exists(orphan)
+        recipe.image.delete()
+
+        # assertions
+        self.assertIn(orphan, found)
+        self.assertIn('Deleted 1 orphaned files', out.getvalue())
+        self.assertTrue(image_kept)
+        self.assertFalse(orphan_kept)
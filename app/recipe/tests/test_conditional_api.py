@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, LibraryVersion
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalRequestsApiTests(TestCase):
+    """Test the ETags and conditional requests"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Pancakes', time_minutes=10, price=2.00)
+        self.tag = Tag.objects.create(user=self.user, name='Breakfast')
+
+    # the version of the library is cached when the cache is shared by the processes
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_not_modified(self):
+        """Test that the list is answered 304 without any query when it didn't change"""
+        response = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            response_again = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        # If-None-Match uses the weak comparison
+        response_weak = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=f'"other", W/{response["ETag"]}')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_again.content, b'')
+        self.assertEqual(response_again['ETag'], response['ETag'])
+        self.assertEqual(response_weak.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modified_by_other_process(self):
+        """Test that the version bumped by another process is seen, when the cache isn't shared"""
+        response = self.client.get(RECIPES_URL)
+        # like another process would, without going through the cache of this one
+        LibraryVersion.objects.bump(self.user.pk)
+
+        response_again = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        # assertions
+        self.assertEqual(response_again.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response_again['ETag'], response['ETag'])
+
+    def test_modified(self):
+        """Test that any change to the library of the user changes the ETags"""
+        etags = [self.client.get(RECIPES_URL)['ETag']]
+        Tag.objects.create(user=self.user, name='Vegan')
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        self.recipe.tags.add(self.tag)
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+
+        response = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etags[0])
+
+        # assertions
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], etags[-1])
+        self.assertEqual(LibraryVersion.objects.current(self.user.pk), 4)
+
+    def test_other_users_changes_ignored(self):
+        """Test that the changes of another user don't change the ETags"""
+        etag = self.client.get(TAGS_URL)['ETag']
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        Tag.objects.create(user=user2, name='Vegan')
+
+        response = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_depends_on_url(self):
+        """Test that the ETags of different urls or query parameters are different"""
+        etags = {
+            self.client.get(RECIPES_URL)['ETag'],
+            self.client.get(RECIPES_URL, {'tags': self.tag.id})['ETag'],
+            self.client.get(detail_url(self.recipe.id))['ETag'],
+            self.client.get(TAGS_URL)['ETag'],
+        }
+
+        # assertions
+        self.assertEqual(len(etags), 4)
+
+    def test_if_match(self):
+        """Test that an update is rejected when the recipe was modified since it was fetched"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        Recipe.objects.create(user=self.user, title='Waffles', time_minutes=10, price=2.00)
+        current_etag = self.client.get(url)['ETag']
+
+        response_stale = self.client.patch(url, {'title': 'Stale'}, HTTP_IF_MATCH=etag)
+        response_current = self.client.patch(url, {'title': 'Current'}, HTTP_IF_MATCH=current_etag)
+
+        self.recipe.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response_stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response_current.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.recipe.title, 'Current')
+
+    def test_if_match_weak_etag(self):
+        """Test that the weak ETag of a compressed response is accepted by If-Match"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.patch(url, {'title': 'Current'}, HTTP_IF_MATCH=f'W/{etag}')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,125 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+
+
+EXPORT_URL = reverse('recipe:export')
+
+
+def sample_recipe(user, tags=(), ingredients=(), **params):
+    """Create and return a sample recipe with the tags and ingredients"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.tags.add(*tags)
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+def read_lines(content):
+    """Return the objects of the lines of an export"""
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+class PublicExportApiTests(TestCase):
+    """Test the unauthenticated export API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        response = APIClient().get(EXPORT_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportApiTests(TestCase):
+    """Test the export of the library of the user"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+
+    def test_export(self):
+        """Test that every recipe of the user is streamed on its own line, with the names of its tags and ingredients"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        kale = Ingredient.objects.create(user=self.user, name='Kale')
+        salad = sample_recipe(self.user, [vegan, dinner], [kale], title='Salad', price=3.50, link='https://fake.com')
+        soup = sample_recipe(self.user, title='Soup')
+        other_user = get_user_model().objects.create_user('other@fake.com', 'fake-123')
+        sample_recipe(other_user, title='Other')
+
+        response = self.client.get(EXPORT_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', response['Content-Disposition'])
+        self.assertEqual(read_lines(b''.join(response.streaming_content)), [
+            {
+                'id': salad.id, 'title': 'Salad', 'time_minutes': 10, 'price': '3.50', 'link': 'https://fake.com',
+                'image': None, 'tags': ['Dinner', 'Vegan'], 'ingredients': ['Kale'],
+            },
+            {
+                'id': soup.id, 'title': 'Soup', 'time_minutes': 10, 'price': '5.00', 'link': '',
+                'image': None, 'tags': [], 'ingredients': [],
+            },
+        ])
+
+    def test_export_gzip(self):
+        """Test that the export is compressed with gzip when asked"""
+        sample_recipe(self.user, title='Salad')
+
+        response = self.client.get(EXPORT_URL, {'gzip': 'true'})
+        response_invalid = self.client.get(EXPORT_URL, {'gzip': 'maybe'})
+
+        # assertions
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('recipes.ndjson.gz', response['Content-Disposition'])
+        lines = read_lines(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual([line['title'] for line in lines], ['Salad'])
+        self.assertEqual(response_invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_query_count(self):
+        """Test that the recipes are read in chunks, with the tags and ingredients of every chunk fetched together"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            sample_recipe(self.user, [tag], title=f'Recipe {i}')
+
+        # the recipes, then the tags and the ingredients of each of the 3 chunks
+        with self.assertNumQueries(7):
+            response = self.client.get(EXPORT_URL)
+            lines = read_lines(b''.join(response.streaming_content))
+
+        # assertions
+        self.assertEqual([line['title'] for line in lines], [f'Recipe {i}' for i in range(5)])
+        self.assertTrue(all(line['tags'] == ['Vegan'] for line in lines))
+
+    def test_export_command(self):
+        """Test that the command writes the same export to the standard output or to a gzip file"""
+        sample_recipe(self.user, title='Salad')
+        out = io.StringIO()
+
+        call_command('export_recipes', 'test@fake.com', stdout=out)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.ndjson.gz')
+            call_command('export_recipes', 'test@fake.com', output=path, stderr=io.StringIO())
+            with gzip.open(path) as file:
+                lines_gzip = read_lines(file.read())
+
+        # assertions
+        self.assertEqual([line['title'] for line in read_lines(out.getvalue().encode())], ['Salad'])
+        self.assertEqual([line['title'] for line in lines_gzip], ['Salad'])
@@ -0,0 +1,149 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+
+
+IMPORT_URL = reverse('recipe:import')
+EXPORT_URL = reverse('recipe:export')
+
+
+def ndjson(*recipes):
+    """Return the lines of JSON of the recipes"""
+    return ''.join(json.dumps(recipe) + '\n' for recipe in recipes).encode()
+
+
+class PublicImportApiTests(TestCase):
+    """Test the unauthenticated import API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        response = APIClient().post(IMPORT_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateImportApiTests(TestCase):
+    """Test the import of recipes from a file"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        """Upload the file to import, returning the response and its events"""
+        response = self.client.post(IMPORT_URL, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        if not response.streaming:
+            return response, None
+
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_import_ndjson(self):
+        """Test that the valid recipes are created, with their tags and ingredients by name, and the others reported"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        content = ndjson(
+            {'title': 'Salad', 'time_minutes': 5, 'price': '3.50', 'tags': ['vegan'], 'ingredients': ['Kale', 'Oil']},
+            {'title': 'Soup', 'time_minutes': 'long', 'price': '2.00'},
+        ) + b'not json\n\n' + ndjson({'title': 'Stew', 'time_minutes': 60, 'price': '6.00', 'ingredients': ['kale']})
+
+        response, events = self.upload('recipes.ndjson', content)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['line'] for event in events if 'errors' in event], [2, 3])
+        self.assertIn('time_minutes', events[0]['errors'])
+        self.assertEqual(events[-1], {'imported': 2, 'failed': 2, 'done': True})
+        salad = Recipe.objects.get(user=self.user, title='Salad')
+        stew = Recipe.objects.get(user=self.user, title='Stew')
+        self.assertEqual(list(salad.tags.all()), [vegan])
+        self.assertEqual(sorted(ingredient.name for ingredient in salad.ingredients.all()), ['Kale', 'Oil'])
+        self.assertEqual(list(stew.ingredients.all()), list(salad.ingredients.filter(name='Kale')))
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(Recipe.objects.filter(title='Soup').exists())
+
+    def test_import_csv_gzip(self):
+        """Test that a gzipped CSV file is imported, with the tags and ingredients separated by semicolons"""
+        content = '\ufefftitle,time_minutes,price,link,tags,ingredients\n' \
+            'Salad,5,3.50,,Vegan; Quick,Kale\n' \
+            '"Soup, with ""bread""",20,4.00,https://fake.com,,\n' \
+            'Stew,60\n'
+
+        response, events = self.upload('recipes.csv.gz', gzip.compress(content.encode()))
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['line'] for event in events if 'errors' in event], [4])
+        self.assertIn('price', events[0]['errors'])
+        salad = Recipe.objects.get(user=self.user, title='Salad')
+        soup = Recipe.objects.get(user=self.user, title='Soup, with "bread"')
+        self.assertEqual(sorted(tag.name for tag in salad.tags.all()), ['Quick', 'Vegan'])
+        self.assertEqual(soup.link, 'https://fake.com')
+        self.assertEqual(soup.tags.count(), 0)
+
+    @override_settings(RECIPE_IMPORT_BATCH_SIZE=2)
+    def test_import_batches(self):
+        """Test that the progress is reported after every batch"""
+        content = ndjson(*[{'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00'} for i in range(5)])
+
+        response, events = self.upload('recipes.ndjson', content)
+
+        # assertions
+        self.assertEqual(events, [
+            {'line': 2, 'imported': 2, 'failed': 0},
+            {'line': 4, 'imported': 4, 'failed': 0},
+            {'line': 5, 'imported': 5, 'failed': 0},
+            {'imported': 5, 'failed': 0, 'done': True},
+        ])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_import_export(self):
+        """Test that the export of a user can be imported by another user"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.50)
+        recipe.tags.add(tag)
+        content = b''.join(self.client.get(EXPORT_URL).streaming_content)
+        other_user = get_user_model().objects.create_user('other@fake.com', 'fake-123')
+        self.client.force_authenticate(other_user)
+
+        self.upload('recipes.ndjson', content)
+
+        # assertions
+        imported = Recipe.objects.get(user=other_user)
+        self.assertEqual((imported.title, imported.time_minutes, str(imported.price)), ('Salad', 5, '3.50'))
+        self.assertEqual([tag.name for tag in imported.tags.all()], ['Vegan'])
+        self.assertEqual(imported.tags.get().user, other_user)
+
+    def test_import_no_file(self):
+        """Test that a file is required"""
+        response = self.client.post(IMPORT_URL, {}, format='multipart')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', response.data)
+
+    def test_import_command(self):
+        """Test that the command imports a file, reporting the invalid recipes"""
+        content = ndjson({'title': 'Salad', 'time_minutes': 5, 'price': '3.50'}, {'title': 'Soup'})
+        out, err = io.StringIO(), io.StringIO()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.ndjson')
+            with open(path, 'wb') as file:
+                file.write(content)
+            call_command('import_recipes', 'test@fake.com', path, stdout=out, stderr=err)
+
+        # assertions
+        self.assertIn('Imported 1 recipes, 1 failed', out.getvalue())
+        self.assertIn('Line 2:', err.getvalue())
+        self.assertEqual(list(Recipe.objects.filter(user=self.user).values_list('title', flat=True)), ['Salad'])
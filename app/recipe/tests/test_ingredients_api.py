@@ -104,6 +104,8 @@ class PrivateIngredientsApiTests(TestCase):
 
         response = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
+        # the number of recipes was counted in the database when the recipe was linked
+        ingredient1.refresh_from_db()
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
 
@@ -138,3 +140,17 @@ class PrivateIngredientsApiTests(TestCase):
 
         # assertions
         self.assertEqual(len(response.data), 1)
+
+    def test_retrieve_ingredients_cached(self):
+        """Test that the ingredients are listed from the cache until they change"""
+        Ingredient.objects.create(user=self.user, name='Kale')
+
+        self.client.get(INGREDIENTS_URL)
+        response_cached = self.client.get(INGREDIENTS_URL)
+        Ingredient.objects.create(user=self.user, name='Salt')
+        response = self.client.get(INGREDIENTS_URL)
+
+        # assertions
+        self.assertEqual(response_cached['X-Cache'], 'HIT')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([ingredient['name'] for ingredient in response.json()], ['Salt', 'Kale'])
@@ -1,17 +1,26 @@
 import tempfile  # python function that allows to create temp files
 import os
+from unittest.mock import patch
 from PIL import Image   # Pillow package, create and test images
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, LibraryVersion, Tombstone
+from recipe import cache, filters, images, search
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 # /api/recipe/recipes
 RECIPES_URL = reverse('recipe:recipe-list')
+# /api/recipe/recipes/bulk/
+BULK_URL = reverse('recipe:recipe-bulk')
+# /api/recipe/recipes/cookable/
+COOKABLE_URL = reverse('recipe:recipe-cookable')
 
 
 def image_upload_url(recipe_id):
@@ -19,6 +28,11 @@ def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def image_url(recipe_id):
+    """Return URL for the image of a recipe"""
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
 # /api/recipe/recipes/1/
 def detail_url(recipe_id):
     """Return recipe detail URL"""
@@ -94,6 +108,121 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    @override_settings(RECIPE_FAST_LIST=False)
+    def test_retrieve_recipes_query_count(self):
+        """Test that listing recipes runs a fixed number of queries regardless of how many recipes there are"""
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(sample_ingredient(user=self.user, name=f'Ingredient {i}'))
+
+        # the version of the library (for the ETag) is cached when the cache is shared, e.g. in production
+        cache.library_version(self.user.pk)
+
+        # 1 query for the recipes, 1 for all their tags and 1 for all their ingredients
+        with self.assertNumQueries(3):
+            response = self.client.get(RECIPES_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(response.data[0]['tags']), 1)
+        self.assertEqual(len(response.data[0]['ingredients']), 1)
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_view_recipe_detail_query_count(self):
+        """Test that viewing a recipe detail runs a fixed number of queries"""
+        recipe = sample_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(sample_ingredient(user=self.user, name=f'Ingredient {i}'))
+
+        cache.library_version(self.user.pk)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(detail_url(recipe.id))
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['tags']), 5)
+        self.assertEqual(len(response.data['ingredients']), 5)
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_retrieve_recipes_fast_path(self):
+        """Test that the list rendered from the rows is identical to the one rendered by the serializer"""
+        for i in range(3):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}', price=i + 0.5, link=f'https://fake.com/{i}')
+            recipe.tags.add(*[sample_tag(user=self.user, name=f'Tag {i}.{j}') for j in range(3 - i)])
+            recipe.ingredients.add(sample_ingredient(user=self.user, name=f'Ingredient {i}'))
+        Recipe.objects.filter(title='Recipe 0').update(image_variants={'128': {'jpeg': 'uploads/recipe/a.jpg'}})
+        cache.library_version(self.user.pk)
+
+        # the recipes with their tags and ingredients, in a single query
+        with self.assertNumQueries(1):
+            response = self.client.get(RECIPES_URL)
+        response_page = self.client.get(RECIPES_URL, {'page_size': 2, 'page': 2})
+        with self.settings(RECIPE_FAST_LIST=False):
+            response_serializer = self.client.get(RECIPES_URL)
+            response_serializer_page = self.client.get(RECIPES_URL, {'page_size': 2, 'page': 2})
+        with patch('recipe.fast.connection') as mock_connection:
+            # the other databases group the ids of the tags and ingredients in python
+            mock_connection.vendor = 'sqlite'
+            response_other = self.client.get(RECIPES_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, response_serializer.content)
+        self.assertEqual(response_page.content, response_serializer_page.content)
+        self.assertEqual(response_other.content, response_serializer.content)
+        self.assertEqual(len(response.json()[-1]['tags']), 3)
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_retrieve_recipes_sparse_fields(self):
+        """Test that only the fields asked for are rendered, and only their columns read"""
+        recipe = sample_recipe(user=self.user, title='Pancakes', link='https://fake.com/pancakes')
+        recipe.tags.add(sample_tag(user=self.user))
+        cache.library_version(self.user.pk)
+
+        # the tags and ingredients aren't prefetched when they aren't rendered
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'id': recipe.id, 'title': 'Pancakes'}])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"title"', queries[0]['sql'])
+        self.assertNotIn('"link"', queries[0]['sql'])
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_retrieve_recipes_expanded(self):
+        """Test that the expanded tags are rendered with their names, without extra queries"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(sample_ingredient(user=self.user))
+        cache.library_version(self.user.pk)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(RECIPES_URL, {'expand': 'tags'})
+        response_fields = self.client.get(RECIPES_URL, {'fields': 'title', 'expand': 'tags'})
+
+        # assertions
+        self.assertEqual(response.data[0]['tags'], [{'id': tag.id, 'name': 'Vegan', 'recipe_count': 1}])
+        self.assertEqual(response.data[0]['ingredients'], [recipe.ingredients.get().id])
+        self.assertEqual(set(response_fields.data[0]), {'title', 'tags'})
+
+    def test_retrieve_recipes_invalid_fields(self):
+        """Test that unknown fields are rejected"""
+        response_fields = self.client.get(RECIPES_URL, {'fields': 'id,tag_names'})
+        response_expand = self.client.get(RECIPES_URL, {'expand': 'title'})
+
+        # assertions
+        self.assertEqual(response_fields.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response_fields.data)
+        self.assertEqual(response_expand.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_recipes_limited_to_user(self):
         """Test retrieving recipes for user"""
         user2 = get_user_model().objects.create_user(
@@ -163,6 +292,32 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(tag1, tags)
         self.assertIn(tag2, tags)
 
+    def test_create_recipe_updates_once(self):
+        """Test that a recipe created with tags and ingredients is indexed, counted and versioned once"""
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        ingredients = [sample_ingredient(user=self.user, name=f'Ingredient {i}') for i in range(3)]
+        version = LibraryVersion.objects.current(self.user.pk)
+        payload = {
+            'title': 'Avocado lime cheesecake',
+            'tags': [tag.id for tag in tags],
+            'ingredients': [ingredient.id for ingredient in ingredients],
+            'time_minutes': 60,
+            'price': 20.00
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(RECIPES_URL, payload)
+        updates = [query['sql'] for query in queries if query['sql'].lstrip().startswith('UPDATE')]
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # the search vector, the counts of the tags and of the ingredients, and the version
+        self.assertEqual(len(updates), 4)
+        self.assertEqual(LibraryVersion.objects.current(self.user.pk), version + 1)
+        self.assertEqual([tag.recipe_count for tag in Tag.objects.filter(user=self.user)], [1, 1, 1])
+        if connection.vendor == 'postgresql':
+            self.assertEqual(search.search(Recipe.objects.all(), 'tag').count(), 1)
+
     def test_create_recipe_with_ingredients(self):
         """Test creating recipe with ingredients"""
         ingredient1 = sample_ingredient(user=self.user, name='Prawns')
@@ -182,6 +337,45 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_names(self):
+        """Test creating a recipe with tags and ingredients given by name, creating the missing ones"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        payload = {
+            'title': 'Tofu scramble',
+            'tags': [tag.id],
+            'tag_names': ['vegan', 'Breakfast'],
+            'ingredient_names': ['Tofu', 'Turmeric'],
+            'time_minutes': 15,
+            'price': 3.00
+        }
+
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertEqual(sorted(tag.name for tag in recipe.tags.all()), ['Breakfast', 'Vegan'])
+        self.assertEqual(sorted(ingredient.name for ingredient in recipe.ingredients.all()), ['Tofu', 'Turmeric'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Ingredient.objects.filter(user=self.user, name='Tofu').exists())
+        self.assertNotIn('tag_names', response.data)
+
+    def test_create_recipe_without_tags(self):
+        """Test that the tags must be given, either by id or by name"""
+        payload = {
+            'title': 'Tofu scramble',
+            'ingredient_names': ['Tofu'],
+            'time_minutes': 15,
+            'price': 3.00
+        }
+
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', response.data)
+        self.assertFalse(Ingredient.objects.filter(user=self.user).exists())
+
     # There are 2 ways to update an object using a REST API, via 2 different HTTP methods
     # - PATCH: updates the fields that are provided in the payload (and only those fields)
     #        - this means that fields omitted in the request are not modified in the object
@@ -236,6 +430,27 @@ class PrivateRecipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_update_recipe_keeps_image_variants(self):
+        """Test that updating a recipe doesn't overwrite the image variants saved by a worker in the meantime"""
+        recipe = sample_recipe(user=self.user)
+        variants = {'128': {'jpeg': f"uploads/recipe/variants/ab/{'ab' * 32}.jpg"}}
+        resolve_names = RecipeSerializer._resolve_names
+
+        def save_variants(serializer, validated_data, user):
+            # the worker saves the variants after the request read the recipe
+            Recipe.objects.filter(pk=recipe.pk).update(image_variants=variants)
+            return resolve_names(serializer, validated_data, user)
+
+        with patch.object(RecipeSerializer, '_resolve_names', autospec=True, side_effect=save_variants):
+            res = self.client.patch(detail_url(recipe.id), {'title': 'Chicken tikka'})
+
+        recipe.refresh_from_db()
+
+        # assertions
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipe.title, 'Chicken tikka')
+        self.assertEqual(recipe.image_variants, variants)
+
     def test_filter_recipes_by_tags(self):
         """"Test returning recipes with specific tags"""
         recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
@@ -282,6 +497,535 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(serializer2.data, response.data)
         self.assertNotIn(serializer3.data, response.data)
 
+    def test_filter_recipes_unique(self):
+        """Test that a recipe matching several of the filtered tags is returned only once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+
+        response = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        # assertions
+        self.assertEqual(len(response.data), 1)
+
+    def test_filter_recipes_match_all(self):
+        """Test returning the recipes that have all the given tags and ingredients"""
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        ingredient = sample_ingredient(user=self.user, name='Chocolate')
+        recipe1 = sample_recipe(user=self.user, title='Vegan chocolate mousse')
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        recipe2 = sample_recipe(user=self.user, title='Vegan brownies')
+        recipe2.tags.add(tag1, tag2)
+        recipe3 = sample_recipe(user=self.user, title='Chocolate cake')
+        recipe3.tags.add(tag2)
+        recipe3.ingredients.add(ingredient)
+
+        response = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'})
+        response_with_ingredient = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag1.id},{tag2.id}', 'ingredients': f'{ingredient.id}', 'match': 'all'}
+        )
+
+        # assertions
+        self.assertEqual([recipe['id'] for recipe in response.data], [recipe2.id, recipe1.id])
+        self.assertEqual([recipe['id'] for recipe in response_with_ingredient.data], [recipe1.id])
+
+    def test_filter_recipes_invalid_params(self):
+        """Test that invalid filters are rejected"""
+        response_match = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        response_ids = self.client.get(RECIPES_URL, {'tags': '1,two'})
+
+        # assertions
+        self.assertEqual(response_match.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_ids.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_by_time_and_price(self):
+        """Test filtering the recipes by ranges of time and price"""
+        quick_cheap = sample_recipe(self.user, title='Toast', time_minutes=5, price=1.50)
+        quick_expensive = sample_recipe(self.user, title='Tartare', time_minutes=15, price=25.00)
+        slow_cheap = sample_recipe(self.user, title='Stew', time_minutes=180, price=8.00)
+
+        response_quick = self.client.get(RECIPES_URL, {'max_time': 30})
+        response_cheap = self.client.get(RECIPES_URL, {'max_price': '10'})
+        response_both = self.client.get(RECIPES_URL, {'max_time': 30, 'max_price': '10.00'})
+        response_min = self.client.get(RECIPES_URL, {'min_time': 15, 'min_price': '8'})
+
+        # assertions
+        self.assertEqual([recipe['id'] for recipe in response_quick.data], [quick_expensive.id, quick_cheap.id])
+        self.assertEqual([recipe['id'] for recipe in response_cheap.data], [slow_cheap.id, quick_cheap.id])
+        self.assertEqual([recipe['id'] for recipe in response_both.data], [quick_cheap.id])
+        self.assertEqual([recipe['id'] for recipe in response_min.data], [slow_cheap.id, quick_expensive.id])
+
+    def test_order_recipes(self):
+        """Test ordering the recipes by an indexed field, then by id"""
+        recipe1 = sample_recipe(self.user, time_minutes=20, price=3.00)
+        recipe2 = sample_recipe(self.user, time_minutes=10, price=3.00)
+        recipe3 = sample_recipe(self.user, time_minutes=30, price=1.00)
+
+        response_time = self.client.get(RECIPES_URL, {'ordering': 'time_minutes'})
+        response_price = self.client.get(RECIPES_URL, {'ordering': '-price'})
+
+        # assertions
+        self.assertEqual([recipe['id'] for recipe in response_time.data], [recipe2.id, recipe1.id, recipe3.id])
+        self.assertEqual([recipe['id'] for recipe in response_price.data], [recipe2.id, recipe1.id, recipe3.id])
+
+    def test_order_recipes_cursor_pagination(self):
+        """Test that the cursor pagination follows the requested ordering"""
+        recipes = [sample_recipe(self.user, time_minutes=minutes) for minutes in (30, 10, 10, 20, 40)]
+        expected = [recipes[1].id, recipes[2].id, recipes[3].id, recipes[0].id, recipes[4].id]
+
+        ids = []
+        url, params = RECIPES_URL, {'pagination': 'cursor', 'page_size': 2, 'ordering': 'time_minutes'}
+        while url:
+            response = self.client.get(url, params)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url, params = response.data['next'], None
+
+        # assertions
+        self.assertEqual(ids, expected)
+
+    def test_every_ordering_cursor_pagination(self):
+        """Test that the cursor pagination works with every ordering, including the columns that aren't rendered"""
+        recipes = [
+            sample_recipe(self.user, time_minutes=minutes, price=minutes / 10) for minutes in (30, 10, 10, 20, 40)
+        ]
+        # so the recipes aren't in the same order by updated_at as by created_at
+        recipes[0].save()
+
+        for field_name in filters.ORDERING_FIELDS:
+            for ordering in (field_name, f'-{field_name}'):
+                expected = list(
+                    Recipe.objects.filter(user=self.user).order_by(*filters.get_ordering(ordering))
+                    .values_list('id', flat=True)
+                )
+                ids = []
+                url, params = RECIPES_URL, {'pagination': 'cursor', 'page_size': 2, 'ordering': ordering}
+                while url:
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, status.HTTP_200_OK, ordering)
+                    ids.extend(recipe['id'] for recipe in response.data['results'])
+                    url, params = response.data['next'], None
+
+                # assertions
+                self.assertEqual(ids, expected, ordering)
+
+    def test_filter_recipes_invalid_ranges_and_ordering(self):
+        """Test that invalid range filters and orderings are rejected"""
+        response_time = self.client.get(RECIPES_URL, {'max_time': 'soon', 'min_price': '-1'})
+        response_ordering = self.client.get(RECIPES_URL, {'ordering': 'link'})
+
+        # assertions
+        self.assertEqual(response_time.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response_time.data), {'max_time', 'min_price'})
+        self.assertEqual(response_ordering.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response_ordering.data)
+
+    def test_cookable_recipes(self):
+        """Test listing the recipes that can be cooked with some ingredients, the most complete first"""
+        eggs, flour, milk, sugar, butter = [
+            sample_ingredient(self.user, name=name) for name in ('Eggs', 'Flour', 'Milk', 'Sugar', 'Butter')
+        ]
+        omelette = sample_recipe(self.user, title='Omelette')
+        omelette.ingredients.add(eggs)
+        pancakes = sample_recipe(self.user, title='Pancakes')
+        pancakes.ingredients.add(eggs, flour, milk)
+        cake = sample_recipe(self.user, title='Cake')
+        cake.ingredients.add(eggs, flour, sugar, butter)
+        sample_recipe(self.user, title='Nothing')
+        have = f'{eggs.id},{milk.id}'
+
+        response = self.client.get(COOKABLE_URL, {'have': have})
+        response_complete = self.client.get(COOKABLE_URL, {'have': have, 'max_missing': 0})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in response.data], [omelette.id, pancakes.id])
+        self.assertEqual([recipe['missing'] for recipe in response.data], [0, 1])
+        self.assertEqual(response.data[1]['missing_ingredients'], [flour.id])
+        self.assertEqual([recipe['id'] for recipe in response_complete.data], [omelette.id])
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_cookable_recipes_query_count(self):
+        """Test that the recipes are matched in a single query, whatever their number"""
+        ingredients = [sample_ingredient(self.user, name=f'Ingredient {i}') for i in range(5)]
+        for i in range(10):
+            recipe = sample_recipe(self.user, title=f'Recipe {i}')
+            recipe.ingredients.add(*ingredients[:i % 5 + 1])
+        cache.library_version(self.user.pk)
+
+        # the recipes, then their tags and their ingredients
+        with self.assertNumQueries(3):
+            response = self.client.get(COOKABLE_URL, {'have': ','.join(str(i.id) for i in ingredients[:3])})
+
+        # assertions
+        self.assertEqual([recipe['missing'] for recipe in response.data], [0] * 6 + [1, 1, 2, 2])
+
+    def test_cookable_recipes_invalid_params(self):
+        """Test that the ingredients are required and the max_missing must be a positive integer"""
+        response_have = self.client.get(COOKABLE_URL)
+        response_missing = self.client.get(COOKABLE_URL, {'have': '1', 'max_missing': '-1'})
+
+        # assertions
+        self.assertEqual(response_have.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('have', response_have.data)
+        self.assertEqual(response_missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_missing', response_missing.data)
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test the search of the recipes with ?q="""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+
+    def search(self, text):
+        """Search the recipes, returning the ids of the results"""
+        response = self.client.get(RECIPES_URL, {'q': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in response.data]
+
+    def test_search_title_tags_and_ingredients(self):
+        """Test that the recipes are found by their title, tags and ingredients, the title matches first"""
+        soup = sample_recipe(self.user, title='Tomato soup')
+        salad = sample_recipe(self.user, title='Summer salad')
+        salad.ingredients.add(sample_ingredient(self.user, name='Tomato'))
+        stew = sample_recipe(self.user, title='Beef stew')
+        stew.tags.add(sample_tag(self.user, name='Winter'))
+        sample_recipe(get_user_model().objects.create_user('other@fake.com', 'fake-123'), title='Tomato pie')
+
+        # assertions
+        self.assertEqual(self.search('tomato'), [soup.pk, salad.pk])
+        self.assertEqual(self.search('winter'), [stew.pk])
+        self.assertEqual(self.search('pasta'), [])
+
+    def test_search_stemming(self):
+        """Test that the words are matched whatever their form"""
+        soup = sample_recipe(self.user, title='Roasted tomatoes soup')
+
+        # assertions
+        self.assertEqual(self.search('roast tomato'), [soup.pk])
+        self.assertEqual(self.search('tomato -soup'), [])
+
+    def test_search_index_maintained(self):
+        """Test that renaming, adding and deleting tags updates the searched words of the recipes"""
+        recipe = sample_recipe(self.user, title='Pancakes')
+        tag = sample_tag(self.user, name='Breakfast')
+        recipe.tags.add(tag)
+        found_added = self.search('breakfast')
+        tag.name = 'Brunch'
+        tag.save()
+        found_renamed = self.search('brunch')
+        tag.delete()
+        found_deleted = self.search('brunch')
+
+        # assertions
+        self.assertEqual(found_added, [recipe.pk])
+        self.assertEqual(found_renamed, [recipe.pk])
+        self.assertEqual(found_deleted, [])
+
+    def test_search_bulk_created(self):
+        """Test that the recipes created in bulk are found"""
+        tag = sample_tag(self.user, name='Vegan')
+        response = self.client.post(
+            BULK_URL,
+            [{'title': 'Lentil curry', 'time_minutes': 30, 'price': '4.00', 'tags': [tag.pk], 'ingredients': []}],
+            format='json'
+        )
+
+        # assertions
+        self.assertEqual(self.search('vegan curry'), [response.data[0]['id']])
+
+    def test_search_typo(self):
+        """Test that the titles with a typo are found, when the database has trigram indexes"""
+        if connection.vendor != 'postgresql' or not search.has_trigram():
+            self.skipTest('pg_trgm is not installed')
+        soup = sample_recipe(self.user, title='Gazpacho')
+
+        # assertions
+        self.assertEqual(self.search('gaspacho'), [soup.pk])
+
+    def test_search_other_databases(self):
+        """Test that the other databases look for the text in the titles, tags and ingredients"""
+        soup = sample_recipe(self.user, title='Tomato soup')
+        salad = sample_recipe(self.user, title='Summer salad')
+        salad.ingredients.add(sample_ingredient(self.user, name='Cherry tomatoes'))
+        sample_recipe(self.user, title='Beef stew')
+
+        with patch('recipe.search.connection') as mock_connection:
+            mock_connection.vendor = 'sqlite'
+            results = list(search.search(Recipe.objects.filter(user=self.user), 'tomato'))
+
+        # assertions
+        self.assertEqual(results, [salad, soup])
+
+
+class RecipePaginationApiTests(TestCase):
+    """Test the optional pagination of the recipe list"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@fake.com',
+            'fake-123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [sample_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+    def test_not_paginated_by_default(self):
+        """Test that the list is not paginated when the client doesn't ask for it"""
+        response = self.client.get(RECIPES_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
+
+    def test_page_number_pagination(self):
+        """Test paginating the recipes with page numbers"""
+        response = self.client.get(RECIPES_URL, {'page': 2, 'page_size': 2})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipes[2].id, self.recipes[1].id]
+        )
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_page_size_capped(self):
+        """Test that the client can't ask for pages bigger than the maximum page size"""
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        # assertions
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_cursor_pagination(self):
+        """Test walking through the recipes with the cursor pagination"""
+        ids = []
+        response = self.client.get(RECIPES_URL, {'pagination': 'cursor', 'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        # assertions
+        self.assertEqual(ids, [recipe.id for recipe in reversed(self.recipes)])
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_cursor_pagination_uses_keyset(self):
+        """Test that the following pages are fetched by filtering on the id instead of using an offset"""
+        response = self.client.get(RECIPES_URL, {'pagination': 'cursor', 'page_size': 2})
+
+        cache.library_version(self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(response.data['next'])
+        sql = context.captured_queries[0]['sql']
+
+        # assertions
+        self.assertIn('"core_recipe"."id" <', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_pagination(self):
+        """Test that an unknown pagination style is rejected"""
+        response = self.client.get(RECIPES_URL, {'pagination': 'nope'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeBulkApiTests(TestCase):
+    """Test creating, updating and deleting many recipes at once"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@fake.com',
+            'fake-123'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(user=self.user, name='Vegan')
+        self.ingredient = sample_ingredient(user=self.user, name='Tofu')
+
+    def payload(self, count):
+        """Return the payload for creating count recipes"""
+        return [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10 + i,
+                'price': '5.00',
+                'tags': [self.tag.id],
+                'ingredients': [self.ingredient.id],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Test creating many recipes at once"""
+        response = self.client.post(BULK_URL, self.payload(3), format='json')
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, [{'id': recipe.id} for recipe in recipes])
+        self.assertEqual([recipe.title for recipe in recipes], ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+
+    def test_bulk_create_query_count(self):
+        """Test that the number of queries doesn't depend on the number of recipes"""
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(BULK_URL, self.payload(2), format='json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(BULK_URL, self.payload(50), format='json')
+
+        # assertions
+        self.assertEqual(len(few), len(many))
+
+    def test_bulk_create_with_names(self):
+        """Test that the names of the whole batch are resolved together"""
+        payload = self.payload(2)
+        payload[0]['tag_names'] = ['vegan', 'Quick']
+        payload[1]['tag_names'] = ['quick']
+        payload[1]['ingredient_names'] = ['Rice']
+
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        quick = Tag.objects.get(user=self.user, name='Quick')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(recipes[0].tags.all()), {self.tag, quick})
+        self.assertEqual(set(recipes[1].tags.all()), {self.tag, quick})
+        self.assertEqual(sorted(i.name for i in recipes[1].ingredients.all()), ['Rice', 'Tofu'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_invalid(self):
+        """Test that nothing is created when a recipe is invalid, and that the errors are reported per recipe"""
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        other_tag = sample_tag(user=user2, name='Not mine')
+        payload = self.payload(3)
+        payload[1]['tags'] = [other_tag.id]
+        del payload[2]['title']
+
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('tags', response.data[1])
+        self.assertIn('title', response.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_too_many(self):
+        """Test that the number of recipes in a request is limited"""
+        with self.settings(RECIPE_BULK_MAX_ITEMS=2):
+            response = self.client.post(BULK_URL, self.payload(3), format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update(self):
+        """Test updating many recipes at once"""
+        recipe1 = sample_recipe(user=self.user, title='Recipe 1')
+        recipe1.tags.add(self.tag)
+        recipe2 = sample_recipe(user=self.user, title='Recipe 2')
+        new_tag = sample_tag(user=self.user, name='Dessert')
+        payload = [
+            {'id': recipe2.id, 'title': 'Updated 2'},
+            {'id': recipe1.id, 'tags': [new_tag.id], 'price': '7.50'},
+        ]
+
+        response = self.client.patch(BULK_URL, payload, format='json')
+
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([recipe['id'] for recipe in response.data], [recipe2.id, recipe1.id])
+        self.assertEqual(recipe1.title, 'Recipe 1')
+        self.assertEqual(str(recipe1.price), '7.50')
+        self.assertEqual(list(recipe1.tags.all()), [new_tag])
+        self.assertEqual(recipe2.title, 'Updated 2')
+
+    def test_bulk_update_other_user_recipe(self):
+        """Test that the recipes of other users can't be updated"""
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        recipe = sample_recipe(user=user2, title='Not mine')
+
+        response = self.client.patch(BULK_URL, [{'id': recipe.id, 'title': 'Mine'}], format='json')
+
+        recipe.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+        self.assertEqual(recipe.title, 'Not mine')
+
+    def test_bulk_delete(self):
+        """Test deleting many recipes at once"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        recipe3 = sample_recipe(user=self.user)
+
+        response = self.client.delete(BULK_URL, [recipe1.id, recipe3.id], format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.all()), [recipe2])
+
+    def test_bulk_delete_queries(self):
+        """Test that deleting recipes in bulk takes the same number of queries, whatever the number of recipes"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        kept = sample_recipe(user=self.user)
+        kept.tags.add(tag)
+        recipes = [sample_recipe(user=self.user) for _ in range(20)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        version = LibraryVersion.objects.current(self.user.pk)
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.delete(BULK_URL, [recipe.id for recipe in recipes[:2]], format='json')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.delete(BULK_URL, [recipe.id for recipe in recipes[2:]], format='json')
+
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        self.assertEqual(Tombstone.objects.filter(user_id=self.user.pk, kind='recipe').count(), 20)
+        self.assertEqual(LibraryVersion.objects.current(self.user.pk), version + 2)
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(ingredient.recipe_count, 0)
+
+    def test_bulk_delete_other_user_recipe(self):
+        """Test that the recipes of other users can't be deleted"""
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        recipe = sample_recipe(user=user2)
+
+        response = self.client.delete(BULK_URL, [recipe.id], format='json')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
 
 class RecipeImageUploadTests(TestCase):
     def setUp(self) -> None:
@@ -292,11 +1036,38 @@ class RecipeImageUploadTests(TestCase):
         )
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
+        # the images are shared by content, so each test stores them in its own media directory
+        volume = tempfile.TemporaryDirectory()
+        self.addCleanup(volume.cleanup)
+        media_settings = override_settings(
+            MEDIA_ROOT=os.path.join(volume.name, 'media'),
+            FILE_UPLOAD_TEMP_DIR=os.path.join(volume.name, 'tmp')
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
 
     def tearDown(self) -> None:
         # make suer image files created during tests are cleaned so they don't accumulate in the system
+        self.recipe.refresh_from_db()
+        for formats in self.recipe.image_variants.values():
+            for name in formats.values():
+                default_storage.delete(name)
         self.recipe.image.delete()
 
+    def recipe_image_file(self, size):
+        """Return a JPEG image of the given size"""
+        ntf = tempfile.NamedTemporaryFile(suffix='.jpg')
+        self.addCleanup(ntf.close)
+        Image.new('RGB', size, 'orange').save(ntf, format='JPEG')
+        ntf.seek(0)
+
+        return ntf
+
+    def upload_image(self, size):
+        """Upload a JPEG image of the given size to the recipe"""
+        url = image_upload_url(self.recipe.id)
+        return self.client.post(url, {'image': self.recipe_image_file(size)}, format='multipart')
+
     def test_upload_image_to_recipe(self):
         """"Test uploading an image to recipe"""
         url = image_upload_url(self.recipe.id)
@@ -327,3 +1098,123 @@ class RecipeImageUploadTests(TestCase):
 
         # assertions
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0, RECIPE_IMAGE_VARIANT_SIZES=[128, 512, 1024])
+    def test_upload_image_generates_variants(self):
+        """Test that the resized copies of the image are generated, without enlarging it"""
+        self.upload_image((800, 400))
+
+        response = self.client.get(detail_url(self.recipe.id))
+        variants = response.data['image_variants']
+        self.recipe.refresh_from_db()
+
+        # assertions
+        self.assertEqual(sorted(variants, key=int), ['128', '512', '1024'])
+        self.assertTrue(variants['128']['jpeg'].startswith('http://testserver/media/uploads/recipe/variants/'))
+        for size, expected in (('128', (128, 64)), ('512', (512, 256)), ('1024', (800, 400))):
+            for name in self.recipe.image_variants[size].values():
+                with default_storage.open(name) as file:
+                    self.assertEqual(Image.open(file).size, expected)
+
+    def test_upload_image_schedules_variants(self):
+        """Test that by default the variants are generated in the background once the upload is committed"""
+        with patch('django.db.transaction.on_commit') as on_commit, patch('recipe.images._get_executor') as executor:
+            self.upload_image((10, 10))
+            submitted_before_commit = executor.return_value.submit.called
+            for call in on_commit.call_args_list:
+                call.args[0]()
+
+        self.recipe.refresh_from_db()
+
+        # assertions
+        self.assertFalse(submitted_before_commit)
+        executor.return_value.submit.assert_called_once_with(
+            images._generate_in_worker, self.recipe.id, self.recipe.image.name
+        )
+        self.assertEqual(self.recipe.image_variants, {})
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0, RECIPE_IMAGE_VARIANT_SIZES=[128, 512])
+    def test_image_redirects_to_smallest_suitable_variant(self):
+        """Test that the image endpoint redirects to the smallest variant big enough, as WebP when accepted"""
+        self.upload_image((600, 600))
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+
+        response_small = self.client.get(image_url(self.recipe.id), {'size': 100})
+        response_medium = self.client.get(image_url(self.recipe.id), {'size': 200}, HTTP_ACCEPT='image/webp,*/*')
+        response_large = self.client.get(image_url(self.recipe.id), {'size': 2000})
+        response_original = self.client.get(image_url(self.recipe.id))
+
+        # assertions
+        self.assertEqual(response_small.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(response_small['Location'].endswith(variants['128']['jpeg']))
+        self.assertTrue(response_medium['Location'].endswith(variants['512'].get('webp', variants['512']['jpeg'])))
+        self.assertTrue(response_large['Location'].endswith(self.recipe.image.name))
+        self.assertTrue(response_original['Location'].endswith(self.recipe.image.name))
+
+    def test_image_not_uploaded(self):
+        """Test that the image endpoint returns 404 for a recipe without image"""
+        response = self.client.get(image_url(self.recipe.id), {'size': 128})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RECIPE_IMAGE_MAX_DIMENSION=50)
+    def test_upload_image_too_big(self):
+        """Test that an image with too many pixels is rejected"""
+        response = self.upload_image((100, 20))
+
+        self.recipe.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image)
+
+    def test_same_image_stored_once(self):
+        """Test that the same image uploaded to two recipes is stored once"""
+        recipe2 = sample_recipe(user=self.user, title='Other recipe')
+        self.upload_image((20, 20))
+        self.client.post(image_upload_url(recipe2.id), {'image': self.recipe_image_file((20, 20))}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        recipe2.refresh_from_db()
+
+        # assertions
+        self.assertEqual(self.recipe.image.name, recipe2.image.name)
+
+    # the variants are generated right away, otherwise on_commit would hand them to a worker thread
+    @override_settings(RECIPE_IMAGE_WORKERS=0, RECIPE_IMAGE_DELETE_GRACE=0)
+    @patch('recipe.images.transaction.on_commit', side_effect=lambda func: func())
+    def test_replaced_image_deleted(self, on_commit):
+        """Test that the replaced image is deleted once no recipe uses it"""
+        recipe2 = sample_recipe(user=self.user, title='Other recipe')
+        self.upload_image((20, 20))
+        self.recipe.refresh_from_db()
+        first_image = self.recipe.image.path
+        recipe2.image = self.recipe.image.name
+        recipe2.save()
+
+        # the first image is still used by the other recipe
+        self.upload_image((30, 30))
+        kept = os.path.exists(first_image)
+        recipe2.delete()
+
+        # assertions
+        self.assertTrue(kept)
+        self.assertFalse(os.path.exists(first_image))
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    @patch('recipe.images.transaction.on_commit', side_effect=lambda func: func())
+    def test_replaced_image_recent_kept(self, on_commit):
+        """Test that a replaced image saved recently is kept, since it may be being uploaded to another recipe"""
+        self.upload_image((20, 20))
+        self.recipe.refresh_from_db()
+        first_image = self.recipe.image.path
+        first_variants = [name for formats in self.recipe.image_variants.values() for name in formats.values()]
+
+        self.upload_image((30, 30))
+
+        # assertions
+        self.assertTrue(os.path.exists(first_image))
+        for name in first_variants:
+            self.assertTrue(images.storage.exists(name))
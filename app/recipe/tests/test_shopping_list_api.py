@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Ingredient
+
+
+SHOPPING_LIST_URL = reverse('recipe:shopping-list')
+
+
+def sample_recipe(user, ingredients, **params):
+    """Create and return a sample recipe with the ingredients"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+class PublicShoppingListApiTests(TestCase):
+    """Test the unauthenticated shopping list API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        response = APIClient().get(SHOPPING_LIST_URL, {'recipes': '1'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateShoppingListApiTests(TestCase):
+    """Test the shopping list of many recipes"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+        self.eggs, self.flour, self.milk = [
+            Ingredient.objects.create(user=self.user, name=name) for name in ('Eggs', 'Flour', 'Milk')
+        ]
+
+    def test_shopping_list(self):
+        """Test that every ingredient is listed once, with the number of recipes needing it, and the totals"""
+        pancakes = sample_recipe(self.user, [self.eggs, self.flour, self.milk], time_minutes=20, price=3.50)
+        omelette = sample_recipe(self.user, [self.eggs], time_minutes=10, price=2.00)
+        sample_recipe(self.user, [self.flour], time_minutes=60, price=1.00)
+
+        response = self.client.get(SHOPPING_LIST_URL, {'recipes': f'{pancakes.id},{omelette.id},{omelette.id}'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['recipes'], sorted([pancakes.id, omelette.id]))
+        self.assertEqual(response.data['ingredients'], [
+            {'id': self.eggs.id, 'name': 'Eggs', 'count': 2},
+            {'id': self.flour.id, 'name': 'Flour', 'count': 1},
+            {'id': self.milk.id, 'name': 'Milk', 'count': 1},
+        ])
+        self.assertEqual(response.data['price'], '5.50')
+        self.assertEqual(response.data['time_minutes'], 30)
+
+    def test_shopping_list_query_count(self):
+        """Test that the shopping list runs the same queries whatever the number of recipes"""
+        recipes = [sample_recipe(self.user, [self.eggs, self.flour]) for _ in range(10)]
+
+        # the recipes are checked, then the ingredients are counted and the totals summed
+        with self.assertNumQueries(3):
+            response = self.client.get(SHOPPING_LIST_URL, {'recipes': ','.join(str(recipe.id) for recipe in recipes)})
+
+        # assertions
+        self.assertEqual([ingredient['count'] for ingredient in response.data['ingredients']], [10, 10])
+
+    def test_shopping_list_invalid_recipes(self):
+        """Test that the recipes are required, and must belong to the user"""
+        other_user = get_user_model().objects.create_user('other@fake.com', 'fake-123')
+        other_recipe = sample_recipe(other_user, [])
+
+        response_missing = self.client.get(SHOPPING_LIST_URL)
+        response_other = self.client.get(SHOPPING_LIST_URL, {'recipes': str(other_recipe.id)})
+        response_invalid = self.client.get(SHOPPING_LIST_URL, {'recipes': '1,two'})
+
+        # assertions
+        self.assertEqual(response_missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_other.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('recipes', response_other.data)
+        self.assertEqual(response_invalid.status_code, status.HTTP_400_BAD_REQUEST)
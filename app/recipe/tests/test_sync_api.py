@@ -0,0 +1,239 @@
+import io
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient, Tombstone
+from recipe import sync
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+class PublicSyncApiTests(TestCase):
+    """Test the unauthenticated sync API access"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        response = APIClient().get(SYNC_URL)
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test the delta sync of the library"""
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@fake.com', 'fake-123')
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        """Sync from the cursor, returning the response"""
+        if since:
+            params['since'] = since
+        return self.client.get(SYNC_URL, params)
+
+    def test_initial_sync(self):
+        """Test that the first sync returns the whole library of the user, and no deletions"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+        recipe = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00)
+        recipe.tags.add(tag)
+        Tag.objects.create(user=self.user, name='Deleted').delete()
+        other_user = get_user_model().objects.create_user('other@fake.com', 'fake-123')
+        Tag.objects.create(user=other_user, name='Other')
+
+        response = self.sync()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['recipes']], [recipe.pk])
+        self.assertEqual(response.data['recipes'][0]['tags'], [tag.pk])
+        self.assertEqual([item['name'] for item in response.data['tags']], ['Vegan'])
+        self.assertEqual([item['id'] for item in response.data['ingredients']], [ingredient.pk])
+        self.assertEqual(response.data['deleted'], {'recipes': [], 'tags': [], 'ingredients': []})
+        self.assertFalse(response.data['has_more'])
+        self.assertTrue(response.data['next'])
+
+    def test_only_changes_returned(self):
+        """Test that syncing with the cursor only returns the objects modified and deleted since"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        unchanged = Recipe.objects.create(user=self.user, title='Soup', time_minutes=20, price=4.00)
+        modified = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00)
+        deleted = Recipe.objects.create(user=self.user, title='Stew', time_minutes=60, price=6.00)
+        cursor = self.sync().data['next']
+
+        modified.title = 'Green salad'
+        modified.save()
+        unchanged_pk, deleted_pk = unchanged.pk, deleted.pk
+        deleted.delete()
+        new_ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+
+        response = self.sync(cursor)
+        response_again = self.sync(response.data['next'])
+
+        # assertions
+        self.assertEqual([item['title'] for item in response.data['recipes']], ['Green salad'])
+        self.assertEqual(response.data['tags'], [])
+        self.assertEqual([item['id'] for item in response.data['ingredients']], [new_ingredient.pk])
+        self.assertEqual(response.data['deleted']['recipes'], [deleted_pk])
+        self.assertNotIn(unchanged_pk, [item['id'] for item in response.data['recipes']])
+        self.assertEqual(response_again.data['recipes'], [])
+        self.assertEqual(response_again.data['deleted']['recipes'], [])
+        self.assertTrue(Tag.objects.filter(pk=tag.pk).exists())
+
+    def test_relation_changes_modify_recipe(self):
+        """Test that adding or removing tags, from either side, returns the recipe again"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00)
+        cursor = self.sync().data['next']
+
+        recipe.tags.add(tag)
+        response_added = self.sync(cursor)
+        tag.recipe_set.clear()
+        response_cleared = self.sync(response_added.data['next'])
+
+        # assertions
+        self.assertEqual([item['tags'] for item in response_added.data['recipes']], [[tag.pk]])
+        self.assertEqual([item['tags'] for item in response_cleared.data['recipes']], [[]])
+
+    def test_bulk_update_modifies_recipe(self):
+        """Test that the recipes updated in bulk are returned again"""
+        recipe = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00)
+        cursor = self.sync().data['next']
+
+        self.client.patch(
+            reverse('recipe:recipe-bulk'),
+            [{'id': recipe.pk, 'title': 'Green salad'}],
+            format='json'
+        )
+        response = self.sync(cursor)
+
+        # assertions
+        self.assertEqual([item['title'] for item in response.data['recipes']], ['Green salad'])
+
+    def test_batches(self):
+        """Test that the changes are returned in batches of at most limit objects, without gaps nor duplicates"""
+        recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=5, price=1.00)
+            for i in range(5)
+        ]
+        # objects modified at the same time are ordered by id
+        Recipe.objects.filter(user=self.user).update(updated_at=timezone.now())
+
+        ids = []
+        cursor = None
+        for _ in range(5):
+            response = self.sync(cursor, limit=2)
+            ids.extend(item['id'] for item in response.data['recipes'])
+            cursor = response.data['next']
+            if not response.data['has_more']:
+                break
+
+        # assertions
+        self.assertEqual(ids, [recipe.pk for recipe in recipes])
+
+    def test_related_ids_ordered(self):
+        """Test that the ids of the tags and ingredients are in the same order as in the other endpoints, by id"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        ingredients = [Ingredient.objects.create(user=self.user, name=f'Ingredient {i}') for i in range(3)]
+        recipe = Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00)
+        recipe.tags.add(*reversed(tags))
+        recipe.ingredients.add(*reversed(ingredients))
+        # the rows updated are moved to the end of their table
+        tags[0].name = 'Renamed'
+        tags[0].save()
+        ingredients[0].name = 'Renamed'
+        ingredients[0].save()
+
+        response = self.sync()
+
+        # assertions
+        self.assertEqual(response.data['recipes'][0]['tags'], [tag.pk for tag in tags])
+        self.assertEqual(response.data['recipes'][0]['ingredients'], [ingredient.pk for ingredient in ingredients])
+
+    def test_query_count_bounded(self):
+        """Test that a sync runs the same queries whatever the size of the library"""
+        for i in range(10):
+            recipe = Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=5, price=1.00)
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'Tag {i}'))
+
+        # the recipes, their tags and ingredients, the tags, the ingredients and the tombstones
+        with self.assertNumQueries(6):
+            response = self.sync()
+
+        # assertions
+        self.assertEqual(len(response.data['recipes']), 10)
+
+    def test_invalid_cursor(self):
+        """Test that an invalid cursor or limit is rejected"""
+        response = self.sync('not-a-cursor')
+        response_limit = self.sync(limit='many')
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
+        self.assertEqual(response_limit.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=30)
+    def test_expired_cursor(self):
+        """Test that a client that didn't sync for longer than the tombstones are kept has to sync again"""
+        positions = sync.decode_cursor(self.sync().data['next'])
+        positions['deleted'] = (timezone.now() - timedelta(days=31), 0)
+
+        response = self.sync(sync.encode_cursor(positions))
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.data['reset'])
+
+    @override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=30)
+    def test_prune_tombstones(self):
+        """Test that the command deletes the tombstones older than the retention only"""
+        Tombstone.objects.create(user_id=self.user.pk, kind='recipe', object_id=1)
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        recent = Tombstone.objects.create(user_id=self.user.pk, kind='recipe', object_id=2)
+
+        call_command('prune_tombstones', stdout=io.StringIO())
+
+        # assertions
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+    def test_user_deleted_tombstones_removed(self):
+        """Test that the tombstones of a deleted user are removed with it"""
+        Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=3.00).delete()
+        user_id = self.user.pk
+
+        self.user.delete()
+
+        # assertions
+        self.assertFalse(Tombstone.objects.filter(user_id=user_id).exists())
+
+    def test_user_deleted_queries(self):
+        """Test that deleting a user takes the same number of queries, whatever the number of recipes"""
+        users = []
+        for count in (2, 20):
+            user = get_user_model().objects.create_user(f'user{count}@fake.com', 'test-123')
+            tag = Tag.objects.create(user=user, name='Vegan')
+            for i in range(count):
+                Recipe.objects.create(user=user, title=f'Salad {i}', time_minutes=5, price=3.00).tags.add(tag)
+            users.append(user)
+        user_ids = [user.pk for user in users]
+
+        with CaptureQueriesContext(connection) as few:
+            users[0].delete()
+        with CaptureQueriesContext(connection) as many:
+            users[1].delete()
+
+        # assertions
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(Recipe.objects.filter(user_id__in=user_ids).exists())
+        self.assertFalse(Tombstone.objects.filter(user_id__in=user_ids).exists())
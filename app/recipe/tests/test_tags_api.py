@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Tag, Recipe
+from recipe import cache
 from recipe.serializers import TagSerializer
 
 
@@ -89,6 +90,26 @@ class PrivateTagsApiTests(TestCase):
         # assertions
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_tag_duplicate(self):
+        """Test that creating a tag with the name of an existing one is rejected, ignoring the case"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        response = self.client.post(TAGS_URL, {'name': 'VEGAN'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_tag_duplicate_not_ascii(self):
+        """Test that the duplicate names Python lowers differently from the database are rejected too"""
+        Tag.objects.create(user=self.user, name='İskender')
+
+        response = self.client.post(TAGS_URL, {'name': 'İSKENDER'})
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_retrieve_tags_assigned_to_recipes(self):
         """"Test filtering tags by those assigned to recipes"""
         tag1 = Tag.objects.create(user=self.user, name='Breakfast')
@@ -103,6 +124,8 @@ class PrivateTagsApiTests(TestCase):
 
         response = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        # the number of recipes was counted in the database when the recipe was linked
+        tag1.refresh_from_db()
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
 
@@ -137,3 +160,116 @@ class PrivateTagsApiTests(TestCase):
 
         # assertions
         self.assertEqual(len(response.data), 1)
+
+    def test_recipe_counts_maintained(self):
+        """Test that the number of recipes of the tags follows the recipes linked, unlinked and deleted"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        salad = Recipe.objects.create(title='Salad', time_minutes=5, price=3.00, user=self.user)
+        soup = Recipe.objects.create(title='Soup', time_minutes=30, price=4.00, user=self.user)
+
+        def counts():
+            return list(Tag.objects.order_by('id').values_list('recipe_count', flat=True))
+
+        salad.tags.add(vegan, quick)
+        soup.tags.add(vegan)
+        after_add = counts()
+        salad.tags.remove(quick)
+        salad.tags.remove(quick)
+        after_remove = counts()
+        vegan.recipe_set.clear()
+        after_clear = counts()
+        soup.tags.add(quick)
+        salad.tags.add(quick)
+        soup.delete()
+        after_delete = counts()
+        self.client.patch(
+            reverse('recipe:recipe-bulk'),
+            [{'id': salad.id, 'tags': [vegan.id]}],
+            format='json'
+        )
+        after_bulk = counts()
+
+        # assertions
+        self.assertEqual(after_add, [2, 1])
+        self.assertEqual(after_remove, [2, 0])
+        self.assertEqual(after_clear, [0, 0])
+        self.assertEqual(after_delete, [0, 1])
+        self.assertEqual(after_bulk, [1, 0])
+
+    def test_retrieve_tags_ordered_by_recipe_count(self):
+        """Test ordering the tags by their number of recipes, the most used first"""
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ('Breakfast', 'Lunch', 'Dinner')]
+        for i in range(3):
+            recipe = Recipe.objects.create(title=f'Recipe {i}', time_minutes=5, price=3.00, user=self.user)
+            recipe.tags.add(*tags[1:i + 2])
+
+        response = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+        response_invalid = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        # assertions
+        self.assertEqual([(tag['name'], tag['recipe_count']) for tag in response.data], [
+            ('Lunch', 3), ('Dinner', 2), ('Breakfast', 0)
+        ])
+        self.assertEqual(response_invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_tags_cursor_pagination(self):
+        """Test walking through the tags with the cursor pagination"""
+        names = ['Breakfast', 'Dinner', 'Lunch', 'Snack', 'Vegan']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        response = self.client.get(TAGS_URL, {'pagination': 'cursor', 'page_size': 2})
+        first_page = [tag['name'] for tag in response.data['results']]
+        response = self.client.get(response.data['next'])
+        second_page = [tag['name'] for tag in response.data['results']]
+
+        # assertions
+        self.assertEqual(first_page, ['Vegan', 'Snack'])
+        self.assertEqual(second_page, ['Lunch', 'Dinner'])
+
+    @override_settings(RECIPE_VERSION_CACHED=True)
+    def test_retrieve_tags_cached(self):
+        """Test that the second listing of the tags is served from the cache, without querying the database"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        stats = cache.stats()
+
+        response1 = self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            response2 = self.client.get(TAGS_URL)
+
+        # assertions
+        self.assertEqual(response1['X-Cache'], 'MISS')
+        self.assertEqual(response2['X-Cache'], 'HIT')
+        self.assertEqual(response1.content, response2.content)
+        self.assertEqual(cache.stats()['hits'], stats['hits'] + 1)
+        self.assertEqual(cache.stats()['misses'], stats['misses'] + 1)
+
+    def test_retrieve_tags_cache_invalidated(self):
+        """Test that creating a tag or assigning it to a recipe invalidates the cached lists"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+        response = self.client.get(TAGS_URL)
+        recipe = Recipe.objects.create(title='Salad', time_minutes=5, price=3.00, user=self.user)
+        recipe.tags.add(tag)
+        response_assigned = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        # assertions
+        self.assertEqual([tag['name'] for tag in response.json()], ['Vegan', 'Dessert'])
+        self.assertEqual(response_assigned['X-Cache'], 'MISS')
+        self.assertEqual([tag['name'] for tag in response_assigned.json()], ['Vegan'])
+
+    def test_retrieve_tags_cache_per_user(self):
+        """Test that the cached lists of a user aren't served to other users"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+        user2 = get_user_model().objects.create_user('other@fake.com', 'test-123')
+        self.client.force_authenticate(user2)
+
+        response = self.client.get(TAGS_URL)
+
+        # assertions
+        self.assertEqual(response.json(), [])
@@ -11,5 +11,9 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('shopping-list/', views.ShoppingListView.as_view(), name='shopping-list'),
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('import/', views.ImportView.as_view(), name='import'),
 ]
@@ -1,31 +1,95 @@
+import json
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework import fields, viewsets, mixins, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from core.authentication import CachedTokenAuthentication
+from core.parsers import FastJSONParser
 from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from core.uploads import BoundedImageMultiPartParser
+from recipe import cache, export, fast, filters, images, imports, search, serializers, shopping, signals, sync
+from recipe.conditional import ConditionalRequestMixin
 
 
-class BaseRecipeAttributesViewSet(viewsets.GenericViewSet,
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Use the first renderer whatever the client accepts, for the views that don't return JSON"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+
+class BaseRecipeAttributesViewSet(ConditionalRequestMixin,
+                                  viewsets.GenericViewSet,
                                   mixins.ListModelMixin,
                                   mixins.CreateModelMixin):
     """Base viewset ofr user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # the fields the objects can be ordered by with ?ordering=, e.g. -recipe_count for the most used first
+    ordering_fields = ('name', 'recipe_count')
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         assigned_only = bool(int(self.request.query_params.get('assigned_only', 0)))
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # the number of recipes is stored with the object, so there's no need to join the recipes
+            queryset = queryset.filter(recipe_count__gt=0)
+
+        return queryset.filter(user=self.request.user).order_by(*self.cursor_ordering)
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+    @property
+    def cursor_ordering(self):
+        """The ordering of the objects, which the cursor pagination filters on too"""
+        # the cursor pagination filters on the first column, so it has to match an index on the table
+        return filters.get_ordering(self.request.query_params.get('ordering', '-name'), self.ordering_fields)
 
     def perform_create(self, serializer):
         """Create a new object"""
-        serializer.save(user=self.request.user)
+        with signals.batched_changes():
+            serializer.save(user=self.request.user)
+
+    # the tags and ingredients are listed every time a recipe is edited, but they rarely change
+    # so we keep the rendered lists in the cache, until the signals in recipe/signals.py invalidate them
+    def list(self, request, *args, **kwargs):
+        """List the objects, from the cache when possible"""
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            # the other renderers (e.g. the browsable API) depend on much more than the data
+            return super().list(request, *args, **kwargs)
+
+        key = cache.list_key(
+            self.queryset.model,
+            request.user.pk,
+            (request.accepted_media_type, sorted(request.query_params.lists())),
+        )
+        content = cache.get(key)
+        if content is not None:
+            response = HttpResponse(content, content_type=request.accepted_renderer.media_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        # render the response right away, so we store exactly the bytes sent to the client
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        cache.set(key, response.content)
+        response['X-Cache'] = 'MISS'
+
+        return response
 
 
 class TagViewSet(BaseRecipeAttributesViewSet):
@@ -44,32 +108,137 @@ class IngredientViewSet(BaseRecipeAttributesViewSet):
 # so we use the whole ModelViewSet with all its properties
 # as opposed to the cases before in which we only wanted to create and list
 # so we used a GenericViewSet and added the Create and List functionalities via mixins
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
+    not_modified_actions = ('list', 'retrieve', 'cookable')
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     # helper function
-    def _params_to_ints(self, qs: str):
+    def _params_to_ints(self, param: str):
         """"Convert a list of string ids to a list of integer"""
-        return [int(str_id) for str_id in qs.split(',')]
+        qs = self.request.query_params[param]
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            raise ValidationError({param: [_('Expected a comma separated list of ids.')]})
 
     def get_queryset(self):
         """Retrieve the recipes for the authentication user"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
+        # by default a recipe matches if it has any of the tags (or ingredients)
+        # with ?match=all the recipe must have all of them
+        match = self.request.query_params.get('match', filters.MATCH_ANY)
+        if match not in filters.MATCHES:
+            raise ValidationError({'match': [_('Expected one of: %s') % ', '.join(filters.MATCHES)]})
+
         queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-            # tags__id__in is the Django syntax for filtering on Foreign Key objects
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        if self.request.query_params.get('tags'):
+            tag_ids = self._params_to_ints('tags')
+            queryset = filters.filter_by_related(queryset, 'tags', tag_ids, match)
+        if self.request.query_params.get('ingredients'):
+            ingredient_ids = self._params_to_ints('ingredients')
+            queryset = filters.filter_by_related(queryset, 'ingredients', ingredient_ids, match)
+
+        queryset = filters.filter_by_ranges(queryset, self.request.query_params)
+
+        queryset = self._prefetch_attributes(queryset).filter(user=self.request.user)
+
+        # ?q= searches the title, tags and ingredients, and returns the best matches first, unless ordered otherwise
+        text = self.request.query_params.get('q', '').strip()
+        if text:
+            queryset = search.search(queryset, text)
+        if self.action == 'cookable':
+            # the recipes that can be cooked are listed first, whatever the ordering
+            queryset = filters.filter_cookable(queryset, *self._get_cookable_params())
+        elif text and 'ordering' not in self.request.query_params:
+            return queryset
+
+        return queryset.order_by(*self.cursor_ordering)
+
+    def _get_cookable_params(self):
+        """Return the ids of the ingredients the user has, and the most ingredients a recipe can miss"""
+        if not self.request.query_params.get('have'):
+            raise ValidationError({'have': [_('This field is required.')]})
+        have = self._params_to_ints('have')
+        try:
+            max_missing = fields.IntegerField(min_value=0).run_validation(
+                self.request.query_params.get('max_missing', settings.RECIPE_COOKABLE_MAX_MISSING)
+            )
+        except ValidationError as exc:
+            raise ValidationError({'max_missing': exc.detail})
+
+        return have, max_missing
 
-        return queryset.filter(user=self.request.user)
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'cookable':
+            # to list the ingredients missing from each recipe
+            context['have'] = set(self._params_to_ints('have'))
+
+        return context
+
+    @property
+    def cursor_ordering(self):
+        """The ordering of the recipes, which the cursor pagination filters on too"""
+        # by default, ordering by the primary key keeps the listing stable
+        # and lets the database walk the index backwards
+        if self.action == 'cookable':
+            return ('missing', '-id')
+        return filters.get_ordering(self.request.query_params.get('ordering', '-id'))
+
+    def _prefetch_attributes(self, queryset):
+        """Prefetch the tags and ingredients rendered by the serializer of the current action"""
+        # without this, the serializer runs two extra queries (tags and ingredients) for every single recipe
+        # with prefetching, Django fetches the tags and ingredients of all the recipes in one query each
+        if self.action in ('upload_image', 'image'):
+            # the image actions don't render tags nor ingredients
+            return queryset
+
+        # with ?fields= only the columns and the objects rendered are read (see DynamicFieldsMixin)
+        serializer_class = self.get_serializer_class()
+        fields, expand = serializer_class.get_query_fields(self.request) \
+            if hasattr(serializer_class, 'get_query_fields') else (None, set())
+        if fields is not None and 'missing_ingredients' in fields:
+            # the missing ingredients of the cookable recipes are found in their ingredients
+            fields = fields | {'ingredients'}
+        if fields is not None:
+            columns = [
+                field.name for field in Recipe._meta.concrete_fields
+                if field.name in fields and not field.primary_key
+            ]
+            queryset = queryset.only('id', *columns)
+
+        prefetches = []
+        for field_name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            if fields is not None and field_name not in fields:
+                continue
+            # the list serializer only renders the ids of the tags and ingredients,
+            # whereas the detail serializer (or ?expand=) also renders their names and number of recipes
+            # so we only select the columns we actually need
+            columns = ('id', 'name', 'recipe_count') if self.action == 'retrieve' or field_name in expand else ('id',)
+            # ordered by id, so the recipes are rendered the same with or without the fast path (see recipe/fast.py)
+            prefetches.append(Prefetch(field_name, queryset=model.objects.only(*columns).order_by('id')))
+
+        return queryset.prefetch_related(*prefetches)
+
+    # the lists of recipes are long, and rendering them with the serializer builds a model instance
+    # and goes through every field for every recipe, which is most of the time of the request
+    # so the plain lists (without ?fields= nor ?expand=) are rendered from the rows instead, to the same JSON
+    def list(self, request, *args, **kwargs):
+        """List the recipes, skipping the serializer when possible"""
+        if not settings.RECIPE_FAST_LIST or self.action != 'list' \
+                or not isinstance(request.accepted_renderer, JSONRenderer) \
+                or 'fields' in request.query_params or 'expand' in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        queryset = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.render(page, request))
+
+        return Response(fast.render(queryset, request))
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -77,26 +246,43 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
+        elif self.action == 'cookable':
+            return serializers.RecipeCookableSerializer
 
         return self.serializer_class
 
+    # the recipe is saved, then its tags and ingredients are set, which would each index it and bump the version
     def perform_create(self, serializer):
         """Create a new recipe"""
-        serializer.save(user=self.request.user)
+        with signals.batched_changes():
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        """Update a recipe"""
+        with signals.batched_changes():
+            serializer.save()
 
     # the above functions are all default actions that we overrode
     # but we can define custom actions with the action decorator
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    # the images are streamed to disk and rejected as soon as they are too big, instead of being buffered in memory
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=(FastJSONParser, FormParser, BoundedImageMultiPartParser))
     def upload_image(self, request, pk=None):
         """"Upload an image to a recipe"""
         recipe = self.get_object()
+        previous_image = (recipe.image.name, recipe.image_variants)
         serializer = self.get_serializer(
             recipe,
             data=request.data
         )
 
         if serializer.is_valid():
-            serializer.save()
+            # the variants of the previous image don't match the new one anymore
+            recipe = serializer.save(image_variants={})
+            images.release(*previous_image)
+            images.schedule_variants(recipe)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -106,3 +292,172 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    # the clients ask for the image at the size they display it, e.g. ?size=128 for a thumbnail,
+    # and are redirected to the smallest variant that is big enough, as WebP if they accept it
+    # the content negotiation is skipped, because the browsers ask for images and not for JSON
+    @action(methods=['GET'], detail=True, content_negotiation_class=IgnoreClientContentNegotiation)
+    def image(self, request, pk=None):
+        """Redirect to the image of a recipe, or to its smallest suitable variant"""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound(_('This recipe has no image.'))
+
+        try:
+            size = int(request.query_params.get('size', 0))
+        except ValueError:
+            raise ValidationError({'size': [_('A valid integer is required.')]})
+        name = images.pick_variant(recipe.image_variants, size, request.META.get('HTTP_ACCEPT', '')) \
+            if size else None
+        url = images.storage.url(name) if name else recipe.image.url
+
+        return HttpResponseRedirect(request.build_absolute_uri(url))
+
+    # the clients send the ingredients the user has at home, e.g. ?have=1,2,3, and get the recipes
+    # they can cook with them first, then the ones missing one ingredient, and so on up to ?max_missing=
+    # the other filters still apply, e.g. ?have=1,2,3&tags=4&max_time=30
+    @action(methods=['GET'], detail=False)
+    def cookable(self, request):
+        """List the recipes that can be cooked with the given ingredients, the most complete first"""
+        # the recipes are matched in get_queryset, and listed like the other ones
+        return self.list(request)
+
+    # importers create and update thousands of recipes, so instead of one request per recipe
+    # they can send them all at once: POST a list of recipes to create them,
+    # PATCH a list of recipes (with their id) to update them, or DELETE a list of ids to delete them
+    # the whole batch is validated first, and nothing is written if any recipe is invalid
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create, update or delete many recipes at once"""
+        recipes = Recipe.objects.filter(user=request.user)
+
+        if request.method == 'DELETE':
+            ids = serializers.RecipeIdsSerializer(data={'ids': request.data}, context=self.get_serializer_context())
+            ids.is_valid(raise_exception=True)
+            recipes.filter(pk__in=ids.validated_data['ids']).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'PATCH':
+            serializer = self.get_serializer(recipes, data=request.data, many=True, partial=True)
+        else:
+            serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if request.method == 'PATCH':
+            saved = serializer.save()
+        else:
+            saved = serializer.save(user=request.user)
+
+        # one result per recipe, in the order they were sent
+        # the client already has the rest of the data, so we don't fetch and serialize the recipes again
+        data = [{'id': recipe.pk} for recipe in saved]
+
+        return Response(
+            data,
+            status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        )
+
+
+# the mobile clients keep a copy of the library, and instead of downloading it all again
+# they ask for what changed since their last sync: GET /sync/ the first time, then /sync/?since=<next>
+# the changes come in batches, and the client calls again with the new cursor while has_more is true
+class SyncView(APIView):
+    """Return the recipes, tags and ingredients modified or deleted since the cursor"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        try:
+            positions = sync.decode_cursor(since) if since else {}
+        except sync.InvalidCursor:
+            raise ValidationError({'since': [_('Invalid cursor.')]})
+        try:
+            limit = min(int(request.query_params.get('limit', settings.SYNC_BATCH_SIZE)), settings.SYNC_BATCH_SIZE)
+        except ValueError:
+            raise ValidationError({'limit': [_('A valid integer is required.')]})
+        if limit < 1:
+            raise ValidationError({'limit': [_('Ensure this value is greater than or equal to 1.')]})
+
+        if sync.is_expired(positions):
+            # the client may have missed deletions, it has to download the whole library again
+            return Response({'reset': True}, status=status.HTTP_410_GONE)
+
+        data, positions = sync.changes(request.user, positions, limit, context={'request': request})
+        data['next'] = sync.encode_cursor(positions)
+
+        return Response(data)
+
+
+# the users plan the recipes of the week, and then need the ingredients of all of them at once:
+# GET /shopping-list/?recipes=1,2,3 returns every ingredient once, with the number of recipes needing it,
+# and the total price and time of the recipes, instead of the client fetching the details of every recipe
+class ShoppingListView(APIView):
+    """Return the ingredients and the totals of a list of recipes"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        value = request.query_params.get('recipes', '')
+        ids = serializers.RecipeIdsSerializer(
+            data={'ids': value.split(',') if value else []},
+            context={'request': request}
+        )
+        if not ids.is_valid():
+            raise ValidationError({'recipes': ids.errors['ids']})
+
+        data = shopping.shopping_list(request.user, ids.validated_data['ids'])
+
+        return Response(serializers.ShoppingListSerializer(data).data)
+
+
+# the users back up their whole library with GET /export/, which can be much bigger than what fits in memory:
+# the recipes are streamed as they are read from the database, a line of JSON per recipe,
+# and with ?gzip=true the stream is compressed on the fly into a .ndjson.gz file
+class ExportView(APIView):
+    """Stream all the recipes of the user, with the names of their tags and ingredients"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        try:
+            compress = fields.BooleanField().run_validation(request.query_params.get('gzip', False))
+        except ValidationError as exc:
+            raise ValidationError({'gzip': exc.detail})
+
+        content = export.lines(request.user, request=request)
+        filename = 'recipes.ndjson'
+        if compress:
+            content = export.gzipped(content)
+            filename += '.gz'
+        response = StreamingHttpResponse(
+            content,
+            content_type='application/gzip' if compress else export.CONTENT_TYPE
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        return response
+
+
+# the customers moving from another app upload their whole library with POST /import/, as a multipart file:
+# the NDJSON of the export, or a CSV file with a header row, optionally gzipped (e.g. recipes.csv.gz)
+# the file is read a line at a time, and the recipes are created in batches as the response is streamed,
+# a line of JSON per event: the errors of the invalid recipes, the progress after every batch, and the totals
+class ImportView(APIView):
+    """Create the recipes of an uploaded file, streaming the progress and the errors"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    # Django writes the big uploads to a temporary file, so they aren't kept in memory
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        file = request.data.get('file')
+        if not file:
+            raise ValidationError({'file': [_('No file was submitted.')]})
+
+        rows = imports.parse(file, imports.detect_format(file.name))
+        events = imports.import_recipes(request.user, rows)
+
+        return StreamingHttpResponse(
+            (json.dumps(event, separators=(',', ':')).encode() + b'\n' for event in events),
+            content_type=export.CONTENT_TYPE
+        )
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
@@ -213,3 +215,22 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_user_keeps_changes_made_elsewhere(self):
+        """Test that updating the profile doesn't revert the changes made to the user since its token was cached"""
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        client.get(ME_URL)
+        # e.g. by another process, whose change the cached copy of the user doesn't know about
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False, password=make_password('other-123'))
+
+        response = client.patch(ME_URL, {'name': 'Fake McFakington'})
+
+        self.user.refresh_from_db()
+
+        # assertions
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user.name, 'Fake McFakington')
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(self.user.check_password('other-123'))
@@ -1,6 +1,8 @@
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
@@ -31,7 +33,8 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
     # authentication is the mechanism by which the authentication happens
     # can be cookie authentication, token authentication, etc
-    authentication_classes = (authentication.TokenAuthentication, )
+    # the tokens are cached to save a database query on every request, see core/authentication.py
+    authentication_classes = (CachedTokenAuthentication, )
 
     # permissions are the level of access that the user has
     # the only permission level we have is that the user must be authenticated to use the app
@@ -45,4 +48,10 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     # because we just want to return the user that is authenticated
     def get_object(self):
         """Retrieve and return authenticated user"""
-        return self.request.user
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+
+        # the authenticated user may be a cached copy of the user (see core/authentication.py)
+        # and saving it would revert the changes made since, e.g. a deactivation or a new password,
+        # so the user updated is the one in the database
+        return get_user_model().objects.get(pk=self.request.user.pk)